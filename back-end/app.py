@@ -1,5 +1,6 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
+from werkzeug.wsgi import wrap_file
 import os
 import requests
 import json
@@ -11,88 +12,244 @@ import atexit
 from functools import wraps
 import hashlib
 import traceback
-import queue
+import csv
+import concurrent.futures
 from collections import defaultdict
+from types import MappingProxyType
+from snapshots import SnapshotStore
+from coleta_async import CheckpointColeta, MotorColeta, Prazo
+from impressoes import RegistrosColetados, impressao_pagina
+from cache_periodos import CachePeriodos
+from arquivo_meses import ArquivoMeses, FORMATO_MES
+from historico_versoes import HistoricoVersoes, calcular_delta
+from seguidor_hoje import SeguidorHoje
+from fila_atualizacoes import FilaAtualizacoes
+from fontes_escallo import carregar_fontes
+from kpis import TabelaKpis, segundos, totalizar
+from quantis import DuracoesPorDia, SketchQuantis, juntar
+from vistas import PARAMETROS_VISTA, OrdensPorVersao, aplicar_vista, calcular_ordens, ler_parametros
+from memoria import MonitorMemoria, memoria_processo, tamanho_profundo
+from rastreio import Rastreio
 
 # Carrega variáveis de ambiente
 load_dotenv()
 
 app = Flask(__name__)
-CORS(app)  # Habilita CORS para todas as rotas
+CORS(app, expose_headers=['ETag', 'X-Snapshot-Version'])  # Habilita CORS para todas as rotas (e deixa o front ler o ETag)
 
 # Obtém as variáveis de ambiente
 HOST = os.getenv('ESCALLO_HOST')
 TOKEN = os.getenv('ESCALLO_TOKEN')
 
-# Definição dos setores e seus atendentes
-SETORES = {
-    'suporte': [
-        {"codigo": "4002", "nome": "Pedro Henrique"},
-        {"codigo": "4004", "nome": "João Miyake"},
-        {"codigo": "4006", "nome": "Gabriel Rosa"},
-        {"codigo": "4008", "nome": "Gabriel Brambila (Estagiário)"},
-        {"codigo": "4009", "nome": "Marcos Moraes (Estagiário)"},
-        {"codigo": "4021", "nome": "Rodrigo Akira"},
-        {"codigo": "4025", "nome": "Alison da Silva"},
-        {"codigo": "4027", "nome": "Pedro Chaves (Estagiário)"},
-        {"codigo": "4028", "nome": "Ryan da Silva (Estagiário)"},
-        {"codigo": "4029", "nome": "Samuel Mendes (Estagiário)"},
-        {"codigo": "4030", "nome": "Pedro Boni"},
-        {"codigo": "4031", "nome": "Rafael Guedes"},
-        {"codigo": "4032", "nome": "Ricardo Correa"},
-        {"codigo": "4033", "nome": "João Silva (Estagiario)"}
-    ],
-    'comercial': [
-        {"codigo": "1201", "nome": "Gustavo Leônidas"},
-        {"codigo": "1204", "nome": "Tamires Cavalcante"},
-        {"codigo": "1205", "nome": "Miguel Roveda"},
-        {"codigo": "1208", "nome": "Rennan Taioqui"},
-        {"codigo": "1210", "nome": "Rodrigo Boani"},
-        {"codigo": "4016", "nome": "Henrique Alves"}
-    ]
-}
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Instâncias do Escallo consultadas (ver fontes_escallo.py). Sem o arquivo de fontes,
+# ESCALLO_HOST/ESCALLO_TOKEN são a fonte única
+FONTES_FILE = os.getenv('ESCALLO_FONTES_FILE', os.path.join(BASE_DIR, 'fontes.json'))
+FONTES = carregar_fontes(FONTES_FILE, HOST, TOKEN)
+
+# Registro de setores e seus atendentes (recarregado automaticamente quando o arquivo muda)
+SETORES_FILE = os.getenv('ESCALLO_SETORES_FILE', os.path.join(BASE_DIR, 'setores.json'))
+INTERVALO_RECARGA_SETORES = 5  # Segundos entre verificações do arquivo de setores
 
-# Cache em memória - agora estruturado por setor e tipo
+def carregar_setores(caminho):
+    """Lê e valida o arquivo de setores: {setor: [{"codigo": ..., "nome": ...}, ...]}"""
+    with open(caminho, encoding='utf-8') as f:
+        bruto = json.load(f)
+    
+    if not isinstance(bruto, dict) or not bruto:
+        raise ValueError("O arquivo de setores deve ser um objeto não vazio {setor: [atendentes]}")
+    
+    setores = {}
+    for setor, atendentes in bruto.items():
+        if not isinstance(atendentes, list):
+            raise ValueError(f"Setor {setor}: a lista de atendentes deve ser um array")
+        lista = []
+        for atendente in atendentes:
+            if not isinstance(atendente, dict) or not atendente.get('codigo') or not atendente.get('nome'):
+                raise ValueError(f"Setor {setor}: atendente inválido {atendente!r}")
+            lista.append({'codigo': str(atendente['codigo']).strip(), 'nome': atendente['nome']})
+        setores[setor] = lista
+    return setores
+
+def indexar_codigos(setores):
+    """Índice reverso código do atendente -> setor"""
+    indice = {}
+    for setor, atendentes in setores.items():
+        for atendente in atendentes:
+            indice.setdefault(atendente['codigo'], setor)
+    return indice
+
+SETORES = carregar_setores(SETORES_FILE)
+CODIGO_PARA_SETOR = indexar_codigos(SETORES)
+setores_mtime = os.stat(SETORES_FILE).st_mtime_ns
+ultima_verificacao_setores = time.time()
+registro_lock = threading.Lock()
+
+# Cache em memória - agora estruturado por setor e tipo.
+# Cada cache[setor][tipo] e background_tasks[setor][tipo] é um mapeamento
+# imutável: quem escreve monta um novo e troca a referência (sob cache_lock /
+# background_lock); quem lê só pega a referência atual, sem lock.
 cache = {}
 background_tasks = {}
 
-# Inicializar cache para cada setor
-for setor in SETORES.keys():
+ENTRADA_VAZIA = {
+    'data': None, 'timestamp': None, 'hash': None, 'periodo': None, 'versao': 0,
+    'paginas': None, 'contadores': None, 'ultima_pagina': None, 'atendentes': None, 'completo': None
+}
+TAREFA_VAZIA = {'is_running': False, 'last_started': None, 'last_completed': None, 'error': None, 'progress': 0}
+
+# Últimos dados brutos de cada tipo, como vieram do Escallo (os relatórios não
+# dependem do setor). Permitem reprocessar quando o registro de setores muda.
+dados_brutos = {}
+
+def inicializar_estruturas_setor(setor):
+    """Cria as entradas de cache e de tarefas em background de um setor"""
+    if setor in cache:
+        return
+    
     cache[setor] = {
-        'hoje': {'data': None, 'timestamp': None, 'hash': None, 'periodo': None},
-        'mes': {'data': None, 'timestamp': None, 'hash': None, 'periodo': None},
-        '7dias': {'data': None, 'timestamp': None, 'hash': None, 'periodo': None},
-        'ligacoesAtivasMes': {'data': None, 'timestamp': None, 'hash': None, 'periodo': None},
-        'ligacoesRecuperadas': {'data': None, 'timestamp': None, 'hash': None, 'periodo': None}
+        'hoje': MappingProxyType(dict(ENTRADA_VAZIA)),
+        'mes': MappingProxyType(dict(ENTRADA_VAZIA)),
+        '7dias': MappingProxyType(dict(ENTRADA_VAZIA)),
+        'ligacoesAtivasMes': MappingProxyType(dict(ENTRADA_VAZIA)),
+        'ligacoesRecuperadas': MappingProxyType(dict(ENTRADA_VAZIA))
     }
     
     background_tasks[setor] = {
-        'ligacoesAtivasMes': {
-            'is_running': False,
-            'last_started': None,
-            'last_completed': None,
-            'error': None,
-            'progress': 0
-        },
-        'ligacoesRecuperadas': {
-            'is_running': False,
-            'last_started': None,
-            'last_completed': None,
-            'error': None,
-            'progress': 0
-        }
+        'ligacoesAtivasMes': MappingProxyType(dict(TAREFA_VAZIA)),
+        'ligacoesRecuperadas': MappingProxyType(dict(TAREFA_VAZIA))
     }
 
-# Lock para thread safety
+# Inicializar cache para cada setor
+for setor in SETORES.keys():
+    inicializar_estruturas_setor(setor)
+
+# Locks dos escritores (leitores não precisam deles)
 cache_lock = threading.RLock()
 background_lock = threading.RLock()
 
+def trocar_entrada(setor, tipo, **campos):
+    """Publica uma nova entrada imutável de cache[setor][tipo] a partir da atual"""
+    with cache_lock:
+        cache[setor][tipo] = MappingProxyType(dict(cache[setor][tipo], **campos))
+
+def atualizar_tarefa(setor, tipo, **campos):
+    """Publica um novo estado imutável de background_tasks[setor][tipo] a partir do atual"""
+    with background_lock:
+        background_tasks[setor][tipo] = MappingProxyType(dict(background_tasks[setor][tipo], **campos))
+
 # Configurações
 CACHE_DURATION_HOURS = 1  # Cache de 1 hora
 FORCE_REFRESH_PARAM = 'force_refresh'
 SETOR_PARAM = 'setor'
+DESDE_PARAM = 'desde'  # Versão que o cliente já tem: a resposta vem em delta
 BACKGROUND_UPDATE_ENABLED = True  # Habilitar atualização em background
 
+# Modo de execução:
+#   'completo' - processo único que coleta e serve (padrão, `python app.py`)
+#   'coletor'  - só coleta do Escallo e publica snapshots (`python coletor.py`)
+#   'api'      - só serve os snapshots publicados pelo coletor (ex.: gunicorn com N workers)
+MODO = os.getenv('ESCALLO_MODO', 'completo')
+SNAPSHOT_DIR = os.getenv('ESCALLO_SNAPSHOT_DIR', os.path.join(BASE_DIR, 'snapshots'))
+INTERVALO_MINIMO_PEDIDOS = 60  # Segundos mínimos entre atualizações pedidas pelos workers da API
+snapshot_store = SnapshotStore(SNAPSHOT_DIR) if MODO in ('coletor', 'api') else None
+
+# Rastreio de depuração por subsistema e setor, ligado em /api/rastreio (ver rastreio.py).
+# ESCALLO_RASTREIO=coleta,cache liga canais desde a partida.
+rastreio = Rastreio(app.logger)
+rastreio_coleta = rastreio.canal('coleta')  # Páginas recebidas do Escallo
+rastreio_processamento = rastreio.canal('processamento')  # Contagens por setor
+rastreio_cache = rastreio.canal('cache')  # Versões gravadas e caminho de cada aplicação de coleta
+rastreio_tempo_real = rastreio.canal('tempo_real')  # Rodadas do acompanhamento do dia
+rastreio_api = rastreio.canal('api')  # Respostas de /api/dados/*
+for subsistema in filter(None, (nome.strip() for nome in os.getenv('ESCALLO_RASTREIO', '').split(','))):
+    # Um nome errado na variável não pode impedir o servidor de subir
+    if subsistema not in rastreio.canais:
+        app.logger.warning(f"ESCALLO_RASTREIO: subsistema {subsistema} não existe (use: {', '.join(sorted(rastreio.canais))})")
+        continue
+    rastreio.ligar(subsistema)
+
+# Motor assíncrono usado no aquecimento: todas as requisições ao Escallo de uma vez
+MAX_REQUISICOES_CONCORRENTES = int(os.getenv('ESCALLO_MAX_CONCORRENCIA', 6))
+PRAZO_AQUECIMENTO_SEGUNDOS = 300
+# Ordem de prioridade do aquecimento: o que o dashboard mostra primeiro vem antes
+PRIORIDADE_AQUECIMENTO = ['hoje', '7dias', 'mes', 'ligacoesAtivasMes', 'ligacoesRecuperadas']
+ESPERA_AQUECIMENTO_SEGUNDOS = 30  # Quanto uma requisição com cache vazio espera o aquecimento
+# Página mais lenta que o percentil HEDGE_PERCENTIL das recentes (e que HEDGE_MINIMO_SEGUNDOS) ganha uma
+# segunda requisição; no máximo HEDGE_FRACAO_MAXIMA das páginas. ESCALLO_HEDGE_PERCENTIL=0 desliga.
+HEDGE_PERCENTIL = float(os.getenv('ESCALLO_HEDGE_PERCENTIL', 0.95))
+HEDGE_MINIMO_SEGUNDOS = 1.0
+HEDGE_FRACAO_MAXIMA = 0.1
+motor_coleta = MotorColeta(max_concorrencia=MAX_REQUISICOES_CONCORRENTES, prazo_requisicao=60, logger=app.logger,
+                           fontes=FONTES, rastreio=rastreio_coleta, percentil_hedge=HEDGE_PERCENTIL or None,
+                           hedge_minimo=HEDGE_MINIMO_SEGUNDOS, fracao_hedge=HEDGE_FRACAO_MAXIMA)
+
+# Fila de atualizações (ver fila_atualizacoes.py): toda busca de cache no Escallo
+# passa por ela, com threads fixas e uma tarefa por tipo na fila ou rodando
+TRABALHADORES_ATUALIZACAO = int(os.getenv('ESCALLO_TRABALHADORES_ATUALIZACAO', 3))
+PRAZO_COLETA_SEGUNDOS = 300  # De ponta a ponta: cada página tem só o que resta dele (ver coleta_async.Prazo)
+MAX_PAGINAS_COLETA = int(os.getenv('ESCALLO_MAX_PAGINAS', 50))  # Por relatório e fonte; além disso a coleta sai truncada
+FOLGA_PRAZO_SEGUNDOS = 10  # Espera além do prazo, para a coleta devolver o que já tem antes de ser cancelada
+PRAZO_TEMPO_REAL_SEGUNDOS = 120  # Uma rodada do acompanhamento do dia
+PRIORIDADE_PEDIDO = 0  # Alguém esperando a resposta (somada à posição em PRIORIDADE_AQUECIMENTO)
+PRIORIDADE_PERIODICA = 10  # Atualizadores periódicos
+fila_atualizacoes = FilaAtualizacoes(TRABALHADORES_ATUALIZACAO, logger=app.logger)
+
+# Páginas já buscadas das paginações que falharam no meio, por (relatório, data_inicial, data_final);
+# a próxima tentativa retoma da página que falhou (ver CheckpointColeta)
+VALIDADE_CHECKPOINT_SEGUNDOS = 900
+RETOMADA_INCOMPLETA_SEGUNDOS = 120  # Dados de uma paginação incompleta valem só até a próxima tentativa
+checkpoints_coleta = {}
+checkpoints_lock = threading.Lock()
+
+# Estado do aquecimento, exposto em /health/ready. Cada tipo tem um evento
+# sinalizado quando sai do aquecimento (com ou sem dados).
+aquecimento = {'em_andamento': False, 'iniciado_em': None, 'concluido_em': None, 'tentativas': 0, 'erros': {}}
+aquecimento_eventos = {tipo: threading.Event() for tipo in PRIORIDADE_AQUECIMENTO}
+
+# Resultados de meses anteriores e intervalos livres, fora das posições fixas do `cache`
+CACHE_PERIODOS_MB = int(os.getenv('ESCALLO_CACHE_PERIODOS_MB', 64))
+MAX_DIAS_PERIODO = 366
+cache_periodos = CachePeriodos(CACHE_PERIODOS_MB * 1024 * 1024)
+
+# Meses encerrados, gravados uma única vez em disco (ver arquivo_meses.py)
+ARQUIVO_DIR = os.getenv('ESCALLO_ARQUIVO_DIR', os.path.join(BASE_DIR, 'arquivo'))
+INTERVALO_ARQUIVADOR = 3600  # Segundos entre verificações do mês anterior
+arquivo_meses = ArquivoMeses(ARQUIVO_DIR)
+
+# Virada do dia e do mês: os períodos novos são buscados antes da meia-noite,
+# trocados na virada e buscados de novo logo depois (ver iniciar_virada)
+ANTECEDENCIA_VIRADA_SEGUNDOS = 600
+ATRASO_VIRADA_SEGUNDOS = 60
+PRIORIDADE_VIRADA = 5  # Entre os pedidos e os atualizadores periódicos
+virada = {'proxima': None, 'preparada_em': None, 'tipos_preparados': [], 'trocada_em': None,
+          'atualizada_em': None, 'mes_pendente': None, 'erro': None}
+
+# Últimas versões de cada (setor, tipo), para responder só o que mudou desde a versão do cliente
+VERSOES_RETIDAS = 8
+historico_versoes = HistoricoVersoes(VERSOES_RETIDAS)
+
+# Ordens das listas por atendente em cada campo, por versão, para sort/limit/offset/fields (ver vistas.py)
+ordens_vistas = OrdensPorVersao(VERSOES_RETIDAS)
+
+# Acompanhamento das ligações do dia entre as varreduras do mês (ver seguidor_hoje.py)
+INTERVALO_TEMPO_REAL = int(os.getenv('ESCALLO_INTERVALO_TEMPO_REAL', 45))
+MARGEM_TEMPO_REAL = 120  # Segundos de sobreposição entre consultas seguidas
+INTERVALO_RESSINCRONIA_HOJE = 900  # Releitura do dia inteiro, para pegar mudanças fora da margem
+seguidores_hoje = {}
+
+# Indicadores por atendente e dia juntando rel025, rel003 e rel030 (ver kpis.py)
+tabela_kpis = TabelaKpis()
+# Colunas cuja última coleta parou no limite de páginas: coluna -> motivo (os dias cobertos valem, o resto falta)
+kpis_truncados = {}
+
+# Picos de memória de cada coleta com tracemalloc (ver memoria.py); ligável em /api/memoria/rastreamento
+RASTREAR_MEMORIA = os.getenv('ESCALLO_RASTREAR_MEMORIA', 'false').lower() == 'true'
+monitor_memoria = MonitorMemoria(quadros=int(os.getenv('ESCALLO_RASTREAR_MEMORIA_QUADROS', 1)))
+if RASTREAR_MEMORIA:
+    monitor_memoria.ligar()
+
 def calcular_hash(data):
     """Calcula hash dos dados para verificar mudanças"""
     if data is None:
@@ -100,11 +257,8 @@ def calcular_hash(data):
     data_str = json.dumps(data, sort_keys=True)
     return hashlib.md5(data_str.encode()).hexdigest()
 
-def buscar_dados_escallo(data_inicial, data_final):
-    """Função para buscar dados da API do Escallo"""
-    API_URL = f"http://{HOST}/escallo/api/v1/recurso/relatorio/rel025/?registros=100&pagina=0"
-    
-    payload = {
+def payload_rel025(data_inicial, data_final):
+    return {
         "dataInicial": data_inicial,
         "dataFinal": data_final,
         "horarioInicial": "00:00:01",
@@ -112,244 +266,167 @@ def buscar_dados_escallo(data_inicial, data_final):
         "exibirUsuarioSistema": "1",
         "ultimosDias": 30
     }
-    
+
+def payload_rel003(data_inicial, data_final):
+    return {
+        "dataInicial": data_inicial,
+        "dataFinal": data_final,
+        "horarioInicial": "00:00:01",
+        "horarioFinal": "23:59:59",
+        "filtrarFilhas": 0,
+        "ultimosDias": 30
+    }
+
+def payload_rel030(data_inicial, data_final):
+    return {
+        "dataInicial": data_inicial,
+        "dataFinal": data_final,
+        "horarioInicial": "00:00:01",
+        "horarioFinal": "23:59:59"
+    }
+
+# Exportação de registros brutos: relatório -> (endpoint, payload, campo do agente, campo do status, colunas do CSV)
+EXPORTACOES = {
+    'ligacoesAtivas': ('rel003', payload_rel003, 'ligacao.codigoAgenteOrigem', 'ligacao.statusFormatado',
+                       ['ligacao.id', 'ligacao.dataHoraInicio', 'ligacao.codigoAgenteOrigem', 'ligacao.numeroDestino',
+                        'ligacao.statusFormatado', 'ligacao.duracao']),
+    'ligacoesRecuperadas': ('rel030', payload_rel030, 'origem', 'status',
+                            ['id', 'data', 'origem', 'agente', 'numero', 'status'])
+}
+MAX_PAGINAS_EXPORTACAO = 1000  # Por mês do intervalo exportado
+
+def iterar_registros_escallo(relatorio, payload, registros_por_pagina=100, max_paginas=MAX_PAGINAS_EXPORTACAO,
+                             prazo=None):
+    """Gera os registros de um relatório paginado uma página por vez, sem acumular a lista.
+    
+    Percorre as fontes do Escallo uma depois da outra; cada registro leva o
+    nome da sua fonte em 'fonte'. Levanta RuntimeError se uma página falhar
+    (a exportação não pode sair incompleta em silêncio), se passar de
+    `max_paginas` páginas ou se o `prazo` (Prazo) acabar.
+    """
+    for fonte in FONTES:
+        for registro in iterar_registros_fonte(fonte, relatorio, payload, registros_por_pagina, max_paginas, prazo):
+            registro['fonte'] = fonte.nome
+            yield registro
+
+def iterar_registros_fonte(fonte, relatorio, payload, registros_por_pagina, max_paginas, prazo=None):
+    """Registros de um relatório paginado em uma fonte, respeitando o orçamento e o disjuntor dela"""
     headers = {
         'Content-Type': 'application/json',
-        'Authorization': f'Partner {TOKEN}'
+        'Authorization': f'Partner {fonte.token}'
     }
-    
-    try:
-        # app.logger.info(f"📤 Buscando dados da API Escallo: {data_inicial} a {data_final}")
-        response = requests.post(API_URL, json=payload, headers=headers, timeout=30)
-        
-        if response.status_code != 200:
-            app.logger.error(f"Erro na API: {response.status_code} - {response.text}")
-            return {"error": f"Erro na API: {response.status_code}"}
-        
-        data = response.json()
-        
-        if 'data' in data and 'registros' in data['data']:
-            registros = data['data']['registros']
-            # app.logger.info(f"✅ Dados recebidos da API: {len(registros)} registros")
-            
-            # Log dos primeiros registros para debug
-            if registros:
-                for i, registro in enumerate(registros[:3]):
-                    if isinstance(registro, dict):
-                        # app.logger.info(f"📝 Registro {i+1}: Código: {registro.get('codigo', 'N/A')}, Nome: {registro.get('nome', 'N/A')}")
-                        pass
-            
-            return registros
-        else:
-            app.logger.warning("API retornou estrutura inesperada")
-            return []
-            
-    except requests.exceptions.Timeout:
-        app.logger.error("Timeout na requisição para API do Escallo")
-        return {"error": "Timeout na conexão com a API"}
-    except Exception as e:
-        app.logger.error(f"Erro na requisição: {str(e)}")
-        return {"error": str(e)}
-
-def buscar_dados_ligacoes_ativas(data_inicial, data_final, progress_callback=None):
-    """Função para buscar dados de ligações ativas (rel003) com paginação completa"""
-    todos_registros = []
-    pagina = 0
-    registros_por_pagina = 100
-    
-    while True:
-        API_URL = f"http://{HOST}/escallo/api/v1/recurso/relatorio/rel003/?registros={registros_por_pagina}&pagina={pagina}"
-        
-        payload = {
-            "dataInicial": data_inicial,
-            "dataFinal": data_final,
-            "horarioInicial": "00:00:01",
-            "horarioFinal": "23:59:59",
-            "filtrarFilhas": 0,
-            "ultimosDias": 30
-        }
-        
-        headers = {
-            'Content-Type': 'application/json',
-            'Authorization': f'Partner {TOKEN}'
-        }
-        
-        try:
-            if progress_callback and pagina % 5 == 0:
-                progress = min(100, int((pagina / 50) * 100))
-                progress_callback(progress)
-            
-            response = requests.post(API_URL, json=payload, headers=headers, timeout=60)
-            
+    with requests.Session() as sessao:
+        for pagina in range(max_paginas):
+            API_URL = f"http://{fonte.host}/escallo/api/v1/recurso/relatorio/{relatorio}/?registros={registros_por_pagina}&pagina={pagina}"
+            prazo_pagina = 60
+            if prazo is not None:
+                prazo_pagina = min(prazo_pagina, prazo.restante())
+                if prazo_pagina <= 0:
+                    raise RuntimeError(f"Prazo de {prazo.segundos}s esgotado antes da página {pagina} do {relatorio}")
+            if not fonte.disjuntor.permite():
+                raise RuntimeError(f"Disjuntor aberto para a fonte {fonte.nome} ({relatorio}, página {pagina})")
+            time.sleep(fonte.reservar())
+            try:
+                response = sessao.post(API_URL, json=payload, headers=headers, timeout=prazo_pagina)
+            except requests.exceptions.RequestException as e:
+                fonte.registrar(str(e))
+                raise RuntimeError(f"Erro na página {pagina} do {relatorio} ({fonte.nome}): {str(e)}")
             if response.status_code != 200:
-                app.logger.error(f"Erro na API rel003 (página {pagina}): {response.status_code}")
-                if pagina == 0:
-                    return {"error": f"Erro na API: {response.status_code}"}
-                else:
-                    app.logger.warning(f"Erro na página {pagina}, retornando dados parciais")
-                    break
+                fonte.registrar(f"HTTP {response.status_code} no {relatorio}")
+                raise RuntimeError(f"Erro na API {relatorio} ({fonte.nome}, página {pagina}): {response.status_code}")
+            fonte.registrar()
             
             data = response.json()
-            
-            if 'data' not in data:
-                app.logger.error(f"Resposta API não contém 'data': {data}")
-                if pagina == 0:
-                    return {"error": "Estrutura da resposta inválida - sem 'data'"}
-                else:
-                    break
-            
-            if 'registros' not in data['data']:
-                app.logger.error(f"Resposta API não contém 'registros' em 'data': {data['data']}")
-                if pagina == 0:
-                    return {"error": "Estrutura da resposta inválida - sem 'registros'"}
-                else:
-                    break
+            if 'data' not in data or 'registros' not in data['data']:
+                raise RuntimeError(f"Estrutura inválida na página {pagina} do {relatorio}")
             
             registros_pagina = data['data']['registros']
-            
+            # O rel030 devolve um dicionário de registros em vez de lista
+            if isinstance(registros_pagina, dict):
+                registros_pagina = list(registros_pagina.values())
             if not registros_pagina:
-                # app.logger.info(f"Página {pagina} vazia - encerrando paginação")
-                break
+                return
             
-            todos_registros.extend(registros_pagina)
+            yield from registros_pagina
             
             if len(registros_pagina) < registros_por_pagina:
-                # app.logger.info(f"Última página detectada (página {pagina} tem {len(registros_pagina)} registros)")
-                break
-            
-            pagina += 1
-            
-            if pagina >= 50:
-                app.logger.warning(f"Limite de 50 páginas atingido - coletados {len(todos_registros)} registros")
-                break
-            
-            time.sleep(0.1)
-                
-        except requests.exceptions.Timeout:
-            app.logger.error(f"Timeout na requisição para API do Escallo (rel003) página {pagina}")
-            if pagina == 0:
-                return {"error": "Timeout na conexão com a API"}
-            else:
-                app.logger.warning(f"Timeout na página {pagina}, retornando dados parciais")
-                break
-        except Exception as e:
-            app.logger.error(f"Erro na requisição rel003 página {pagina}: {str(e)}")
-            if pagina == 0:
-                return {"error": str(e)}
-            else:
-                app.logger.warning(f"Erro na página {pagina}, retornando dados parciais: {str(e)}")
-                break
-    
-    # app.logger.info(f"Total de registros coletados do rel003: {len(todos_registros)} após {pagina + 1} páginas")
-    
-    if progress_callback:
-        progress_callback(100)
-    
-    return todos_registros
-
-def buscar_dados_ligacoes_recuperadas(data_inicial, data_final, progress_callback=None):
-    """Função para buscar dados de ligações recuperadas (rel030) com paginação completa"""
-    todos_registros = []
-    pagina = 0
-    registros_por_pagina = 100
-    
-    while True:
-        API_URL = f"http://{HOST}/escallo/api/v1/recurso/relatorio/rel030/?registros={registros_por_pagina}&pagina={pagina}"
-        
-        payload = {
-            "dataInicial": data_inicial,
-            "dataFinal": data_final,
-            "horarioInicial": "00:00:01",
-            "horarioFinal": "23:59:59"
-        }
-        
-        headers = {
-            'Content-Type': 'application/json',
-            'Authorization': f'Partner {TOKEN}'
-        }
+                return
         
-        try:
-            response = requests.post(API_URL, json=payload, headers=headers, timeout=60)
-            
-            if response.status_code != 200:
-                app.logger.error(f"Erro na API rel030 (página {pagina}): {response.status_code}")
-                break
-            
-            data = response.json()
-            
-            # LOG PARA VER ESTRUTURA DA RESPOSTA
-            if pagina == 0:
-                # app.logger.info(f"📦 ESTRUTURA DA RESPOSTA (página 0):")
-                # app.logger.info(f"   Tipo de data: {type(data)}")
-                if 'data' in data:
-                    # app.logger.info(f"   Tem 'data': Sim")
-                    if 'registros' in data['data']:
-                        registros = data['data']['registros']
-                        # app.logger.info(f"   Tem 'registros': Sim")
-                        # app.logger.info(f"   Tipo de registros: {type(registros)}")
-                        if isinstance(registros, dict):
-                            # app.logger.info(f"   Quantidade de registros: {len(registros)}")
-                            # Mostrar primeiro registro
-                            if registros:
-                                primeira_chave = list(registros.keys())[0]
-                                primeiro_valor = registros[primeira_chave]
-                                # app.logger.info(f"   Primeiro registro:")
-                                # app.logger.info(f"     Chave: {primeira_chave}")
-                                # app.logger.info(f"     Valor tipo: {type(primeiro_valor)}")
-                                if isinstance(primeiro_valor, dict):
-                                    for k, v in primeiro_valor.items():
-                                        # app.logger.info(f"     {k}: {repr(v)}")
-                                        pass
-            
-            if 'data' not in data or 'registros' not in data['data']:
-                app.logger.error(f"Estrutura inválida na página {pagina}")
-                break
-            
-            registros_pagina = data['data']['registros']
-            
-            # IMPORTANTE: Verificar se registros_pagina é um dicionário
-            # Se for dicionário, precisamos extrair os valores
-            if isinstance(registros_pagina, dict):
-                valores = list(registros_pagina.values())
-                # app.logger.info(f"📄 Página {pagina}: Extraindo {len(valores)} valores de dicionário")
-                todos_registros.extend(valores)
-            else:
-                # app.logger.info(f"📄 Página {pagina}: {len(registros_pagina)} registros")
-                todos_registros.extend(registros_pagina)
-            
-            if not registros_pagina or (isinstance(registros_pagina, dict) and len(registros_pagina) < registros_por_pagina) or (not isinstance(registros_pagina, dict) and len(registros_pagina) < registros_por_pagina):
-                break
-            
-            pagina += 1
-            if pagina >= 50:
-                break
-                
-        except Exception as e:
-            app.logger.error(f"Erro na página {pagina}: {str(e)}")
-            break
-    
-    # app.logger.info(f"✅ Total de registros coletados: {len(todos_registros)}")
-    
-    # Log dos primeiros registros
-    if todos_registros:
-        # app.logger.info("📝 PRIMEIROS REGISTROS COLETADOS:")
-        for i in range(min(3, len(todos_registros))):
-            registro = todos_registros[i]
-            # app.logger.info(f"  Registro {i}: {type(registro)}")
-            if isinstance(registro, dict):
-                for key in ['agente', 'origem', 'status', 'data']:
-                    # app.logger.info(f"    {key}: {repr(registro.get(key))}")
-                    pass
-    
-    return todos_registros
+        # Exportação cortada no meio não pode passar por completa
+        raise RuntimeError(f"Limite de {max_paginas} páginas atingido no {relatorio} ({fonte.nome})")
+
+def dividir_por_mes(data_inicial, data_final):
+    """Quebra um intervalo YYYY-MM-DD em intervalos de no máximo um mês"""
+    inicio = datetime.strptime(data_inicial, '%Y-%m-%d')
+    fim = datetime.strptime(data_final, '%Y-%m-%d')
+    while inicio <= fim:
+        _, ultimo_dia_mes = calcular_periodo('mes', inicio)
+        final_trecho = min(fim, datetime.strptime(ultimo_dia_mes, '%Y-%m-%d'))
+        yield inicio.strftime('%Y-%m-%d'), final_trecho.strftime('%Y-%m-%d')
+        inicio = final_trecho + timedelta(days=1)
+
+def filtrar_exportacao(relatorio, data_inicial, data_final, codigos=None, status=None):
+    """Gera os registros do intervalo que passam nos filtros, com o setor do agente anexado"""
+    endpoint, montar_payload, campo_agente, campo_status, _ = EXPORTACOES[relatorio]
+    for inicio, fim in dividir_por_mes(data_inicial, data_final):
+        for registro in iterar_registros_escallo(endpoint, montar_payload(inicio, fim)):
+            if not isinstance(registro, dict):
+                continue
+            codigo = str(registro.get(campo_agente, '')).strip()
+            if codigos is not None and codigo not in codigos:
+                continue
+            if status is not None and registro.get(campo_status) != status:
+                continue
+            registro = dict(registro)
+            registro['setor'] = CODIGO_PARA_SETOR.get(codigo, '')
+            yield registro
+
+class _LinhaCSV:
+    """Destino do csv.writer que só devolve a linha formatada, para ser enviada em streaming"""
+    def write(self, linha):
+        return linha
+
+# Campos do rel025 somados quando o atendente aparece em mais de uma fonte
+CONTAGENS_REL025 = ('ligacoesOferecidas', 'ligacoesOferecidasAtendidas', 'ligacoesRealizadas')
+DURACOES_REL025 = ('tempoAtendimento', 'tempoLogin', 'tempoPausa')
+
+def numero_escallo(valor):
+    """Número do Escallo: int, float ou texto com vírgula decimal"""
+    if isinstance(valor, str):
+        return float(valor.replace(',', '.') or 0)
+    return float(valor or 0)
+
+def formatar_duracao(total, modelo):
+    """Segundos no formato de `modelo`: 'H:MM:SS' se ele era texto com ':', senão número"""
+    if isinstance(modelo, str) and ':' in modelo:
+        return f"{total // 3600}:{total % 3600 // 60:02d}:{total % 60:02d}"
+    return total
+
+def juntar_linhas_rel025(itens):
+    """Uma linha do rel025 a partir das linhas do mesmo atendente em várias fontes.
+    
+    Contagens e tempos são somados; percentual e TMA saem dos totais, e
+    chamadas por hora é a média das fontes ponderada pelo tempo de login.
+    """
+    if len(itens) == 1:
+        return itens[0]
+    linha = dict(itens[0])
+    for campo in CONTAGENS_REL025:
+        linha[campo] = sum(int(numero_escallo(item.get(campo, 0))) for item in itens)
+    tempos = {campo: sum(segundos(item.get(campo)) for item in itens) for campo in DURACOES_REL025}
+    for campo, total in tempos.items():
+        linha[campo] = formatar_duracao(total, itens[0].get(campo))
+    
+    oferecidas, atendidas = linha['ligacoesOferecidas'], linha['ligacoesOferecidasAtendidas']
+    linha['percentualOferecidasAtendidas'] = round(atendidas / oferecidas * 100, 2) if oferecidas else 0
+    linha['TMA'] = formatar_duracao(tempos['tempoAtendimento'] // atendidas if atendidas else 0, itens[0].get('TMA'))
+    login = tempos['tempoLogin']
+    linha['chamadasPorHora'] = round(sum(numero_escallo(item.get('chamadasPorHora', 0)) * segundos(item.get('tempoLogin'))
+                                         for item in itens) / login, 2) if login else 0
+    return linha
 
 def processar_dados(atendentes, resultados_api, cache_key=None, setor=None):
     """Processa os dados dos atendentes com informações de cache"""
-    # app.logger.info(f"🔍 PROCESSAR DADOS para setor: {setor}")
-    # app.logger.info(f"📊 Total de atendentes configurados: {len(atendentes)}")
-    # app.logger.info(f"📊 Códigos dos atendentes: {[a['codigo'] for a in atendentes]}")
-    # app.logger.info(f"📊 Total de registros da API: {len(resultados_api)}")
-    
     # Se resultados_api for um dict com erro, retorna dados zerados
     if isinstance(resultados_api, dict) and 'error' in resultados_api:
         app.logger.warning(f"API retornou erro, criando dados zerados para {setor}")
@@ -371,52 +448,38 @@ def processar_dados(atendentes, resultados_api, cache_key=None, setor=None):
     else:
         resultados_finais = []
         
-        # Log dos códigos encontrados na API
-        codigos_api = []
-        for item in resultados_api:
-            if isinstance(item, dict):
-                codigo = str(item.get('codigo', ''))
-                if codigo not in codigos_api:
-                    codigos_api.append(codigo)
-        
-        # app.logger.info(f"🔍 Códigos encontrados na API: {codigos_api[:10]}")
-        
-        # Contadores para debug
+        # Contadores para o rastreio
         encontrados = 0
         nao_encontrados = 0
         
+        # Um atendente pode vir em mais de uma fonte: as linhas dele são somadas
+        por_codigo = defaultdict(list)
+        for item in resultados_api:
+            if isinstance(item, dict):
+                por_codigo[str(item.get('codigo', ''))].append(item)
+        
         for atendente in atendentes:
             codigo = atendente['codigo']
-            encontrado = False
+            encontrado = codigo in por_codigo
             
-            for item in resultados_api:
-                if isinstance(item, dict):
-                    item_codigo = str(item.get('codigo', ''))
-                    if item_codigo == codigo:
-                        encontrado = True
-                        encontrados += 1
-                        
-                        # Normaliza chamadasPorHora (converte vírgula para ponto)
-                        chamadas_por_hora_str = item.get('chamadasPorHora', '0')
-                        if isinstance(chamadas_por_hora_str, str):
-                            chamadas_por_hora = float(chamadas_por_hora_str.replace(',', '.'))
-                        else:
-                            chamadas_por_hora = float(chamadas_por_hora_str or 0)
-                        
-                        resultados_finais.append({
-                            'nome': atendente['nome'],
-                            'codigo': codigo,
-                            'ligacoesOferecidas': item.get('ligacoesOferecidas', 0),
-                            'ligacoesOferecidasAtendidas': item.get('ligacoesOferecidasAtendidas', 0),
-                            'percentualOferecidasAtendidas': item.get('percentualOferecidasAtendidas', 0),
-                            'tempoAtendimento': item.get('tempoAtendimento', 0),
-                            'TMA': item.get('TMA', 0),
-                            'ligacoesRealizadas': item.get('ligacoesRealizadas', 0),
-                            'tempoLogin': item.get('tempoLogin', 0),
-                            'tempoPausa': item.get('tempoPausa', 0),
-                            'chamadasPorHora': chamadas_por_hora
-                        })
-                        break
+            if encontrado:
+                encontrados += 1
+                item = juntar_linhas_rel025(por_codigo[codigo])
+                
+                resultados_finais.append({
+                    'nome': atendente['nome'],
+                    'codigo': codigo,
+                    'ligacoesOferecidas': item.get('ligacoesOferecidas', 0),
+                    'ligacoesOferecidasAtendidas': item.get('ligacoesOferecidasAtendidas', 0),
+                    'percentualOferecidasAtendidas': item.get('percentualOferecidasAtendidas', 0),
+                    'tempoAtendimento': item.get('tempoAtendimento', 0),
+                    'TMA': item.get('TMA', 0),
+                    'ligacoesRealizadas': item.get('ligacoesRealizadas', 0),
+                    'tempoLogin': item.get('tempoLogin', 0),
+                    'tempoPausa': item.get('tempoPausa', 0),
+                    # Normaliza chamadasPorHora (converte vírgula para ponto)
+                    'chamadasPorHora': numero_escallo(item.get('chamadasPorHora', '0'))
+                })
             
             if not encontrado:
                 nao_encontrados += 1
@@ -434,7 +497,9 @@ def processar_dados(atendentes, resultados_api, cache_key=None, setor=None):
                     'chamadasPorHora': 0
                 })
         
-        # app.logger.info(f"📊 Estatísticas: {encontrados} encontrados, {nao_encontrados} não encontrados")
+        if rastreio_processamento.ativo:
+            rastreio_processamento('rel025 processado', setor=setor, registros=len(resultados_api),
+                                   encontrados=encontrados, nao_encontrados=nao_encontrados)
     
     # Calcular totais
     total_oferecidas = sum(r['ligacoesOferecidas'] for r in resultados_finais)
@@ -461,30 +526,40 @@ def processar_dados(atendentes, resultados_api, cache_key=None, setor=None):
         'setor': setor
     }
     
-    # app.logger.info(f"✅ Processamento concluído para setor {setor}: {len(resultados_finais)} registros")
     return resultado
 
-def processar_dados_ligacoes_ativas(atendentes, resultados_api, cache_key=None, setor=None):
-    """Processa os dados de ligações ativas (atendidas) do rel003"""
-    # app.logger.info(f"🔍 PROCESSAR LIGAÇÕES ATIVAS para setor: {setor}")
-    # app.logger.info(f"📊 Atendentes: {len(atendentes)}, Registros API: {len(resultados_api)}")
-    
-    # Dicionário para contar ligações por atendente
-    contador_ligacoes = {atendente['codigo']: 0 for atendente in atendentes}
-    
-    total_registros = len(resultados_api)
-    atendidos_count = 0
-    
-    for i, registro in enumerate(resultados_api):
+def classificar_ligacao_ativa(registro):
+    """Código do atendente a quem a ligação do rel003 conta, ou None se não foi atendida"""
+    if registro.get('ligacao.statusFormatado', '') != 'Atendido':
+        return None
+    return registro.get('ligacao.codigoAgenteOrigem', '') or None
+
+def contar_ligacoes_ativas(codigos, registros, hoje=None):
+    """Conta as ligações atendidas do rel003 (mês e dia atual) por código de atendente"""
+    contador_ligacoes = {codigo: 0 for codigo in codigos}
+    contador_hoje = {codigo: 0 for codigo in codigos}
+    hoje = hoje or datetime.now().date()
+    prefixo_hoje = hoje.strftime('%d/%m/%Y')
+    
+    for registro in registros:
         if isinstance(registro, dict):
-            status = registro.get('ligacao.statusFormatado', '')
-            codigo_atendente = registro.get('ligacao.codigoAgenteOrigem', '')
+            codigo_atendente = classificar_ligacao_ativa(registro)
             
-            if status == 'Atendido':
-                atendidos_count += 1
-                
-                if codigo_atendente and codigo_atendente in contador_ligacoes:
-                    contador_ligacoes[codigo_atendente] += 1
+            if codigo_atendente in contador_ligacoes:
+                contador_ligacoes[codigo_atendente] += 1
+                if str(registro.get('ligacao.dataHoraInicio', '')).startswith(prefixo_hoje):
+                    contador_hoje[codigo_atendente] += 1
+    
+    return {
+        'ligacoesAtivasMes': contador_ligacoes,
+        'hoje': contador_hoje,
+        'data_hoje': hoje.strftime('%Y-%m-%d')
+    }
+
+def montar_ligacoes_ativas(atendentes, contadores, cache_key=None, setor=None):
+    """Monta a resposta de ligações ativas a partir dos contadores por atendente"""
+    contador_ligacoes = contadores['ligacoesAtivasMes']
+    contador_hoje = contadores['hoje']
     
     # Criar lista de resultados
     resultados_finais = []
@@ -493,7 +568,8 @@ def processar_dados_ligacoes_ativas(atendentes, resultados_api, cache_key=None,
         resultados_finais.append({
             'nome': atendente['nome'],
             'codigo': atendente['codigo'],
-            'ligacoesAtivasMes': ligacoes
+            'ligacoesAtivasMes': ligacoes,
+            'ligacoesAtivasHoje': contador_hoje[atendente['codigo']]
         })
     
     # Calcular total geral
@@ -505,7 +581,8 @@ def processar_dados_ligacoes_ativas(atendentes, resultados_api, cache_key=None,
     resultado = {
         'data': resultados_finais,
         'totais': {
-            'ligacoesAtivasMes': total_geral
+            'ligacoesAtivasMes': total_geral,
+            'ligacoesAtivasHoje': sum(contador_hoje.values())
         },
         'atualizado_em': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
         'cache_info': {
@@ -517,149 +594,104 @@ def processar_dados_ligacoes_ativas(atendentes, resultados_api, cache_key=None,
         'setor': setor
     }
     
-    # app.logger.info(f"✅ Ligações ativas processadas para setor {setor}: {len(resultados_finais)} registros, total {total_geral}")
     return resultado
 
+def processar_dados_ligacoes_ativas(atendentes, resultados_api, cache_key=None, setor=None):
+    """Processa os dados de ligações ativas (atendidas) do rel003"""
+    contadores = contar_ligacoes_ativas([a['codigo'] for a in atendentes], resultados_api)
+    if rastreio_processamento.ativo:
+        rastreio_processamento('rel003 processado', setor=setor, registros=len(resultados_api),
+                               total=sum(contadores['ligacoesAtivasMes'].values()))
+    return montar_ligacoes_ativas(atendentes, contadores, cache_key, setor)
+
 def processar_dados_ligacoes_recuperadas(atendentes, resultados_api, cache_key=None, setor=None):
-    """DEBUG COMPLETO - Processa os dados de ligações recuperadas"""
-    # app.logger.info(f"🔍 DEBUG LIGAÇÕES RECUPERADAS - Setor: {setor}")
-    
-    # 1. Verificar estrutura dos resultados_api
-    # app.logger.info(f"📊 TIPO de resultados_api: {type(resultados_api)}")
-    # app.logger.info(f"📊 LEN de resultados_api: {len(resultados_api) if hasattr(resultados_api, '__len__') else 'N/A'}")
-    
-    # 2. Amostra detalhada dos primeiros registros
-    if resultados_api and hasattr(resultados_api, '__len__'):
-        # app.logger.info("🔎 AMOSTRA DETALHADA DOS PRIMEIROS 3 REGISTROS:")
-        for i in range(min(3, len(resultados_api))):
-            registro = resultados_api[i]
-            # app.logger.info(f"  --- Registro {i} ---")
-            # app.logger.info(f"  Tipo: {type(registro)}")
-            if isinstance(registro, dict):
-                for key, value in registro.items():
-                    # app.logger.info(f"  {key}: {repr(value)}")
-                    pass
-            else:
-                # app.logger.info(f"  Conteúdo: {repr(registro)}")
-                pass
-    
-    # 3. Verificar TODOS os registros que têm "Alison" no agente
-    # app.logger.info("🔍 BUSCANDO TODOS OS REGISTROS COM 'ALISON':")
-    registros_alison = []
-    if resultados_api and hasattr(resultados_api, '__len__'):
-        for i, registro in enumerate(resultados_api):
-            if isinstance(registro, dict):
-                agente = registro.get('agente', '')
-                if 'alison' in str(agente).lower():
-                    registros_alison.append((i, registro))
-    
-    # app.logger.info(f"📊 Total de registros com 'Alison': {len(registros_alison)}")
-    for i, registro in registros_alison:
-        # app.logger.info(f"  Registro {i}:")
-        # app.logger.info(f"    Agente: {registro.get('agente')}")
-        # app.logger.info(f"    Origem: {registro.get('origem')}")
-        # app.logger.info(f"    Status: {registro.get('status')}")
-        # app.logger.info(f"    Data: {registro.get('data')}")
-    
-    # 4. Verificar se há registros com status "Concluído" (qualquer agente)
-    # app.logger.info("🔍 VERIFICANDO REGISTROS COM STATUS 'CONCLUÍDO':")
-        pass
-    registros_concluidos = []
-    if resultados_api and hasattr(resultados_api, '__len__'):
-        for i, registro in enumerate(resultados_api):
-            if isinstance(registro, dict):
-                status = registro.get('status', '')
-                if status == 'Concluído':
-                    registros_concluidos.append((i, registro))
-    
-    # app.logger.info(f"📊 Total de registros com status 'Concluído': {len(registros_concluidos)}")
-    for i, registro in registros_concluidos[:5]:  # Primeiros 5
-        # app.logger.info(f"  Registro {i}:")
-        # app.logger.info(f"    Agente: {registro.get('agente')}")
-        # app.logger.info(f"    Origem: {registro.get('origem')}")
-        # app.logger.info(f"    Status: {registro.get('status')}")
-        # app.logger.info(f"    Data: {registro.get('data')}")
-    
-    # 5. Verificar códigos dos atendentes
-    # app.logger.info("📋 LISTA DE ATENDENTES DO SETOR:")
-        pass
-    for atendente in atendentes:
-        # app.logger.info(f"  {atendente['nome']} - Código: {atendente['codigo']}")
-        pass
-    
-    # 6. Agora processar de fato
-    contador_ligacoes_dia = {atendente['codigo']: 0 for atendente in atendentes}
-    contador_ligacoes_mes = {atendente['codigo']: 0 for atendente in atendentes}
+    """Processa os dados de ligações recuperadas (concluídas) do rel030"""
+    contadores = contar_ligacoes_recuperadas([a['codigo'] for a in atendentes], resultados_api)
+    if rastreio_processamento.ativo:
+        rastreio_processamento(
+            'rel030 processado', setor=setor, registros=len(resultados_api) if resultados_api else 0,
+            processados=contadores['total_processados'], match=contadores['match_encontrados'],
+            por_atendente=lambda: {codigo: {'dia': contadores['dia'][codigo], 'mes': contadores['mes'][codigo]}
+                                   for codigo in contadores['dia']
+                                   if contadores['dia'][codigo] or contadores['mes'][codigo]})
+    return montar_ligacoes_recuperadas(atendentes, contadores, cache_key, setor)
+
+def classificar_ligacao_recuperada(registro):
+    """Código do atendente a quem a ligação do rel030 conta, ou None se não foi concluída"""
+    origem = registro.get('origem', '')
+    if registro.get('status', '') != 'Concluído' or not origem:
+        return None
+    return str(origem).strip()
+
+def contar_ligacoes_recuperadas(codigos, registros, hoje=None):
+    """Conta as ligações recuperadas do rel030 (dia e mês) por código de atendente"""
+    contador_ligacoes_dia = {codigo: 0 for codigo in codigos}
+    contador_ligacoes_mes = {codigo: 0 for codigo in codigos}
     
-    hoje = datetime.now().date()
+    hoje = hoje or datetime.now().date()
     total_processados = 0
     match_encontrados = 0
     
-    if resultados_api and hasattr(resultados_api, '__len__'):
-        for i, registro in enumerate(resultados_api):
-            if not isinstance(registro, dict):
-                continue
-                
-            total_processados += 1
-            
-            status = registro.get('status', '')
-            origem = registro.get('origem', '')
-            data_hora_str = registro.get('data', '')
+    for i, registro in enumerate(registros or []):
+        if not isinstance(registro, dict):
+            continue
             
-            # VERIFICAÇÃO 1: Status
-            if status != 'Concluído':
-                continue
-            
-            # VERIFICAÇÃO 2: Origem existe
-            if not origem:
-                continue
+        total_processados += 1
+        
+        status = registro.get('status', '')
+        origem = registro.get('origem', '')
+        data_hora_str = registro.get('data', '')
+        
+        # VERIFICAÇÃO 1: Status
+        if status != 'Concluído':
+            continue
+        
+        # VERIFICAÇÃO 2: Origem existe
+        if not origem:
+            continue
+        
+        origem_limpa = str(origem).strip()
+        
+        # VERIFICAÇÃO 3: Origem está na lista de códigos
+        if origem_limpa not in contador_ligacoes_dia:
+            continue
+        
+        match_encontrados += 1
+        
+        # VERIFICAÇÃO 4: Data válida
+        if not data_hora_str:
+            continue
             
-            origem_limpa = str(origem).strip()
+        try:
+            data_parts = data_hora_str.strip().split(' ')
+            data_str = data_parts[0] if data_parts else ''
             
-            # VERIFICAÇÃO 3: Origem está na lista de códigos
-            if origem_limpa not in contador_ligacoes_dia:
+            if not data_str:
                 continue
+                
+            data_registro = datetime.strptime(data_str, '%d/%m/%Y').date()
             
-            match_encontrados += 1
+            # Contar para mês
+            contador_ligacoes_mes[origem_limpa] += 1
             
-            # VERIFICAÇÃO 4: Data válida
-            if not data_hora_str:
-                continue
-                
-            try:
-                data_parts = data_hora_str.strip().split(' ')
-                data_str = data_parts[0] if data_parts else ''
-                
-                if not data_str:
-                    continue
-                    
-                data_registro = datetime.strptime(data_str, '%d/%m/%Y').date()
-                
-                # Contar para mês
-                contador_ligacoes_mes[origem_limpa] += 1
+            # Contar para dia
+            if data_registro == hoje:
+                contador_ligacoes_dia[origem_limpa] += 1
                 
-                # Contar para dia
-                if data_registro == hoje:
-                    contador_ligacoes_dia[origem_limpa] += 1
-                    
-            except Exception as e:
-                app.logger.warning(f"Erro data registro {i}: {e}")
-    
-    # 7. Log dos resultados
-    # app.logger.info("📊 RESULTADO DO PROCESSAMENTO:")
-    # app.logger.info(f"  Total de registros: {len(resultados_api) if resultados_api else 0}")
-    # app.logger.info(f"  Total processados: {total_processados}")
-    # app.logger.info(f"  Match encontrados: {match_encontrados}")
-    
-    # app.logger.info("📊 CONTAGEM FINAL POR ATENDENTE:")
-    for codigo in sorted(contador_ligacoes_dia.keys()):
-        count_dia = contador_ligacoes_dia[codigo]
-        count_mes = contador_ligacoes_mes[codigo]
-        if count_dia > 0 or count_mes > 0:
-            nome = next((a['nome'] for a in atendentes if a['codigo'] == codigo), codigo)
-            # app.logger.info(f"  {nome} ({codigo}): Dia={count_dia}, Mês={count_mes}")
-    
-    # 8. Criar resultados
+        except Exception as e:
+            app.logger.warning(f"Erro data registro {i}: {e}")
+    
+    return {
+        'dia': contador_ligacoes_dia,
+        'mes': contador_ligacoes_mes,
+        'total_registros': len(registros) if registros else 0,
+        'total_processados': total_processados,
+        'match_encontrados': match_encontrados,
+        'data_hoje': hoje.strftime('%Y-%m-%d')
+    }
+
+def montar_ligacoes_recuperadas(atendentes, contadores, cache_key=None, setor=None):
+    """Monta a resposta de ligações recuperadas a partir dos contadores por atendente"""
     resultados_dia = []
     resultados_mes = []
     
@@ -669,18 +701,18 @@ def processar_dados_ligacoes_recuperadas(atendentes, resultados_api, cache_key=N
         resultados_dia.append({
             'nome': atendente['nome'],
             'codigo': codigo,
-            'ligacoesRecuperadasDia': contador_ligacoes_dia[codigo]
+            'ligacoesRecuperadasDia': contadores['dia'][codigo]
         })
         
         resultados_mes.append({
             'nome': atendente['nome'],
             'codigo': codigo,
-            'ligacoesRecuperadasMes': contador_ligacoes_mes[codigo]
+            'ligacoesRecuperadasMes': contadores['mes'][codigo]
         })
     
-    # 9. Totais
-    total_dia = sum(contador_ligacoes_dia.values())
-    total_mes = sum(contador_ligacoes_mes.values())
+    # Totais
+    total_dia = sum(contadores['dia'].values())
+    total_mes = sum(contadores['mes'].values())
     
     return {
         'dia': resultados_dia,
@@ -690,10 +722,10 @@ def processar_dados_ligacoes_recuperadas(atendentes, resultados_api, cache_key=N
             'ligacoesRecuperadasMes': total_mes
         },
         'debug_info': {
-            'total_registros': len(resultados_api) if resultados_api else 0,
-            'total_processados': total_processados,
-            'match_encontrados': match_encontrados,
-            'data_hoje': hoje.strftime('%Y-%m-%d')
+            'total_registros': contadores['total_registros'],
+            'total_processados': contadores['total_processados'],
+            'match_encontrados': contadores['match_encontrados'],
+            'data_hoje': contadores['data_hoje']
         },
         'atualizado_em': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
         'cache_info': {
@@ -705,9 +737,9 @@ def processar_dados_ligacoes_recuperadas(atendentes, resultados_api, cache_key=N
         'setor': setor
     }
 
-def get_cache_key(setor, tipo):
-    """Retorna chave do cache baseada no setor, tipo e data"""
-    hoje = datetime.now()
+def get_cache_key(setor, tipo, referencia=None):
+    """Retorna chave do cache baseada no setor, tipo e data (`referencia`, padrão agora)"""
+    hoje = referencia or datetime.now()
     if tipo == 'hoje':
         return f"{setor}_{tipo}_{hoje.strftime('%Y%m%d')}"
     elif tipo == 'mes':
@@ -720,134 +752,937 @@ def get_cache_key(setor, tipo):
         return f"{setor}_{tipo}_{hoje.strftime('%Y%m%d')}"
     return f"{setor}_{tipo}"
 
-def atualizar_cache_ligacoes_ativas_background(setor):
-    """Atualiza o cache de ligações ativas em background para um setor específico"""
-    with background_lock:
-        if background_tasks[setor]['ligacoesAtivasMes']['is_running']:
-            # app.logger.info(f"Atualização de ligações ativas para {setor} já está em execução")
-            return
+def calcular_periodo(tipo, referencia=None):
+    """Retorna (data_inicial, data_final) consultados no Escallo para o tipo"""
+    hoje = referencia or datetime.now()
+    if tipo == 'hoje':
+        data_hoje = hoje.strftime('%Y-%m-%d')
+        return data_hoje, data_hoje
+    if tipo == '7dias':
+        sete_dias_atras = hoje - timedelta(days=7)
+        return sete_dias_atras.strftime('%Y-%m-%d'), hoje.strftime('%Y-%m-%d')
+    # 'mes', 'ligacoesAtivasMes' e 'ligacoesRecuperadas' usam o mês inteiro
+    primeiro_dia_mes = hoje.replace(day=1)
+    ultimo_dia_mes = (primeiro_dia_mes + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return primeiro_dia_mes.strftime('%Y-%m-%d'), ultimo_dia_mes.strftime('%Y-%m-%d')
+
+def descrever_periodo(tipo, data_inicial, data_final):
+    """Texto do período gravado no cache"""
+    return data_inicial if tipo == 'hoje' else f"{data_inicial} a {data_final}"
+
+# Tipos paginados cujo resultado sai de contadores por atendente, o que
+# permite aplicar só a diferença quando apenas a última página mudou
+CONTADORES_POR_TIPO = {
+    'ligacoesAtivasMes': (contar_ligacoes_ativas, montar_ligacoes_ativas),
+    'ligacoesRecuperadas': (contar_ligacoes_recuperadas, montar_ligacoes_recuperadas)
+}
+
+def somar_contadores(base, parcial, sinal=1):
+    """Soma (ou subtrai, com sinal=-1) contadores numéricos aninhados; o resto mantém o da base"""
+    resultado = {}
+    for chave, valor in base.items():
+        if isinstance(valor, dict):
+            resultado[chave] = somar_contadores(valor, parcial.get(chave, {}), sinal)
+        elif isinstance(valor, int):
+            resultado[chave] = valor + sinal * parcial.get(chave, 0)
+        else:
+            resultado[chave] = valor
+    return resultado
+
+def contadores_validos_hoje(tipo, contadores):
+    """Os contadores separam o dia atual, então só valem no dia em que foram feitos"""
+    if tipo not in CONTADORES_POR_TIPO:
+        return True
+    return bool(contadores) and contadores.get('data_hoje') == datetime.now().strftime('%Y-%m-%d')
+
+# Tipos acompanhados em tempo quase real:
+# tipo -> (relatório, payload, campo id, campo data/hora, classificação, contador do dia, contador do mês)
+ACOMPANHAMENTO_HOJE = {
+    'ligacoesAtivasMes': ('rel003', payload_rel003, 'ligacao.id', 'ligacao.dataHoraInicio',
+                          classificar_ligacao_ativa, 'hoje', 'ligacoesAtivasMes'),
+    'ligacoesRecuperadas': ('rel030', payload_rel030, 'id', 'data',
+                            classificar_ligacao_recuperada, 'dia', 'mes')
+}
+
+def sobrepor_tempo_real(tipo, contadores):
+    """Troca as contagens de hoje da última varredura pelas do acompanhamento do dia.
+    
+    O mês é ajustado pela mesma diferença. Sem acompanhamento do mesmo dia,
+    os contadores voltam como estão.
+    """
+    seguidor = seguidores_hoje.get(tipo)
+    if seguidor is None or not contadores or contadores.get('data_hoje') != seguidor.dia:
+        return contadores
+    
+    chave_hoje, chave_mes = ACOMPANHAMENTO_HOJE[tipo][5:]
+    ao_vivo = seguidor.contagens()
+    resultado = dict(contadores)
+    resultado[chave_hoje] = {codigo: ao_vivo.get(codigo, 0) for codigo in contadores[chave_hoje]}
+    resultado[chave_mes] = {
+        codigo: max(0, total - contadores[chave_hoje][codigo] + resultado[chave_hoje][codigo])
+        for codigo, total in contadores[chave_mes].items()
+    }
+    return resultado
+
+def inicio_pagina(paginas, indice):
+    """Posição do primeiro registro da página `indice` na lista coletada"""
+    return sum(quantidade for _, quantidade in paginas[:indice])
+
+def montar_background_info(setor, tipo):
+    """Resumo do estado da atualização em background anexado às respostas"""
+    task = background_tasks[setor][tipo]
+    return {
+        'is_updating': task['is_running'],
+        'last_started': task['last_started'].isoformat() if task['last_started'] else None,
+        'last_completed': task['last_completed'].isoformat() if task['last_completed'] else None,
+        'progress': task['progress'],
+        'has_error': task['error'] is not None
+    }
+
+def compor_resposta(setor, tipo, dados):
+    """Dados do cache com os campos da resposta (setor, background_info), sem alterar a entrada compartilhada"""
+    resposta = dict(dados)
+    resposta['setor'] = setor
+    if tipo in background_tasks.get(setor, {}):
+        resposta['background_info'] = montar_background_info(setor, tipo)
+    return resposta
+
+def publicar_snapshot(setor, tipo):
+    """No modo coletor, publica o estado atual de cache[setor][tipo] para os workers da API"""
+    if MODO != 'coletor':
+        return
+    
+    dados = cache[setor][tipo]['data']
+    if dados is None:
+        return
+    
+    try:
+        snapshot_store.publicar(setor, tipo, compor_resposta(setor, tipo, dados))
+    except Exception as e:
+        app.logger.error(f"❌ Erro ao publicar snapshot {setor} - {tipo}: {str(e)}")
+
+def gravar_cache(setor, tipo, dados_processados, periodo, timestamp=None, paginas=None,
+                 contadores=None, ultima_pagina=None, atendentes=None, completo=True):
+    """Grava os dados processados no cache e publica o snapshot no modo coletor.
+    
+    `timestamp` é o momento da coleta; ao reprocessar dados brutos retidos
+    ele é mantido para não estender a validade do cache. `paginas`,
+    `contadores`, `ultima_pagina` e `atendentes` guardam de onde os dados
+    vieram, para a próxima coleta saber o que mudou (ver aplicar_coleta).
+    `completo` vai também nos dados: False quando a paginação parou no meio.
+    """
+    gravar_cache_setor(setor, {tipo: {
+        'dados_processados': dados_processados, 'periodo': periodo, 'timestamp': timestamp, 'paginas': paginas,
+        'contadores': contadores, 'ultima_pagina': ultima_pagina, 'atendentes': atendentes, 'completo': completo
+    }})
+
+def gravar_cache_setor(setor, entradas):
+    """Grava de uma vez várias entradas de um setor ({tipo: argumentos de gravar_cache}).
+    
+    `cache[setor]` é trocado por um dicionário novo já com todas elas: não
+    há momento em que parte dos tipos do setor mudou e parte não (ver
+    trocar_virada).
+    """
+    hashes = {}
+    for tipo, campos in entradas.items():
+        # Com as impressões das páginas não é preciso serializar a saída inteira para o hash
+        if campos.get('paginas') is not None:
+            hashes[tipo] = impressao_pagina(''.join(impressao for impressao, _ in campos['paginas']).encode())
+        else:
+            hashes[tipo] = calcular_hash(campos['dados_processados'])
+    
+    versoes = {}
+    with cache_lock:
+        novo = dict(cache[setor])
+        for tipo, campos in entradas.items():
+            # Cada troca dos dados gera uma versão nova, usada nas respostas em delta.
+            # Depois de publicado, `dados_processados` não é mais alterado.
+            dados_processados = campos['dados_processados']
+            completo = campos.get('completo', True)
+            versao = novo[tipo]['versao'] + 1
+            dados_processados['versao'] = versao
+            dados_processados['completo'] = completo
+            historico_versoes.registrar((setor, tipo), versao, dados_processados)
+            novo[tipo] = MappingProxyType({
+                'data': dados_processados,
+                'timestamp': campos.get('timestamp') or datetime.now(),
+                'hash': hashes[tipo],
+                'periodo': campos['periodo'],
+                'versao': versao,
+                'paginas': campos.get('paginas'),
+                'contadores': campos.get('contadores'),
+                'ultima_pagina': campos.get('ultima_pagina'),
+                'atendentes': campos.get('atendentes'),
+                'completo': completo
+            })
+            versoes[tipo] = versao
+        cache[setor] = novo
+    for tipo, campos in entradas.items():
+        if rastreio_cache.ativo:
+            rastreio_cache('versão gravada', setor=setor, tipo=tipo, versao=versoes[tipo], periodo=campos['periodo'],
+                           completo=campos.get('completo', True))
+        # Ordens calculadas uma vez por versão, antes da primeira leitura
+        ordens_vistas.obter((setor, tipo), versoes[tipo], campos['dados_processados'])
+        publicar_snapshot(setor, tipo)
+
+# Quem conta cada registro por relatório; no rel025 cada registro já é um atendente
+CLASSIFICAR_POR_RELATORIO = {'rel003': classificar_ligacao_ativa, 'rel030': classificar_ligacao_recuperada}
+
+def contar_por_fonte(relatorio, resultados_api):
+    """Resumo de cada fonte do Escallo com quantos registros dela contam para cada atendente.
+    
+    Retorna {fonte: {'registros', 'completo', 'erro', 'por_atendente'}}, ou
+    None se os registros não vieram de buscar_em_fontes.
+    """
+    por_fonte = getattr(resultados_api, 'por_fonte', None)
+    if not por_fonte:
+        return None
+    classificar = CLASSIFICAR_POR_RELATORIO.get(relatorio)
+    por_atendente = {nome: defaultdict(int) for nome in por_fonte}
+    for registro in resultados_api:
+        if not isinstance(registro, dict) or registro.get('fonte') not in por_atendente:
+            continue
+        codigo = classificar(registro) if classificar else str(registro.get('codigo', '')).strip() or None
+        if codigo is not None:
+            por_atendente[registro['fonte']][codigo] += 1
+    return {nome: dict(resumo, por_atendente=por_atendente[nome]) for nome, resumo in por_fonte.items()}
+
+def resumir_fontes(atendentes, contagem_fontes):
+    """Parte de cada fonte nos dados de um setor: registros contados e atendentes encontrados nela"""
+    if contagem_fontes is None:
+        return None
+    codigos = {atendente['codigo'] for atendente in atendentes}
+    resumo = {}
+    for nome, fonte in contagem_fontes.items():
+        do_setor = {codigo: total for codigo, total in fonte['por_atendente'].items() if codigo in codigos}
+        resumo[nome] = {
+            'registros_contados': sum(do_setor.values()),
+            'atendentes': len(do_setor),
+            'registros_recebidos': fonte['registros'],
+            'completo': fonte['completo'],
+            'erro': fonte['erro'],
+            'truncado': fonte.get('truncado')
+        }
+    return resumo
+
+def aplicar_coleta(setor, tipo, resultados_api, periodo, cache_key=None, timestamp=None, contagem_fontes=None):
+    """Atualiza cache[setor][tipo] com uma coleta nova, processando só o que mudou.
+    
+    Compara as impressões das páginas com as da coleta que gerou o cache:
+    se nenhuma mudou, só renova o timestamp (sem processar, sem hash e sem
+    trocar os dados); se só a última mudou (ou chegaram páginas novas no
+    fim), aplica nos contadores a diferença dessas páginas; senão processa
+    tudo. Retorna os dados processados atuais.
+    
+    Uma coleta incompleta (paginação interrompida) nunca substitui dados
+    completos do mesmo período; só entra no lugar de dados vazios ou também
+    incompletos.
+    
+    Os dados levam em 'fontes' a parte de cada instância do Escallo no setor;
+    `contagem_fontes` (de contar_por_fonte) evita recontar para cada setor.
+    """
+    atendentes = SETORES.get(setor, [])
+    paginas = getattr(resultados_api, 'paginas', None)
+    completo = getattr(resultados_api, 'completo', True)
+    
+    anterior = cache[setor][tipo]
+    
+    if not completo and anterior['data'] is not None and anterior['completo'] and anterior['periodo'] == periodo:
+        app.logger.warning(f"Coleta incompleta de {tipo} ({resultados_api.falha}) - mantidos os dados completos de {setor}")
+        return anterior['data']
+    
+    mesma_base = (
+        paginas is not None
+        and anterior['data'] is not None
+        and anterior.get('paginas') is not None
+        and anterior['periodo'] == periodo
+        and anterior.get('atendentes') == atendentes
+        and contadores_validos_hoje(tipo, anterior.get('contadores'))
+    )
+    
+    if mesma_base and anterior['paginas'] == paginas and anterior['completo'] == completo:
+        if rastreio_cache.ativo:
+            rastreio_cache('coleta sem mudanças', setor=setor, tipo=tipo, paginas=len(paginas))
+        trocar_entrada(setor, tipo, timestamp=timestamp or datetime.now())
+        return anterior['data']
+    
+    contadores = None
+    if tipo in CONTADORES_POR_TIPO:
+        contar, _ = CONTADORES_POR_TIPO[tipo]
+        codigos = [atendente['codigo'] for atendente in atendentes]
+        paginas_anteriores = anterior.get('paginas') or []
+        fixas = len(paginas_anteriores) - 1
+        
+        if (mesma_base and fixas >= 0 and len(paginas) > fixas
+                and anterior.get('contadores') is not None and anterior.get('ultima_pagina') is not None
+                and paginas[:fixas] == paginas_anteriores[:fixas]):
+            # Só a cauda mudou: tira a última página antiga e soma as páginas novas a partir dela
+            contadores = somar_contadores(anterior['contadores'], contar(codigos, anterior['ultima_pagina']), -1)
+            contadores = somar_contadores(contadores, contar(codigos, resultados_api[inicio_pagina(paginas, fixas):]))
+            if rastreio_cache.ativo:
+                rastreio_cache('coleta incremental', setor=setor, tipo=tipo, paginas_fixas=fixas,
+                               paginas_novas=len(paginas) - fixas)
+        elif rastreio_cache.ativo:
+            rastreio_cache('coleta recontada', setor=setor, tipo=tipo,
+                           paginas=len(paginas) if paginas is not None else None)
+    
+    campos = processar_coleta(setor, tipo, resultados_api, contagem_fontes, contadores, cache_key)
+    gravar_cache(setor, tipo, periodo=periodo, timestamp=timestamp, **campos)
+    return campos['dados_processados']
+
+def processar_coleta(setor, tipo, resultados_api, contagem_fontes=None, contadores=None, cache_key=None,
+                     referencia=None):
+    """Processa uma coleta para o setor sem gravar: retorna os argumentos de gravar_cache, menos período e timestamp.
+    
+    Nos tipos com contadores, `contadores` já calculados (aplicação
+    incremental) evitam recontar. `referencia` é o momento para o qual os
+    dados valem (padrão agora): a chave e o dia separado nas contagens saem
+    dele, o que permite preparar os dados do dia seguinte antes da virada.
+    """
+    atendentes = SETORES.get(setor, [])
+    paginas = getattr(resultados_api, 'paginas', None)
+    cache_key = cache_key or get_cache_key(setor, tipo, referencia)
+    if contagem_fontes is None:
+        contagem_fontes = contar_por_fonte(RELATORIO_POR_TIPO.get(tipo, 'rel025'), resultados_api)
+    campos = {
+        'paginas': paginas,
+        'atendentes': atendentes,
+        'completo': getattr(resultados_api, 'completo', True)
+    }
+    
+    if tipo not in CONTADORES_POR_TIPO:
+        dados_processados = processar_dados(atendentes, resultados_api, cache_key, setor)
+    else:
+        contar, montar = CONTADORES_POR_TIPO[tipo]
+        if contadores is None:
+            hoje = referencia.date() if referencia else None
+            contadores = contar([atendente['codigo'] for atendente in atendentes], resultados_api, hoje)
+        dados_processados = montar(atendentes, sobrepor_tempo_real(tipo, contadores), cache_key, setor)
+        campos['contadores'] = contadores
+        if paginas is not None:
+            campos['ultima_pagina'] = list(resultados_api[inicio_pagina(paginas, len(paginas) - 1):]) if paginas else []
+    dados_processados['fontes'] = resumir_fontes(atendentes, contagem_fontes)
+    campos['dados_processados'] = dados_processados
+    return campos
+
+# Relatórios disponíveis para períodos livres: nome -> (relatório do Escallo, processamento)
+RELATORIOS_PERIODO = {
+    'atendimentos': ('rel025', processar_dados),
+    'ligacoesAtivas': ('rel003', processar_dados_ligacoes_ativas),
+    'ligacoesRecuperadas': ('rel030', processar_dados_ligacoes_recuperadas)
+}
+
+def consultar_periodo(setor, relatorio, data_inicial, data_final, force=False):
+    """Dados de um relatório em um intervalo qualquer, pelo cache LRU de períodos.
+    
+    Períodos que terminaram antes de hoje não mudam mais e ficam no cache
+    como imutáveis; os que incluem hoje valem por CACHE_DURATION_HOURS.
+    Retorna os dados processados ou {'error': ...} (erros não são guardados).
+    """
+    chave = (setor, relatorio, data_inicial, data_final)
+    if not force:
+        dados = cache_periodos.obter(chave, CACHE_DURATION_HOURS * 3600)
+        if dados is not None:
+            return dados
+    
+    endpoint, processar = RELATORIOS_PERIODO[relatorio]
+    try:
+        resultados_api = motor_coleta.executar(pedido_relatorio(endpoint, (data_inicial, data_final), checkpoint=False),
+                                               timeout=PRAZO_COLETA_SEGUNDOS + FOLGA_PRAZO_SEGUNDOS)
+    except concurrent.futures.TimeoutError:
+        return {'error': f'Prazo de {PRAZO_COLETA_SEGUNDOS}s da consulta esgotado'}
+    if isinstance(resultados_api, dict) and 'error' in resultados_api:
+        return resultados_api
+    
+    cache_key = f"{setor}_{relatorio}_{data_inicial.replace('-', '')}_{data_final.replace('-', '')}"
+    dados = processar(SETORES.get(setor, []), resultados_api, cache_key, setor)
+    completo = getattr(resultados_api, 'completo', True)
+    imutavel = data_final < datetime.now().strftime('%Y-%m-%d')
+    dados['periodo'] = {'data_inicial': data_inicial, 'data_final': data_final, 'imutavel': imutavel}
+    dados['completo'] = completo
+    dados['fontes'] = resumir_fontes(SETORES.get(setor, []), contar_por_fonte(endpoint, resultados_api))
+    # Resultado de uma paginação incompleta é respondido, mas não guardado
+    if completo:
+        cache_periodos.guardar(chave, dados, imutavel=imutavel)
+    return dados
+
+def periodo_do_mes(mes):
+    """(data_inicial, data_final) de um mês no formato YYYY-MM"""
+    return calcular_periodo('mes', datetime.strptime(f"{mes}-01", '%Y-%m-%d'))
+
+def mes_anterior():
+    return (datetime.now().replace(day=1) - timedelta(days=1)).strftime('%Y-%m')
+
+# Tipo do cache que retém, durante o mês, os registros de cada relatório de RELATORIOS_PERIODO
+TIPO_DO_MES = {'atendimentos': 'mes', 'ligacoesAtivas': 'ligacoesAtivasMes', 'ligacoesRecuperadas': 'ligacoesRecuperadas'}
+
+def resumir_mes(setor, atendentes, brutos, mes):
+    """Processa os relatórios brutos de um mês encerrado para um setor"""
+    return {
+        relatorio: processar(atendentes, brutos.get(relatorio, []), f"{setor}_{relatorio}_{mes.replace('-', '')}", setor)
+        for relatorio, (_, processar) in RELATORIOS_PERIODO.items()
+    }
+
+def arquivar_mes(mes, substituir=False):
+    """Busca um mês encerrado no Escallo e grava no arquivo; só acontece uma vez por mês.
+    
+    `substituir` arquiva de novo um mês já arquivado (ex.: um que parou no limite de páginas).
+    """
+    if arquivo_meses.existe(mes) and not substituir:
+        return False
+    
+    data_inicial, data_final = periodo_do_mes(mes)
+    prazo = Prazo(PRAZO_AQUECIMENTO_SEGUNDOS)
+    pedidos = {
+        relatorio: pedido_relatorio(endpoint, (data_inicial, data_final), prazo=prazo)
+        for relatorio, (endpoint, _) in RELATORIOS_PERIODO.items()
+    }
+    resultados = motor_coleta.executar(motor_coleta.coletar(pedidos), timeout=PRAZO_AQUECIMENTO_SEGUNDOS + FOLGA_PRAZO_SEGUNDOS)
+    
+    for relatorio, resultados_api in resultados.items():
+        # Um mês incompleto não pode ir para o arquivo: tenta de novo na próxima
+        # verificação, retomando as paginações do checkpoint
+        if isinstance(resultados_api, dict) and 'error' in resultados_api:
+            raise RuntimeError(f"Erro ao buscar {relatorio} de {mes}: {resultados_api['error']}")
+        if not getattr(resultados_api, 'completo', True):
+            raise RuntimeError(f"{relatorio} de {mes} incompleto: {resultados_api.falha}")
+    
+    brutos = {relatorio: list(resultados_api) for relatorio, resultados_api in resultados.items()}
+    truncados = {relatorio: resultados_api.truncado for relatorio, resultados_api in resultados.items()
+                 if getattr(resultados_api, 'truncado', None)}
+    return gravar_mes_arquivado(mes, brutos, truncados, substituir)
+
+def gravar_mes_arquivado(mes, brutos, truncados=None, substituir=False):
+    """Resume para cada setor os relatórios brutos completos de um mês e grava no arquivo.
+    
+    `truncados` ({relatorio: motivo}) registra os relatórios que pararam no
+    limite de páginas: o mês é arquivado assim mesmo, porque buscar de novo
+    pararia no mesmo ponto.
+    """
+    data_inicial, data_final = periodo_do_mes(mes)
+    resumo = {
+        'periodo': {'data_inicial': data_inicial, 'data_final': data_final},
+        'truncado': truncados or None,
+        'setores': {setor: resumir_mes(setor, atendentes, brutos, mes) for setor, atendentes in SETORES.items()}
+    }
+    arquivado = arquivo_meses.gravar(mes, resumo, brutos, substituir)
+    if arquivado:
+        app.logger.info(f"Mês {mes} arquivado ({', '.join(f'{r}: {len(b)}' for r, b in brutos.items())} registros)")
+    return arquivado
+
+def identificar_registro(registro, campo_id):
+    """Identidade de um registro paginado: fonte e id (ou o conteúdo, se não houver id)"""
+    identificador = registro.get(campo_id)
+    if not identificador:
+        identificador = json.dumps(registro, sort_keys=True, default=str)
+    return registro.get('fonte'), identificador
+
+def completar_mes_encerrado(mes, retidos):
+    """Relatórios brutos de um mês que acabou de encerrar, a partir dos dados retidos do mês corrente.
+    
+    `retidos` é uma cópia de dados_brutos tirada na virada. Os relatórios
+    paginados recebem só o fim do último dia, desde a última coleta retida
+    (com MARGEM_TEMPO_REAL), e os registros repetidos trocam os antigos; o
+    rel025, que é um resumo do período, é pedido de novo (uma página por
+    fonte). Retorna None se algum relatório retido não cobre o mês inteiro,
+    está incompleto ou não chegou ao último dia: aí só buscando tudo de novo
+    (arquivar_mes).
+    """
+    data_inicial, data_final = periodo_do_mes(mes)
+    prazo = Prazo(PRAZO_COLETA_SEGUNDOS)
+    brutos = {}
+    for relatorio, (endpoint, _) in RELATORIOS_PERIODO.items():
+        tipo = TIPO_DO_MES[relatorio]
+        bruto = retidos.get(tipo)
+        if (bruto is None or not bruto['completo']
+                or bruto['periodo'] != descrever_periodo(tipo, data_inicial, data_final)):
+            return None
         
-        background_tasks[setor]['ligacoesAtivasMes']['is_running'] = True
-        background_tasks[setor]['ligacoesAtivasMes']['last_started'] = datetime.now()
-        background_tasks[setor]['ligacoesAtivasMes']['error'] = None
-        background_tasks[setor]['ligacoesAtivasMes']['progress'] = 0
+        if endpoint == 'rel025':
+            resultados_api = motor_coleta.executar(
+                pedido_relatorio(endpoint, (data_inicial, data_final), checkpoint=False, prazo=prazo),
+                timeout=prazo.restante() + FOLGA_PRAZO_SEGUNDOS)
+            if isinstance(resultados_api, dict) and 'error' in resultados_api:
+                raise RuntimeError(f"Erro ao buscar {relatorio} de {mes}: {resultados_api['error']}")
+            if not getattr(resultados_api, 'completo', True):
+                raise RuntimeError(f"{relatorio} de {mes} incompleto: {resultados_api.falha}")
+            brutos[relatorio] = list(resultados_api)
+            continue
+        
+        if bruto['timestamp'].strftime('%Y-%m-%d') != data_final:
+            return None
+        campo_id = ACOMPANHAMENTO_HOJE[tipo][2]
+        registros = list(bruto['registros'])
+        posicoes = {identificar_registro(registro, campo_id): indice
+                    for indice, registro in enumerate(registros) if isinstance(registro, dict)}
+        inicio = bruto['timestamp'] - timedelta(seconds=MARGEM_TEMPO_REAL)
+        payload = PAYLOADS_RELATORIO[endpoint](data_final, data_final)
+        payload['horarioInicial'] = inicio.strftime('%H:%M:%S') if inicio.strftime('%Y-%m-%d') == data_final else '00:00:01'
+        for registro in iterar_registros_escallo(endpoint, payload, prazo=prazo):
+            identidade = identificar_registro(registro, campo_id)
+            if identidade in posicoes:
+                registros[posicoes[identidade]] = registro
+            else:
+                posicoes[identidade] = len(registros)
+                registros.append(registro)
+        brutos[relatorio] = registros
+    return brutos
+
+def carregar_mes_encerrado(mes, retidos):
+    """Arquiva o mês que acabou de encerrar com os dados retidos; se não der, busca tudo de novo"""
+    if arquivo_meses.existe(mes):
+        return False
+    brutos = completar_mes_encerrado(mes, retidos)
+    if brutos is None:
+        app.logger.warning(f"Dados retidos não cobrem o mês {mes} inteiro - buscando o mês no Escallo")
+        return arquivar_mes(mes)
+    truncados = {relatorio: retidos[tipo]['registros'].truncado for relatorio, tipo in TIPO_DO_MES.items()
+                 if getattr(retidos[tipo]['registros'], 'truncado', None)}
+    return gravar_mes_arquivado(mes, brutos, truncados)
+
+def impressao_elenco(setor):
+    """Impressão dos atendentes atuais do setor (código e nome)"""
+    atendentes = sorted((atendente['codigo'], atendente['nome']) for atendente in SETORES.get(setor, []))
+    return impressao_pagina(json.dumps(atendentes, ensure_ascii=False).encode())
+
+def ler_mes_arquivado(setor, mes):
+    """Dados de um mês arquivado para o setor, sem consultar o Escallo (None se não arquivado).
+    
+    Um setor que não estava no resumo é processado dos registros brutos com os
+    atendentes atuais (`reprocessado`), por isso a chave leva a impressão deles.
+    Um mês truncado não fica em cache: ele pode ser arquivado de novo.
+    """
+    chave = (setor, 'mes_arquivado', mes, impressao_elenco(setor))
+    dados = cache_periodos.obter(chave)
+    if dados is not None:
+        return dados
+    
+    resumo = arquivo_meses.ler_resumo(mes)
+    if resumo is None:
+        return None
+    
+    relatorios = resumo['setores'].get(setor)
+    reprocessado = relatorios is None
+    if reprocessado:
+        # Setor criado depois do arquivamento: processa a partir dos registros brutos
+        relatorios = resumir_mes(setor, SETORES.get(setor, []), arquivo_meses.ler_brutos(mes) or {}, mes)
+    
+    dados = dict(relatorios, mes=mes, setor=setor, periodo=resumo['periodo'], arquivado_em=resumo['arquivado_em'],
+                 truncado=resumo.get('truncado'), reprocessado=reprocessado)
+    if not dados['truncado']:
+        cache_periodos.guardar(chave, dados, imutavel=True)
+    return dados
+
+def guardar_dados_brutos(tipo, resultados_api, periodo):
+    """Retém a última resposta bruta do Escallo para o tipo (uma incompleta não substitui uma completa)"""
+    completo = getattr(resultados_api, 'completo', True)
+    with cache_lock:
+        anterior = dados_brutos.get(tipo)
+        if not completo and anterior and anterior['completo'] and anterior['periodo'] == periodo:
+            return
+        dados_brutos[tipo] = {
+            'registros': resultados_api,
+            'periodo': periodo,
+            'timestamp': datetime.now(),
+            'completo': completo
+        }
+
+def recalcular_setores(setores):
+    """Reprocessa os dados brutos retidos para os setores informados, sem consultar o Escallo"""
+    with cache_lock:
+        retidos = dict(dados_brutos)
+    
+    for tipo, bruto in retidos.items():
+        # Dados de um período que já virou (ex.: ontem) ficam para a próxima atualização normal
+        if bruto['periodo'] != descrever_periodo(tipo, *calcular_periodo(tipo)):
+            continue
+        for setor in setores:
+            if setor not in SETORES:
+                continue
+            aplicar_coleta(setor, tipo, bruto['registros'], bruto['periodo'], get_cache_key(setor, tipo), bruto['timestamp'])
+
+def aplicar_registro_setores(novos):
+    """Troca o registro de setores e recalcula os setores cujo quadro mudou"""
+    global SETORES, CODIGO_PARA_SETOR
+    
+    with cache_lock, background_lock:
+        for setor in novos.keys():
+            inicializar_estruturas_setor(setor)
+    
+    antigos = SETORES
+    # Troca de referência: quem estiver iterando o dict antigo continua consistente
+    SETORES = novos
+    CODIGO_PARA_SETOR = indexar_codigos(novos)
+    
+    alterados = [setor for setor in novos if antigos.get(setor) != novos[setor]]
+    removidos = [setor for setor in antigos if setor not in novos]
+    app.logger.info(f"Registro de setores recarregado - alterados: {alterados}, removidos: {removidos}")
+    
+    # No modo api quem reprocessa e publica é o coletor
+    if alterados and MODO != 'api':
+        thread = threading.Thread(target=recalcular_setores, args=(alterados,), daemon=True)
+        thread.start()
+    return alterados
+
+def verificar_registro_setores(forcar=False):
+    """Recarrega o registro de setores se o arquivo mudou (checagem no máximo a cada poucos segundos)"""
+    global setores_mtime, ultima_verificacao_setores
     
-    def progress_callback(progress):
-        with background_lock:
-            background_tasks[setor]['ligacoesAtivasMes']['progress'] = progress
+    agora = time.time()
+    if not forcar and agora - ultima_verificacao_setores < INTERVALO_RECARGA_SETORES:
+        return None
     
-    def executar_atualizacao():
+    with registro_lock:
+        ultima_verificacao_setores = agora
         try:
-            # app.logger.info(f"🎬 Iniciando atualização em background de ligações ativas para {setor}...")
-            
-            # Definição de período
-            hoje = datetime.now()
-            primeiro_dia_mes = hoje.replace(day=1)
-            ultimo_dia_mes = (primeiro_dia_mes + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-            data_inicial = primeiro_dia_mes.strftime('%Y-%m-%d')
-            data_final = ultimo_dia_mes.strftime('%Y-%m-%d')
-            
-            # Buscar dados com callback de progresso
-            resultados_api = buscar_dados_ligacoes_ativas(data_inicial, data_final, progress_callback)
-            
-            # Se houver erro na API
-            if isinstance(resultados_api, dict) and 'error' in resultados_api:
-                app.logger.error(f"Erro ao buscar dados para {setor}: {resultados_api['error']}")
-                with background_lock:
-                    background_tasks[setor]['ligacoesAtivasMes']['error'] = resultados_api['error']
-                return
-            
-            # Processar dados
-            atendentes = SETORES.get(setor, [])
-            dados_processados = processar_dados_ligacoes_ativas(atendentes, resultados_api, 'background', setor)
-            
-            # Atualizar cache
-            with cache_lock:
-                cache_key = get_cache_key(setor, 'ligacoesAtivasMes')
-                cache[setor]['ligacoesAtivasMes']['data'] = dados_processados
-                cache[setor]['ligacoesAtivasMes']['timestamp'] = datetime.now()
-                cache[setor]['ligacoesAtivasMes']['hash'] = calcular_hash(dados_processados)
-                cache[setor]['ligacoesAtivasMes']['periodo'] = f"{data_inicial} a {data_final}"
-            
-            # app.logger.info(f"✅ Atualização em background de ligações ativas para {setor} concluída com sucesso!")
-            
-        except Exception as e:
-            app.logger.error(f"❌ Erro na atualização em background para {setor}: {str(e)}")
-            app.logger.error(traceback.format_exc())
-            with background_lock:
-                background_tasks[setor]['ligacoesAtivasMes']['error'] = str(e)
-        finally:
-            with background_lock:
-                background_tasks[setor]['ligacoesAtivasMes']['is_running'] = False
-                background_tasks[setor]['ligacoesAtivasMes']['last_completed'] = datetime.now()
-                background_tasks[setor]['ligacoesAtivasMes']['progress'] = 100
+            mtime = os.stat(SETORES_FILE).st_mtime_ns
+        except OSError as e:
+            app.logger.error(f"Arquivo de setores indisponível: {str(e)}")
+            return None
+        
+        if not forcar and mtime == setores_mtime:
+            return None
+        
+        try:
+            novos = carregar_setores(SETORES_FILE)
+        except (OSError, ValueError) as e:
+            # Arquivo inválido (ou no meio de uma edição): mantém o registro atual
+            app.logger.error(f"Erro ao recarregar setores, mantendo registro atual: {str(e)}")
+            return None
+        setores_mtime = mtime
+    
+    return aplicar_registro_setores(novos)
+
+# Coluna da tabela de indicadores alimentada por cada tipo paginado
+COLUNA_KPI_POR_TIPO = {'ligacoesAtivasMes': 'ligacoesAtivas', 'ligacoesRecuperadas': 'ligacoesRecuperadas'}
+
+def dia_do_registro(valor):
+    """'DD/MM/YYYY HH:MM:SS' do Escallo -> 'YYYY-MM-DD' (None se não for uma data)"""
+    data = str(valor or '').strip()[:10]
+    if len(data) != 10:
+        return None
+    return f"{data[6:]}-{data[3:5]}-{data[:2]}"
+
+def contador_por_dia(tipo):
+    """Função que conta os registros de uma página por dia e atendente: {dia: {codigo: n}}"""
+    campo_data, classificar = ACOMPANHAMENTO_HOJE[tipo][3:5]
     
-    # Executar em thread separada
-    thread = threading.Thread(target=executar_atualizacao, daemon=True)
-    thread.start()
+    def contar(registros):
+        por_dia = defaultdict(lambda: defaultdict(int))
+        for registro in registros:
+            if not isinstance(registro, dict):
+                continue
+            codigo = classificar(registro)
+            dia = dia_do_registro(registro.get(campo_data))
+            if codigo is None or dia is None:
+                continue
+            por_dia[dia][codigo] += 1
+        return {dia: dict(contagens) for dia, contagens in por_dia.items()}
+    return contar
+
+def extrair_duracao(registro):
+    """(dia, atendente, segundos) de uma ligação atendida do rel003, ou None"""
+    codigo = classificar_ligacao_ativa(registro)
+    dia = dia_do_registro(registro.get('ligacao.dataHoraInicio'))
+    if codigo is None or dia is None:
+        return None
+    return dia, codigo, segundos(registro.get('ligacao.duracao'))
+
+# Distribuição das durações do rel003 por atendente e dia (ver quantis.py)
+duracoes_ligacoes = DuracoesPorDia(extrair_duracao)
+duracoes_truncadas = {'motivo': None}  # Última coleta do rel003 parou no limite de páginas
+
+def atualizar_duracoes(resultados_api, periodo):
+    """Remonta os sketches de duração dos dias tocados pela coleta do rel003"""
+    truncado = getattr(resultados_api, 'truncado', None)
+    mudou = truncado != duracoes_truncadas['motivo']
+    duracoes_truncadas['motivo'] = truncado
+    if duracoes_ligacoes.atualizar(resultados_api, getattr(resultados_api, 'paginas', None), *periodo) or mudou:
+        publicar_duracoes()
+
+def sketches_duracoes(setor, data_inicial, data_final):
+    """Sketch de duração de cada atendente do setor no intervalo (None no modo api sem snapshot)"""
+    codigos = [atendente['codigo'] for atendente in SETORES.get(setor, [])]
+    if MODO != 'api':
+        return duracoes_ligacoes.periodo(data_inicial, data_final, codigos)
+    
+    publicado = snapshot_store.ler(setor, 'duracoes')
+    if publicado is None:
+        return None
+    resultado = {codigo: SketchQuantis() for codigo in codigos}
+    for dia, por_codigo in publicado['dias'].items():
+        if data_inicial <= dia <= data_final:
+            for codigo, sketch in por_codigo.items():
+                if codigo in resultado:
+                    resultado[codigo].mesclar(SketchQuantis.de_dict(sketch))
+    return resultado
+
+def publicar_duracoes():
+    """No modo coletor, publica os sketches diários de cada setor para os workers da API"""
+    if MODO != 'coletor':
+        return
+    for setor, atendentes in list(SETORES.items()):
+        try:
+            codigos = {atendente['codigo'] for atendente in atendentes}
+            snapshot_store.publicar(setor, 'duracoes', {'setor': setor, 'dias': duracoes_ligacoes.exportar(codigos),
+                                                        'truncado': duracoes_truncadas['motivo']})
+        except Exception as e:
+            app.logger.error(f"❌ Erro ao publicar durações de {setor}: {str(e)}")
+
+def atualizar_kpis(tipo, resultados_api, periodo):
+    """Atualiza na tabela de indicadores as colunas que vêm do relatório do tipo"""
+    if tipo == 'hoje':
+        alteradas = tabela_kpis.atualizar_atendimentos(periodo[0], resultados_api)
+    elif tipo in COLUNA_KPI_POR_TIPO:
+        coluna = COLUNA_KPI_POR_TIPO[tipo]
+        truncado = getattr(resultados_api, 'truncado', None)
+        # Uma mudança só na marca de truncado também precisa ser publicada
+        alteradas = int(truncado != kpis_truncados.get(coluna))
+        if truncado:
+            kpis_truncados[coluna] = truncado
+        else:
+            kpis_truncados.pop(coluna, None)
+        alteradas += tabela_kpis.atualizar_contagens(coluna, resultados_api, getattr(resultados_api, 'paginas', None),
+                                                     contador_por_dia(tipo))
+        # A varredura pode estar atrás do acompanhamento do dia
+        alteradas += sobrepor_kpis_tempo_real(tipo)
+    else:
+        return
+    tabela_kpis.descartar_antes(calcular_periodo('mes')[0])
+    if alteradas:
+        publicar_kpis()
+
+def sobrepor_kpis_tempo_real(tipo):
+    """Troca a coluna de hoje pelas contagens do acompanhamento do dia; retorna as linhas alteradas"""
+    seguidor = seguidores_hoje.get(tipo)
+    if seguidor is None:
+        return 0
+    return tabela_kpis.sobrepor_dia(COLUNA_KPI_POR_TIPO[tipo], seguidor.dia, seguidor.contagens())
+
+def preencher_kpis_mes():
+    """Busca o rel025 de cada dia já passado do mês sem as colunas dele na tabela de indicadores.
+    
+    As colunas do rel025 só vêm das atualizações de 'hoje', então depois de
+    um reinício os dias anteriores ficariam sem elas. Um pedido por dia, todos
+    juntos no motor; um dia que falhar fica para o próximo reinício.
+    """
+    inicio, _ = calcular_periodo('mes')
+    hoje = datetime.now().strftime('%Y-%m-%d')
+    dia = datetime.strptime(inicio, '%Y-%m-%d')
+    pendentes = []
+    while dia.strftime('%Y-%m-%d') < hoje:
+        data = dia.strftime('%Y-%m-%d')
+        if not any('ligacoesOferecidas' in linha for linha in tabela_kpis.linhas(data)):
+            pendentes.append(data)
+        dia += timedelta(days=1)
+    if not pendentes:
+        return 0
+    
+    prazo = Prazo(PRAZO_AQUECIMENTO_SEGUNDOS)
+    pedidos = {data: pedido_relatorio('rel025', (data, data), checkpoint=False, prazo=prazo) for data in pendentes}
+    try:
+        resultados = motor_coleta.executar(motor_coleta.coletar(pedidos), timeout=PRAZO_AQUECIMENTO_SEGUNDOS + FOLGA_PRAZO_SEGUNDOS)
+    except concurrent.futures.TimeoutError:
+        app.logger.error(f"Prazo esgotado ao preencher os indicadores de {len(pendentes)} dias do mês")
+        return 0
+    
+    alteradas = 0
+    for data, resultados_api in resultados.items():
+        # Um dia incompleto zeraria os atendentes das fontes que falharam
+        if isinstance(resultados_api, dict) and 'error' in resultados_api:
+            app.logger.warning(f"rel025 de {data} não veio para os indicadores: {resultados_api['error']}")
+        elif not getattr(resultados_api, 'completo', True):
+            app.logger.warning(f"rel025 de {data} incompleto para os indicadores: {resultados_api.falha}")
+        else:
+            alteradas += tabela_kpis.atualizar_atendimentos(data, resultados_api)
+    if alteradas:
+        publicar_kpis()
+    app.logger.info(f"Indicadores do mês: rel025 de {len(pendentes)} dias buscado ({alteradas} linhas)")
+    return alteradas
+
+def montar_kpis(setor):
+    """Indicadores dos atendentes do setor em todos os dias da tabela"""
+    atendentes = SETORES.get(setor, [])
+    codigos = [atendente['codigo'] for atendente in atendentes]
+    nomes = {atendente['codigo']: atendente['nome'] for atendente in atendentes}
+    return {
+        'setor': setor,
+        'versao': tabela_kpis.versao,
+        'dias': {
+            dia: [dict(linha, nome=nomes[linha['codigo']]) for linha in tabela_kpis.linhas(dia, codigos)]
+            for dia in tabela_kpis.dias()
+        },
+        'truncado': dict(kpis_truncados) or None,
+        'atualizado_em': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+def linhas_kpis_com_mes(linhas_por_dia, dia, nomes):
+    """Linhas do dia dos atendentes em `nomes`, cada uma com `mes`: os totais do dia 1 do mês até o dia"""
+    inicio = dia[:8] + '01'
+    do_mes = defaultdict(list)
+    for dia_tabela, linhas in linhas_por_dia.items():
+        if inicio <= dia_tabela <= dia:
+            for linha in linhas:
+                do_mes[linha['codigo']].append(linha)
+    do_dia = {linha['codigo']: linha for linha in linhas_por_dia.get(dia, [])}
+    return [dict(do_dia.get(codigo, {'dia': dia, 'codigo': codigo}), nome=nome, mes=totalizar(do_mes[codigo]))
+            for codigo, nome in nomes.items() if codigo in do_mes]
+
+def publicar_kpis():
+    """No modo coletor, publica a tabela de indicadores de cada setor para os workers da API"""
+    if MODO != 'coletor':
+        return
+    for setor in list(SETORES.keys()):
+        try:
+            snapshot_store.publicar(setor, 'kpis', montar_kpis(setor))
+        except Exception as e:
+            app.logger.error(f"❌ Erro ao publicar indicadores de {setor}: {str(e)}")
+
+def marcar_background(tipo, rodando):
+    """Marca o início ou o fim da atualização de `tipo` em background_tasks de todos os setores"""
+    for setor in SETORES.keys():
+        if tipo not in background_tasks[setor]:
+            continue
+        if rodando:
+            atualizar_tarefa(setor, tipo, is_running=True, last_started=datetime.now(), error=None, progress=0)
+        else:
+            atualizar_tarefa(setor, tipo, is_running=False, last_completed=datetime.now(), progress=100)
+        publicar_snapshot(setor, tipo)
+
+def checkpoint_coleta(fonte, relatorio, data_inicial, data_final):
+    """Checkpoint da paginação de um relatório numa fonte e período (criado na primeira vez)"""
+    with checkpoints_lock:
+        # Checkpoints abandonados (período que já virou, coleta que não voltou) são descartados
+        for chave in [chave for chave, checkpoint in checkpoints_coleta.items() if checkpoint.expirado()]:
+            del checkpoints_coleta[chave]
+        return checkpoints_coleta.setdefault((fonte.nome, relatorio, data_inicial, data_final),
+                                             CheckpointColeta(VALIDADE_CHECKPOINT_SEGUNDOS))
+
+# Relatório do Escallo -> payload; o rel025 é de página única, os demais são paginados
+PAYLOADS_RELATORIO = {'rel025': payload_rel025, 'rel003': payload_rel003, 'rel030': payload_rel030}
+RELATORIO_POR_TIPO = {'ligacoesAtivasMes': 'rel003', 'ligacoesRecuperadas': 'rel030'}  # Demais tipos: rel025
 
-def atualizar_cache_ligacoes_recuperadas_background(setor):
-    """Atualiza o cache de ligações recuperadas em background para um setor específico"""
-    with background_lock:
-        if background_tasks[setor]['ligacoesRecuperadas']['is_running']:
-            # app.logger.info(f"Atualização de ligações recuperadas para {setor} já está em execução")
-            return
-        
-        background_tasks[setor]['ligacoesRecuperadas']['is_running'] = True
-        background_tasks[setor]['ligacoesRecuperadas']['last_started'] = datetime.now()
-        background_tasks[setor]['ligacoesRecuperadas']['error'] = None
-        background_tasks[setor]['ligacoesRecuperadas']['progress'] = 0
-    
-    def progress_callback(progress):
-        with background_lock:
-            background_tasks[setor]['ligacoesRecuperadas']['progress'] = progress
-    
-    def executar_atualizacao():
+def pedido_relatorio(relatorio, periodo, progress_callback=None, checkpoint=True, prazo=None):
+    """Corrotina do motor que busca um relatório em todas as fontes do Escallo e une os registros.
+    
+    `prazo` (Prazo) limita a coleta inteira; sem ele vale PRAZO_COLETA_SEGUNDOS a partir de agora.
+    """
+    payload = PAYLOADS_RELATORIO[relatorio](*periodo)
+    prazo = prazo or Prazo(PRAZO_COLETA_SEGUNDOS)
+    
+    def buscar(fonte, progresso_fonte):
+        if relatorio == 'rel025':
+            return motor_coleta.buscar_unico(fonte.host, fonte.token, relatorio, payload, prazo=30, prazo_total=prazo)
+        return motor_coleta.buscar_paginado(fonte.host, fonte.token, relatorio, payload,
+                                            progress_callback=progresso_fonte,
+                                            checkpoint=checkpoint_coleta(fonte, relatorio, *periodo) if checkpoint else None,
+                                            prazo_total=prazo, max_paginas=MAX_PAGINAS_COLETA)
+    
+    return motor_coleta.buscar_em_fontes(FONTES, buscar, progress_callback)
+
+def consultar_fontes(relatorio, periodo):
+    """Busca um relatório do período em todas as fontes pelo motor, sem checkpoint (rotas de teste e debug)"""
+    try:
+        return motor_coleta.executar(pedido_relatorio(relatorio, periodo, checkpoint=False),
+                                     timeout=PRAZO_COLETA_SEGUNDOS + FOLGA_PRAZO_SEGUNDOS)
+    except concurrent.futures.TimeoutError:
+        return {'error': f'Prazo de {PRAZO_COLETA_SEGUNDOS}s da consulta esgotado'}
+
+def pedido_coleta(tipo, periodo, progress_callback=None, prazo=None):
+    """Corrotina do motor que busca no Escallo os dados de um tipo de cache"""
+    return pedido_relatorio(RELATORIO_POR_TIPO.get(tipo, 'rel025'), periodo, progress_callback, prazo=prazo)
+
+def coletar_tipo(tipo, tarefa):
+    """Tarefa da fila: busca um tipo no Escallo uma única vez e aplica para todos os setores.
+    
+    Em erro o cache fica como estava, o erro vai para background_tasks e a
+    tarefa termina com RuntimeError. Uma paginação incompleta também termina
+    em erro (depois de aplicada onde não havia dados completos), para que a
+    próxima tentativa retome do checkpoint.
+    """
+    periodo = calcular_periodo(tipo)
+    setores = list(SETORES.keys())
+    
+    def progresso(paginas, total_paginas):
+        tarefa.progresso(paginas, total_paginas)
+        for setor in setores:
+            if tipo in background_tasks[setor]:
+                atualizar_tarefa(setor, tipo, progress=tarefa.percentual)
+    
+    with monitor_memoria.medir(f'coleta:{tipo}'):
+        marcar_background(tipo, True)
         try:
-            # app.logger.info(f"🎬 Iniciando atualização em background de ligações recuperadas para {setor}...")
-            
-            # Buscar dados do mês inteiro
-            hoje = datetime.now()
-            primeiro_dia_mes = hoje.replace(day=1)
-            ultimo_dia_mes = (primeiro_dia_mes + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-            data_inicial = primeiro_dia_mes.strftime('%Y-%m-%d')
-            data_final = ultimo_dia_mes.strftime('%Y-%m-%d')
-            
-            resultados_api = buscar_dados_ligacoes_recuperadas(data_inicial, data_final, progress_callback)
-            
+            prazo = Prazo(PRAZO_COLETA_SEGUNDOS)
+            futuro = motor_coleta.submeter(pedido_coleta(tipo, periodo, progresso, prazo))
+            tarefa.ao_cancelar(futuro.cancel)
+            try:
+                resultados_api = futuro.result(prazo.restante() + FOLGA_PRAZO_SEGUNDOS)
+            except concurrent.futures.TimeoutError:
+                futuro.cancel()
+                resultados_api = {'error': f'Prazo de {PRAZO_COLETA_SEGUNDOS}s da coleta esgotado'}
+        
             if isinstance(resultados_api, dict) and 'error' in resultados_api:
-                app.logger.error(f"Erro ao buscar ligações recuperadas para {setor}: {resultados_api['error']}")
-                with background_lock:
-                    background_tasks[setor]['ligacoesRecuperadas']['error'] = resultados_api['error']
-                return
-            
-            # Processar dados
-            atendentes = SETORES.get(setor, [])
-            dados_processados = processar_dados_ligacoes_recuperadas(atendentes, resultados_api, 'background', setor)
-            
-            # Atualizar cache
-            with cache_lock:
-                cache_key = get_cache_key(setor, 'ligacoesRecuperadas')
-                cache[setor]['ligacoesRecuperadas']['data'] = dados_processados
-                cache[setor]['ligacoesRecuperadas']['timestamp'] = datetime.now()
-                cache[setor]['ligacoesRecuperadas']['hash'] = calcular_hash(dados_processados)
-                cache[setor]['ligacoesRecuperadas']['periodo'] = f"{data_inicial} a {data_final}"
-            
-            # app.logger.info(f"✅ Atualização em background de ligações recuperadas para {setor} concluída!")
-            
+                raise RuntimeError(resultados_api['error'])
+        
+            descricao = descrever_periodo(tipo, *periodo)
+            guardar_dados_brutos(tipo, resultados_api, descricao)
+            contagem_fontes = contar_por_fonte(RELATORIO_POR_TIPO.get(tipo, 'rel025'), resultados_api)
+            # Processar só o que mudou e atualizar cache
+            for setor in setores:
+                if setor in SETORES:
+                    aplicar_coleta(setor, tipo, resultados_api, descricao, get_cache_key(setor, tipo),
+                                   contagem_fontes=contagem_fontes)
+            if getattr(resultados_api, 'completo', True):
+                atualizar_kpis(tipo, resultados_api, periodo)
+                if tipo == 'ligacoesAtivasMes':
+                    atualizar_duracoes(resultados_api, periodo)
+        
+            if not getattr(resultados_api, 'completo', True):
+                raise RuntimeError(f"Coleta incompleta: {resultados_api.falha}")
+        except concurrent.futures.CancelledError:
+            raise
         except Exception as e:
-            app.logger.error(f"❌ Erro na atualização em background de ligações recuperadas para {setor}: {str(e)}")
-            app.logger.error(traceback.format_exc())
-            with background_lock:
-                background_tasks[setor]['ligacoesRecuperadas']['error'] = str(e)
+            app.logger.error(f"❌ Erro na atualização de {tipo}: {str(e)}")
+            for setor in setores:
+                if tipo in background_tasks[setor]:
+                    atualizar_tarefa(setor, tipo, error=str(e))
+            raise
         finally:
-            with background_lock:
-                background_tasks[setor]['ligacoesRecuperadas']['is_running'] = False
-                background_tasks[setor]['ligacoesRecuperadas']['last_completed'] = datetime.now()
-                background_tasks[setor]['ligacoesRecuperadas']['progress'] = 100
-    
-    thread = threading.Thread(target=executar_atualizacao, daemon=True)
-    thread.start()
+            marcar_background(tipo, False)
+
+def agendar_coleta(tipo, prioridade=None):
+    """Coloca a atualização de um tipo na fila (uma por tipo, na fila ou rodando) e retorna a Tarefa"""
+    base = PRIORIDADE_PEDIDO if prioridade is None else prioridade
+    return fila_atualizacoes.agendar(('coleta', tipo), lambda tarefa: coletar_tipo(tipo, tarefa),
+                                     base + PRIORIDADE_AQUECIMENTO.index(tipo))
+
+def atualizar_cache_background(setor, tipo):
+    """Atualiza o cache de um tipo em background (a coleta vale para todos os setores)"""
+    if MODO == 'api':
+        snapshot_store.solicitar_atualizacao(setor, tipo)
+        return None
+    return agendar_coleta(tipo)
+
+def dados_vazios(setor, tipo):
+    """Dados processados sem registros, para quando o Escallo falha e não há cache"""
+    atendentes = SETORES.get(setor, [])
+    cache_key = get_cache_key(setor, tipo)
+    if tipo == 'ligacoesAtivasMes':
+        return processar_dados_ligacoes_ativas(atendentes, [], cache_key, setor)
+    if tipo == 'ligacoesRecuperadas':
+        return processar_dados_ligacoes_recuperadas(atendentes, [], cache_key, setor)
+    return processar_dados(atendentes, [], cache_key, setor)
+
+def cache_expirado(entrada):
+    """Entrada sem dados ou mais velha que CACHE_DURATION_HOURS (RETOMADA_INCOMPLETA_SEGUNDOS se a paginação parou no meio)"""
+    if entrada['data'] is None:
+        return True
+    if not entrada['timestamp']:
+        return False
+    idade = (datetime.now() - entrada['timestamp']).total_seconds()
+    if entrada['completo'] is False and entrada['paginas']:
+        return idade > RETOMADA_INCOMPLETA_SEGUNDOS
+    return idade > CACHE_DURATION_HOURS * 3600
 
 def atualizar_cache(setor, tipo, force=False, background=False):
     """Atualiza o cache se necessário para um setor específico"""
@@ -856,144 +1691,51 @@ def atualizar_cache(setor, tipo, force=False, background=False):
         app.logger.error(f"❌ Setor {setor} não encontrado")
         return None
     
-    # app.logger.info(f"🔄 ATUALIZAR_CACHE chamado - Setor: {setor}, Tipo: {tipo}, Force: {force}")
-    
-    # Para ligações ativas, se for forçar e background estiver habilitado, usar background
-    if tipo == 'ligacoesAtivasMes' and force and BACKGROUND_UPDATE_ENABLED:
-        with background_lock:
-            if background_tasks[setor]['ligacoesAtivasMes']['is_running']:
-                # app.logger.info(f"Atualização em background para {setor} já está em execução, aguardando...")
-                pass
-            else:
-                atualizar_cache_ligacoes_ativas_background(setor)
-        
-        return cache[setor][tipo]['data']
-    
-    # Para ligações recuperadas, se for forçar e background estiver habilitado, usar background
-    if tipo == 'ligacoesRecuperadas' and force and BACKGROUND_UPDATE_ENABLED:
-        with background_lock:
-            if background_tasks[setor]['ligacoesRecuperadas']['is_running']:
-                # app.logger.info(f"Atualização em background de ligações recuperadas para {setor} já está em execução")
-                pass
-            else:
-                atualizar_cache_ligacoes_recuperadas_background(setor)
-        
-        # Retornar cache atual se existir
-        with cache_lock:
-            if cache[setor]['ligacoesRecuperadas']['data']:
-                return cache[setor]['ligacoesRecuperadas']['data']
+    # No modo api quem busca no Escallo é o coletor; aqui só lemos o snapshot publicado
+    if MODO == 'api':
+        if force:
+            snapshot_store.solicitar_atualizacao(setor, tipo)
+        return snapshot_store.ler(setor, tipo)
+    
+    # Ligações ativas e recuperadas, se for forçar e background estiver habilitado:
+    # agenda a atualização e responde o cache atual
+    if force and BACKGROUND_UPDATE_ENABLED and tipo in background_tasks[setor]:
+        atualizar_cache_background(setor, tipo)
+        # Sem cache de ligações recuperadas, espera a atualização recém-agendada
+        if tipo == 'ligacoesAtivasMes' or cache[setor][tipo]['data']:
+            return cache[setor][tipo]['data']
+    
+    if cache[setor][tipo]['data'] is None:
+        aguardar_aquecimento(tipo)
+    
+    # Leitura sem lock: a entrada é imutável e só a referência é trocada
+    entrada = cache[setor][tipo]
+    if not force and not cache_expirado(entrada):
+        return entrada['data']
+    
+    # A busca passa pela fila: pedidos simultâneos do mesmo tipo esperam a mesma tarefa
+    try:
+        agendar_coleta(tipo).aguardar(PRAZO_COLETA_SEGUNDOS)
+    except Exception as e:
+        # Se houver erro na API, mantém dados antigos
+        app.logger.error(f"Erro ao buscar dados para {setor} - {tipo}: {str(e) or type(e).__name__}")
+        if cache[setor][tipo]['data'] is not None:
+            app.logger.warning(f"Retornando cache antigo para {setor} - {tipo} devido a erro na API")
+            trocar_entrada(setor, tipo, timestamp=datetime.now())
+        else:
+            gravar_cache(setor, tipo, dados_vazios(setor, tipo), descrever_periodo(tipo, *calcular_periodo(tipo)),
+                         completo=False)
     
-    with cache_lock:
-        cache_key = get_cache_key(setor, tipo)
-        
-        precisa_atualizar = force or cache[setor][tipo]['data'] is None
-        
-        if not precisa_atualizar and cache[setor][tipo]['timestamp']:
-            tempo_passado = datetime.now() - cache[setor][tipo]['timestamp']
-            precisa_atualizar = tempo_passado.total_seconds() > (CACHE_DURATION_HOURS * 3600)
-        
-        if precisa_atualizar:
-            try:
-                # app.logger.info(f"🔄 Atualizando cache para {setor} - {tipo}")
-                
-                hoje = datetime.now()
-                resultados_api = []
-                periodo = ""
-                atendentes = SETORES.get(setor, [])
-                
-                # app.logger.info(f"📋 Atendentes do setor {setor}: {len(atendentes)}")
-                # app.logger.info(f"📋 Códigos: {[a['codigo'] for a in atendentes]}")
-                
-                if tipo == 'hoje':
-                    data_hoje = hoje.strftime('%Y-%m-%d')
-                    resultados_api = buscar_dados_escallo(data_hoje, data_hoje)
-                    periodo = data_hoje
-                elif tipo == 'mes':
-                    primeiro_dia_mes = hoje.replace(day=1)
-                    ultimo_dia_mes = (primeiro_dia_mes + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-                    data_inicial = primeiro_dia_mes.strftime('%Y-%m-%d')
-                    data_final = ultimo_dia_mes.strftime('%Y-%m-%d')
-                    resultados_api = buscar_dados_escallo(data_inicial, data_final)
-                    periodo = f"{data_inicial} a {data_final}"
-                elif tipo == '7dias':
-                    sete_dias_atras = hoje - timedelta(days=7)
-                    data_inicial = sete_dias_atras.strftime('%Y-%m-%d')
-                    data_final = hoje.strftime('%Y-%m-%d')
-                    resultados_api = buscar_dados_escallo(data_inicial, data_final)
-                    periodo = f"{data_inicial} a {data_final}"
-                elif tipo == 'ligacoesAtivasMes':
-                    primeiro_dia_mes = hoje.replace(day=1)
-                    ultimo_dia_mes = (primeiro_dia_mes + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-                    data_inicial = primeiro_dia_mes.strftime('%Y-%m-%d')
-                    data_final = ultimo_dia_mes.strftime('%Y-%m-%d')
-                    resultados_api = buscar_dados_ligacoes_ativas(data_inicial, data_final)
-                    periodo = f"{data_inicial} a {data_final}"
-                elif tipo == 'ligacoesRecuperadas':
-                    # Buscar dados do mês inteiro para processar dia e mês juntos
-                    primeiro_dia_mes = hoje.replace(day=1)
-                    ultimo_dia_mes = (primeiro_dia_mes + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-                    data_inicial = primeiro_dia_mes.strftime('%Y-%m-%d')
-                    data_final = ultimo_dia_mes.strftime('%Y-%m-%d')
-                    resultados_api = buscar_dados_ligacoes_recuperadas(data_inicial, data_final)
-                    periodo = f"{data_inicial} a {data_final}"
-                else:
-                    return None
-                
-                # Se houver erro na API, mantém dados antigos
-                if isinstance(resultados_api, dict) and 'error' in resultados_api:
-                    app.logger.error(f"Erro ao buscar dados para {setor} - {tipo}: {resultados_api['error']}")
-                    if cache[setor][tipo]['data'] is not None:
-                        app.logger.warning(f"Retornando cache antigo para {setor} - {tipo} devido a erro na API")
-                        cache[setor][tipo]['timestamp'] = datetime.now()
-                        return cache[setor][tipo]['data']
-                    else:
-                        if tipo == 'ligacoesAtivasMes':
-                            dados_processados = processar_dados_ligacoes_ativas(atendentes, [], cache_key, setor)
-                        elif tipo == 'ligacoesRecuperadas':
-                            dados_processados = processar_dados_ligacoes_recuperadas(atendentes, [], cache_key, setor)
-                        else:
-                            dados_processados = processar_dados(atendentes, [], cache_key, setor)
-                else:
-                    if tipo == 'ligacoesAtivasMes':
-                        dados_processados = processar_dados_ligacoes_ativas(atendentes, resultados_api, cache_key, setor)
-                    elif tipo == 'ligacoesRecuperadas':
-                        dados_processados = processar_dados_ligacoes_recuperadas(atendentes, resultados_api, cache_key, setor)
-                    else:
-                        dados_processados = processar_dados(atendentes, resultados_api, cache_key, setor)
-                
-                # Atualiza cache apenas se dados foram processados com sucesso
-                cache[setor][tipo]['data'] = dados_processados
-                cache[setor][tipo]['timestamp'] = datetime.now()
-                cache[setor][tipo]['hash'] = calcular_hash(dados_processados)
-                cache[setor][tipo]['periodo'] = periodo
-                
-                # app.logger.info(f"✅ Cache {setor} - {tipo} atualizado com sucesso: {len(dados_processados.get('data', []))} registros")
-                return dados_processados
-                
-            except Exception as e:
-                app.logger.error(f"❌ Erro crítico ao atualizar cache {setor} - {tipo}: {str(e)}")
-                app.logger.error(traceback.format_exc())
-                if cache[setor][tipo]['data'] is not None:
-                    return cache[setor][tipo]['data']
-                else:
-                    if tipo == 'ligacoesAtivasMes':
-                        return processar_dados_ligacoes_ativas(atendentes, [], cache_key, setor)
-                    elif tipo == 'ligacoesRecuperadas':
-                        return processar_dados_ligacoes_recuperadas(atendentes, [], cache_key, setor)
-                    else:
-                        return processar_dados(atendentes, [], cache_key, setor)
-        
-        # app.logger.info(f"📦 Retornando dados do cache para {setor} - {tipo}")
-        return cache[setor][tipo]['data']
+    return cache[setor][tipo]['data']
 
 def iniciar_atualizador_periodico():
     """Inicia thread para atualização periódica do cache de todos os setores"""
     def atualizador():
         while True:
             try:
-                for setor in SETORES.keys():
-                    for tipo in ['hoje', 'mes', '7dias']:
-                        atualizar_cache(setor, tipo, force=False)
+                for tipo in ['hoje', 'mes', '7dias']:
+                    if any(cache_expirado(cache[setor][tipo]) for setor in SETORES.keys()):
+                        agendar_coleta(tipo, PRIORIDADE_PERIODICA)
                 
                 time.sleep(1800)
                 
@@ -1003,69 +1745,488 @@ def iniciar_atualizador_periodico():
     
     thread = threading.Thread(target=atualizador, daemon=True)
     thread.start()
-    # app.logger.info("Atualizador periódico iniciado para todos os setores")
 
 def iniciar_atualizador_ligacoes_background():
-    """Inicia thread para atualização periódica de ligações ativas em background para todos os setores"""
+    """Inicia thread para atualização periódica de ligações ativas e recuperadas (a cada 2 horas)"""
     def atualizador_ligacoes():
+        while True:
+            time.sleep(7200)
+            for tipo in ['ligacoesAtivasMes', 'ligacoesRecuperadas']:
+                try:
+                    agendar_coleta(tipo, PRIORIDADE_PERIODICA)
+                except Exception as e:
+                    app.logger.error(f"Erro no atualizador de {tipo}: {str(e)}")
+    
+    thread = threading.Thread(target=atualizador_ligacoes, daemon=True)
+    thread.start()
+
+def buscar_fim_do_dia(tipo, dia, horario_inicial):
+    """Registros do dia a partir de um horário (uma página na maioria das consultas)"""
+    relatorio, montar_payload = ACOMPANHAMENTO_HOJE[tipo][:2]
+    payload = montar_payload(dia, dia)
+    payload['horarioInicial'] = horario_inicial
+    # A lista é montada antes de aplicar: uma falha no meio não pode adiantar o cursor
+    return list(iterar_registros_escallo(relatorio, payload, prazo=Prazo(PRAZO_TEMPO_REAL_SEGUNDOS)))
+
+def publicar_tempo_real(tipo):
+    """Remonta os dados de todos os setores com as contagens atuais do acompanhamento do dia"""
+    _, montar = CONTADORES_POR_TIPO[tipo]
+    for setor in list(SETORES.keys()):
+        with cache_lock:
+            entrada = cache[setor][tipo]
+            if entrada['data'] is None or not entrada.get('contadores') or entrada.get('atendentes') is None:
+                continue
+            contadores = sobrepor_tempo_real(tipo, entrada['contadores'])
+            dados_processados = montar(entrada['atendentes'], contadores, get_cache_key(setor, tipo), setor)
+            dados_processados['fontes'] = entrada['data'].get('fontes')
+            # Mantém o timestamp e a origem da última varredura: só as contagens do dia mudaram
+            gravar_cache(setor, tipo, dados_processados, entrada['periodo'], entrada['timestamp'],
+                         paginas=entrada['paginas'], contadores=entrada['contadores'],
+                         ultima_pagina=entrada['ultima_pagina'], atendentes=entrada['atendentes'],
+                         completo=entrada['completo'])
+    if sobrepor_kpis_tempo_real(tipo):
+        publicar_kpis()
+
+def acompanhar_hoje():
+    """Uma rodada do acompanhamento do dia para os tipos em ACOMPANHAMENTO_HOJE"""
+    agora = datetime.now()
+    dia = agora.strftime('%Y-%m-%d')
+    for tipo, (_, _, campo_id, campo_data, classificar, _, _) in ACOMPANHAMENTO_HOJE.items():
+        seguidor = seguidores_hoje.get(tipo)
+        if (seguidor is None or seguidor.dia != dia
+                or (agora - seguidor.criado_em).total_seconds() > INTERVALO_RESSINCRONIA_HOJE):
+            # Dia inteiro num seguidor novo, trocado de uma vez quando pronto
+            novo = SeguidorHoje(campo_id, campo_data, classificar, dia)
+            novo.aplicar(buscar_fim_do_dia(tipo, dia, '00:00:01'))
+            seguidores_hoje[tipo] = novo
+            mudou = seguidor is None or seguidor.contagens() != novo.contagens()
+        else:
+            mudou = seguidor.aplicar(buscar_fim_do_dia(tipo, dia, seguidor.horario_inicial(MARGEM_TEMPO_REAL))) > 0
+        if rastreio_tempo_real.ativo:
+            rastreio_tempo_real('rodada', tipo=tipo, dia=dia, mudou=mudou, estado=seguidores_hoje[tipo].estado)
+        
+        if mudou:
+            publicar_tempo_real(tipo)
+
+def iniciar_acompanhamento_hoje():
+    """Consulta o fim do dia a cada INTERVALO_TEMPO_REAL segundos"""
+    def acompanhador():
         while True:
             try:
-                time.sleep(7200)
-                
-                for setor in SETORES.keys():
-                    with background_lock:
-                        if background_tasks[setor]['ligacoesAtivasMes']['is_running']:
-                            # app.logger.info(f"Atualização de ligações para {setor} já está em execução, pulando...")
-                            continue
-                    
-                    atualizar_cache_ligacoes_ativas_background(setor)
-                    time.sleep(10)
-                
+                with monitor_memoria.medir('tempo_real'):
+                    acompanhar_hoje()
             except Exception as e:
-                app.logger.error(f"Erro no atualizador de ligações: {str(e)}")
-                time.sleep(600)
+                app.logger.error(f"Erro no acompanhamento do dia: {str(e)}")
+            time.sleep(INTERVALO_TEMPO_REAL)
     
-    thread = threading.Thread(target=atualizador_ligacoes, daemon=True)
+    thread = threading.Thread(target=acompanhador, daemon=True)
     thread.start()
-    # app.logger.info("Atualizador periódico de ligações ativas iniciado para todos os setores")
 
-def iniciar_atualizador_ligacoes_recuperadas_background():
-    """Inicia thread para atualização periódica de ligações recuperadas em background para todos os setores"""
-    def atualizador_ligacoes_recuperadas():
+def iniciar_processador_pedidos():
+    """No modo coletor, atende os pedidos de atualização feitos pelos workers da API"""
+    def processador():
         while True:
             try:
-                time.sleep(7200)  # A cada 2 horas
-                
-                for setor in SETORES.keys():
-                    with background_lock:
-                        if background_tasks[setor]['ligacoesRecuperadas']['is_running']:
-                            # app.logger.info(f"Atualização de ligações recuperadas para {setor} já está em execução, pulando...")
-                            continue
+                for setor, tipo in snapshot_store.consumir_pedidos():
+                    if setor not in SETORES or tipo not in cache[setor]:
+                        continue
                     
-                    atualizar_cache_ligacoes_recuperadas_background(setor)
-                    time.sleep(10)
-                
+                    # Vários workers/dashboards pedindo juntos viram uma única atualização
+                    timestamp = cache[setor][tipo]['timestamp']
+                    if timestamp and (datetime.now() - timestamp).total_seconds() < INTERVALO_MINIMO_PEDIDOS:
+                        continue
+                    
+                    agendar_coleta(tipo)
+            except Exception as e:
+                app.logger.error(f"Erro no processador de pedidos de atualização: {str(e)}")
+            
+            time.sleep(2)
+    
+    thread = threading.Thread(target=processador, daemon=True)
+    thread.start()
+
+def aquecer_cache_concorrente(tipos=None):
+    """Agenda na fila a busca de todos os tipos e espera cada um terminar.
+    
+    Os relatórios do Escallo não dependem do setor, então cada período é
+    buscado uma única vez e processado para cada setor. As tarefas entram na
+    ordem de PRIORIDADE_AQUECIMENTO e cada tipo é liberado assim que chega,
+    sem esperar os demais. Retorna os tipos que falharam.
+    """
+    tipos = [tipo for tipo in PRIORIDADE_AQUECIMENTO if tipos is None or tipo in tipos]
+    futuros = {agendar_coleta(tipo).futuro: tipo for tipo in tipos}
+    falhas = []
+    try:
+        for futuro in concurrent.futures.as_completed(futuros, timeout=PRAZO_AQUECIMENTO_SEGUNDOS):
+            tipo = futuros.pop(futuro)
+            try:
+                futuro.result()
+                aquecimento['erros'].pop(tipo, None)
+            except Exception as e:
+                erro = str(e) or type(e).__name__
+                app.logger.error(f"Erro ao buscar dados de {tipo} no aquecimento: {erro}")
+                falhas.append(tipo)
+                aquecimento['erros'][tipo] = erro
+            finally:
+                aquecimento_eventos[tipo].set()
+    except concurrent.futures.TimeoutError:
+        for tipo in futuros.values():
+            fila_atualizacoes.cancelar(('coleta', tipo))
+            app.logger.error(f"Prazo do aquecimento esgotado para {tipo}")
+            falhas.append(tipo)
+            aquecimento['erros'][tipo] = 'Prazo do aquecimento esgotado'
+            aquecimento_eventos[tipo].set()
+    
+    return falhas
+
+def inicializar_cache_com_retry():
+    """Inicializa cache com retry em caso de falha (só os tipos que falharam são refeitos)"""
+    max_retries = 3
+    pendentes = list(PRIORIDADE_AQUECIMENTO)
+    aquecimento.update(em_andamento=True, iniciado_em=datetime.now(), concluido_em=None)
+    try:
+        for tentativa in range(max_retries):
+            aquecimento['tentativas'] = tentativa + 1
+            try:
+                pendentes = aquecer_cache_concorrente(pendentes)
+            except Exception as e:
+                app.logger.error(f"Erro no aquecimento concorrente (tentativa {tentativa + 1}): {str(e)}")
+            if not pendentes:
+                return True
+            if tentativa < max_retries - 1:
+                time.sleep(10)
+        return False
+    finally:
+        aquecimento.update(em_andamento=False, concluido_em=datetime.now())
+        for evento in aquecimento_eventos.values():
+            evento.set()
+
+def aguardar_aquecimento(tipo):
+    """Com o cache ainda vazio, espera o aquecimento em andamento em vez de buscar de novo no Escallo"""
+    evento = aquecimento_eventos.get(tipo)
+    if evento is not None and aquecimento['em_andamento']:
+        evento.wait(ESPERA_AQUECIMENTO_SEGUNDOS)
+
+def estado_aquecimento(setor, tipo):
+    """Situação de (setor, tipo): pronto, aquecendo, erro ou pendente"""
+    if MODO == 'api':
+        return 'pronto' if snapshot_store.versao(setor, tipo) else 'pendente'
+    if cache[setor][tipo]['data'] is not None:
+        return 'pronto'
+    if aquecimento['em_andamento'] and not aquecimento_eventos[tipo].is_set():
+        return 'aquecendo'
+    if tipo in aquecimento['erros']:
+        return 'erro'
+    return 'pendente'
+
+def periodo_muda(tipo, referencia):
+    """Se o período do tipo em `referencia` (meia-noite) é outro que o da véspera"""
+    return calcular_periodo(tipo, referencia) != calcular_periodo(tipo, referencia - timedelta(days=1))
+
+def preparar_virada(referencia):
+    """Antes da meia-noite `referencia`, busca os períodos que vão mudar e processa para cada setor.
+    
+    Nada é gravado no cache: retorna {setor: {tipo: argumentos de
+    gravar_cache}} para trocar_virada. Tipos que falharem ficam de fora e
+    são buscados depois da virada.
+    """
+    tipos = [tipo for tipo in PRIORIDADE_AQUECIMENTO if periodo_muda(tipo, referencia)]
+    prazo = Prazo(PRAZO_COLETA_SEGUNDOS)
+    pedidos = {tipo: pedido_coleta(tipo, calcular_periodo(tipo, referencia), prazo=prazo) for tipo in tipos}
+    resultados = motor_coleta.executar(motor_coleta.coletar(pedidos), timeout=prazo.restante() + FOLGA_PRAZO_SEGUNDOS)
+    coletado_em = datetime.now()
+    
+    preparadas = {setor: {} for setor in SETORES}
+    for tipo, resultados_api in resultados.items():
+        if isinstance(resultados_api, dict) and 'error' in resultados_api:
+            app.logger.error(f"Erro ao preparar {tipo} para a virada: {resultados_api['error']}")
+            continue
+        if not getattr(resultados_api, 'completo', True):
+            app.logger.warning(f"{tipo} incompleto na preparação da virada ({resultados_api.falha})")
+            continue
+        periodo = descrever_periodo(tipo, *calcular_periodo(tipo, referencia))
+        contagem_fontes = contar_por_fonte(RELATORIO_POR_TIPO.get(tipo, 'rel025'), resultados_api)
+        for setor, entradas in preparadas.items():
+            entradas[tipo] = dict(processar_coleta(setor, tipo, resultados_api, contagem_fontes, referencia=referencia),
+                                  periodo=periodo, timestamp=coletado_em)
+    return preparadas
+
+def trocar_virada(referencia, preparadas):
+    """Na virada, troca de uma vez os tipos que mudaram em cada setor.
+    
+    Os tipos do mês que seguem no mesmo período têm só a contagem do dia
+    zerada, recontando os dados brutos retidos para o dia novo. Retorna a
+    cópia de dados_brutos tirada antes da troca, com os registros do período
+    que terminou.
+    """
+    with cache_lock:
+        retidos = dict(dados_brutos)
+    
+    for setor in list(SETORES):
+        entradas = dict(preparadas.get(setor, {}))
+        for tipo in CONTADORES_POR_TIPO:
+            bruto = retidos.get(tipo)
+            if (tipo in entradas or bruto is None
+                    or bruto['periodo'] != descrever_periodo(tipo, *calcular_periodo(tipo, referencia))):
+                continue
+            entradas[tipo] = dict(processar_coleta(setor, tipo, bruto['registros'], referencia=referencia),
+                                  periodo=bruto['periodo'], timestamp=bruto['timestamp'])
+        if entradas:
+            gravar_cache_setor(setor, entradas)
+    return retidos
+
+def atualizar_apos_virada(referencia, retidos):
+    """Logo depois da virada: busca de novo os tipos que mudaram e, no dia 1º, arquiva o mês encerrado"""
+    tipos = [tipo for tipo in PRIORIDADE_AQUECIMENTO if periodo_muda(tipo, referencia) or tipo in CONTADORES_POR_TIPO]
+    tarefas = [agendar_coleta(tipo, PRIORIDADE_VIRADA) for tipo in tipos]
+    
+    if virada['mes_pendente']:
+        try:
+            carregar_mes_encerrado(virada['mes_pendente'], retidos)
+        finally:
+            # Deu certo ou não, o arquivador volta a conferir o mês de hora em hora
+            virada['mes_pendente'] = None
+    
+    for tarefa in tarefas:
+        try:
+            tarefa.aguardar(PRAZO_COLETA_SEGUNDOS)
+        except Exception as e:
+            app.logger.error(f"Erro na atualização depois da virada: {str(e) or type(e).__name__}")
+
+def aguardar_ate(momento):
+    time.sleep(max(0, (momento - datetime.now()).total_seconds()))
+
+def iniciar_virada():
+    """Prepara os dados de cada meia-noite antes dela, troca na hora e atualiza logo depois"""
+    def virador():
+        while True:
+            proxima = (datetime.now() + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+            virada.update(proxima=proxima.isoformat(), erro=None)
+            if proxima.day == 1:
+                # Desde já, para o arquivador não buscar no Escallo o mês que vai ser carregado dos dados retidos
+                virada['mes_pendente'] = (proxima - timedelta(days=1)).strftime('%Y-%m')
+            aguardar_ate(proxima - timedelta(seconds=ANTECEDENCIA_VIRADA_SEGUNDOS))
+            
+            preparadas = {}
+            try:
+                with monitor_memoria.medir('virada'):
+                    preparadas = preparar_virada(proxima)
+                virada.update(preparada_em=datetime.now().isoformat(),
+                              tipos_preparados=sorted({tipo for entradas in preparadas.values() for tipo in entradas}))
+            except Exception as e:
+                app.logger.error(f"Erro ao preparar a virada de {proxima:%Y-%m-%d}: {str(e)}")
+                virada['erro'] = str(e)
+            
+            aguardar_ate(proxima)
+            retidos = {}
+            try:
+                retidos = trocar_virada(proxima, preparadas)
+                virada['trocada_em'] = datetime.now().isoformat()
+            except Exception as e:
+                app.logger.error(f"Erro na troca da virada de {proxima:%Y-%m-%d}: {str(e)}")
+                virada['erro'] = str(e)
+            
+            aguardar_ate(proxima + timedelta(seconds=ATRASO_VIRADA_SEGUNDOS))
+            try:
+                atualizar_apos_virada(proxima, retidos)
+                virada['atualizada_em'] = datetime.now().isoformat()
+            except Exception as e:
+                app.logger.error(f"Erro na atualização depois da virada de {proxima:%Y-%m-%d}: {str(e)}")
+                virada['erro'] = str(e)
+    
+    thread = threading.Thread(target=virador, name='virada', daemon=True)
+    thread.start()
+
+def iniciar_arquivador_meses():
+    """Arquiva o mês anterior assim que possível depois da virada (e confere de hora em hora)"""
+    def arquivador():
+        while True:
+            try:
+                # Logo depois da virada o mês é arquivado com os dados retidos (ver atualizar_apos_virada)
+                if virada['mes_pendente'] != mes_anterior():
+                    arquivar_mes(mes_anterior())
+            except Exception as e:
+                app.logger.error(f"Erro ao arquivar o mês anterior: {str(e)}")
+            time.sleep(INTERVALO_ARQUIVADOR)
+    
+    thread = threading.Thread(target=arquivador, daemon=True)
+    thread.start()
+
+def iniciar_monitor_setores():
+    """Verifica periodicamente o arquivo de setores, mesmo sem requisições chegando"""
+    def monitor():
+        while True:
+            time.sleep(INTERVALO_RECARGA_SETORES)
+            try:
+                verificar_registro_setores()
             except Exception as e:
-                app.logger.error(f"Erro no atualizador de ligações recuperadas: {str(e)}")
-                time.sleep(600)
+                app.logger.error(f"Erro no monitor do registro de setores: {str(e)}")
     
-    thread = threading.Thread(target=atualizador_ligacoes_recuperadas, daemon=True)
+    thread = threading.Thread(target=monitor, daemon=True)
+    thread.start()
+
+def iniciar_coleta():
+    """Inicializa o cache e os atualizadores periódicos (modos completo e coletor).
+    
+    Retorna na hora: o aquecimento roda em uma thread e o servidor já pode
+    atender (/health/ready informa o que está pronto). Os atualizadores
+    periódicos só começam depois do aquecimento, para não repetir as buscas.
+    """
+    def aquecer_e_atualizar():
+        # Tenta inicializar o cache
+        if not inicializar_cache_com_retry():
+            # print("⚠️ AVISO: Sistema iniciado com cache vazio. O front-end pode não funcionar até a primeira atualização automática.")
+            pass
+        try:
+            preencher_kpis_mes()
+        except Exception as e:
+            app.logger.error(f"❌ Erro ao preencher os indicadores do mês: {str(e)}")
+        
+        # Inicia thread de atualização periódica
+        iniciar_atualizador_periodico()
+        iniciar_atualizador_ligacoes_background()
+        iniciar_arquivador_meses()
+        iniciar_acompanhamento_hoje()
+        iniciar_virada()
+    
+    aquecimento['em_andamento'] = True
+    thread = threading.Thread(target=aquecer_e_atualizar, name='aquecimento', daemon=True)
     thread.start()
-    # app.logger.info("Atualizador periódico de ligações recuperadas iniciado para todos os setores")
+    
+    iniciar_monitor_setores()
+    if MODO == 'coletor':
+        iniciar_processador_pedidos()
 
 # ==================== ROTAS DA API ====================
 
+@app.before_request
+def checar_registro_setores():
+    """Pega alterações no arquivo de setores também nos workers que só servem requisições"""
+    verificar_registro_setores()
+
+def ordens_dados(setor, tipo, dados):
+    """Ordens da vista para estes dados (reaproveitadas pela versão, quando há uma)"""
+    versao = dados.get('versao')
+    if versao is None:
+        return calcular_ordens(dados)
+    return ordens_vistas.obter((setor, tipo), versao, dados)
+
+def etag_resposta(dados):
+    """ETag de uma resposta de /api/dados/*: versão dos dados mais o estado do background anexado"""
+    if dados.get('versao') is None:
+        return None
+    estado = json.dumps(dados.get('background_info'), sort_keys=True, default=str).encode()
+    return f'"{dados["versao"]}-{impressao_pagina(estado)[:8]}"'
+
+def responder_dados(setor, tipo, dados):
+    """Responde os dados com ETag, ou 304 se o cliente já tem esta versão (If-None-Match).
+    
+    Detalhes do corpo em corpo_dados.
+    """
+    etag = etag_resposta(dados)
+    if etag and etag in request.headers.get('If-None-Match', ''):
+        if rastreio_api.ativo:
+            rastreio_api('304', setor=setor, tipo=tipo, etag=etag)
+        return Response(status=304, headers={'ETag': etag, 'Cache-Control': 'no-cache'})
+    if rastreio_api.ativo:
+        rastreio_api('resposta', setor=setor, tipo=tipo, versao=dados.get('versao'),
+                     desde=request.args.get(DESDE_PARAM), vista=lambda: {nome: request.args[nome] for nome in
+                                                                          PARAMETROS_VISTA if nome in request.args})
+    
+    resposta = corpo_dados(setor, tipo, dados)
+    if etag and resposta.status_code == 200:
+        resposta.headers.update({'ETag': etag, 'Cache-Control': 'no-cache'})
+    return resposta
+
+def corpo_dados(setor, tipo, dados):
+    """Os dados completos ou, se o cliente mandou `desde`, só as linhas que mudaram.
+    
+    Se a versão do cliente já não está no histórico, vai a resposta completa.
+    Com sort/limit/offset/fields vai só a vista pedida (e, em delta, o que
+    mudou entre a vista da versão do cliente e a atual).
+    """
+    desde = request.args.get(DESDE_PARAM, type=int)
+    try:
+        vista = ler_parametros(request.args)
+        if vista is not None:
+            atual = aplicar_vista(dados, ordens_dados(setor, tipo, dados), vista)
+            anterior = None
+            if desde is not None and dados.get('versao') is not None:
+                anterior = historico_versoes.obter((setor, tipo), desde)
+            if anterior is None:
+                return jsonify(atual)
+            anterior = aplicar_vista(anterior, ordens_dados(setor, tipo, anterior), vista)
+            return jsonify(calcular_delta(anterior, atual, desde, dados['versao']))
+    except ValueError as e:
+        # Response (e não tupla) para quem chama poder olhar o status e os cabeçalhos
+        resposta = jsonify({'error': str(e)})
+        resposta.status_code = 400
+        return resposta
+    
+    if desde is not None and dados.get('versao') is not None:
+        delta = historico_versoes.delta((setor, tipo), desde, dados, dados['versao'])
+        if delta is not None:
+            return jsonify(delta)
+    return jsonify(dados)
+
+def responder_snapshot(setor, tipo, force=False):
+    """Resposta das rotas de dados no modo api: serve o snapshot publicado pelo coletor"""
+    if setor not in SETORES:
+        return jsonify({'error': f'Setor {setor} não encontrado ou dados não disponíveis'}), 404
+    
+    if force:
+        snapshot_store.solicitar_atualizacao(setor, tipo)
+    
+    versao, payload = snapshot_store.ler_bytes(setor, tipo)
+    if payload is None:
+        return jsonify({'error': f'Dados de {tipo} para {setor} ainda não publicados pelo coletor'}), 503
+    
+    # A versão do snapshot é o ETag: se o cliente já tem essa versão, nada é enviado
+    etag = f'"{versao}"'
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache', 'X-Snapshot-Version': str(versao)}
+    if etag in request.headers.get('If-None-Match', ''):
+        return Response(status=304, headers=headers)
+    
+    # Cada versão vista por este worker é decodificada uma vez e guardada para os deltas
+    if historico_versoes.obter((setor, tipo), versao) is None:
+        dados = snapshot_store.ler(setor, tipo)
+        if dados is not None:
+            historico_versoes.registrar((setor, tipo), dados['versao'], dados)
+    
+    if request.args.get(DESDE_PARAM) is not None or any(nome in request.args for nome in PARAMETROS_VISTA):
+        dados = historico_versoes.obter((setor, tipo), versao)
+        if dados is not None:
+            resposta = responder_dados(setor, tipo, dados)
+            # Um erro nos parâmetros da vista não leva o ETag do snapshot
+            if resposta.status_code in (200, 304):
+                resposta.headers.update(headers)
+            return resposta
+    
+    # O JSON já vem serializado pelo coletor: o arquivo do snapshot vai para o socket pelo
+    # wsgi.file_wrapper (sendfile no gunicorn), sem copiar os bytes para o Python
+    arquivo, tamanho = snapshot_store.abrir(setor, tipo, versao)
+    if arquivo is not None:
+        resposta = Response(wrap_file(request.environ, arquivo), mimetype='application/json', headers=headers,
+                            direct_passthrough=True)
+        resposta.content_length = tamanho
+        return resposta
+    # O coletor publicou outra versão no meio do caminho: envia a já mapeada, que bate com o ETag
+    return Response(bytes(payload), mimetype='application/json', headers=headers)
+
 @app.route('/api/teste-ligacoes-recuperadas', methods=['GET'])
 def teste_ligacoes_recuperadas():
-    """Rota de teste direto para debug"""
+    """Rota de teste direto para debug (rel030 de hoje em todas as fontes)"""
     hoje = datetime.now().strftime('%Y-%m-%d')
     # app.logger.info(f"🧪 TESTE DIRETO LIGAÇÕES RECUPERADAS - {hoje}")
     
-    resultados = buscar_dados_ligacoes_recuperadas(hoje, hoje)
+    resultados = consultar_fontes('rel030', (hoje, hoje))
+    if isinstance(resultados, dict) and 'error' in resultados:
+        return jsonify({'error': resultados['error']}), 500
     
     return jsonify({
         'data_consulta': hoje,
         'total_registros': len(resultados),
+        'por_fonte': resultados.por_fonte,
         'primeiros_registros': resultados[:10] if resultados else [],
         'registros_concluidos': [r for r in resultados if isinstance(r, dict) and r.get('status') == 'Concluído'],
         'contagem_status': {
@@ -1082,25 +2243,26 @@ def debug_info():
         'servidor': {
             'data_hora': datetime.now().isoformat(),
             'cache_duration_hours': CACHE_DURATION_HOURS,
-            'host_escallo': HOST,
-            'token_length': len(TOKEN) if TOKEN else 0,
+            'fontes': [fonte.estado() for fonte in FONTES],
             'background_update_enabled': BACKGROUND_UPDATE_ENABLED,
             'setores_disponiveis': list(SETORES.keys()),
             'total_atendentes': {setor: len(atendentes) for setor, atendentes in SETORES.items()}
         },
         'cache': {},
-        'background_tasks': background_tasks,
+        'background_tasks': {setor: {tipo: dict(task) for tipo, task in tarefas.items()}
+                             for setor, tarefas in background_tasks.items()},
         'api_test': {}
     }
     
     try:
         hoje = datetime.now().strftime('%Y-%m-%d')
-        test_result = buscar_dados_escallo(hoje, hoje)
+        test_result = consultar_fontes('rel025', (hoje, hoje))
         info['api_test'] = {
             'status': 'success' if not isinstance(test_result, dict) or 'error' not in test_result else 'error',
             'result_type': type(test_result).__name__,
             'result_length': len(test_result) if isinstance(test_result, list) else 0,
-            'has_error': 'error' in test_result if isinstance(test_result, dict) else False
+            'has_error': 'error' in test_result if isinstance(test_result, dict) else False,
+            'por_fonte': getattr(test_result, 'por_fonte', None)
         }
     except Exception as e:
         info['api_test'] = {'status': 'exception', 'error': str(e)}
@@ -1125,14 +2287,14 @@ def debug_info():
 def dados_mes():
     """Rota para obter dados do mês atual"""
     setor = request.args.get(SETOR_PARAM, 'suporte')
-    # app.logger.info(f"📥 /api/dados/mes - Setor recebido: {setor}")
     force = request.args.get(FORCE_REFRESH_PARAM, 'false').lower() == 'true'
+    if MODO == 'api':
+        return responder_snapshot(setor, 'mes', force)
+    
     dados = atualizar_cache(setor, 'mes', force=force)
     
     if dados:
-        dados['setor'] = setor
-        # app.logger.info(f"📤 Respondendo /api/dados/mes: {len(dados.get('data', []))} registros para setor {setor}")
-        return jsonify(dados)
+        return responder_dados(setor, 'mes', compor_resposta(setor, 'mes', dados))
     else:
         app.logger.error(f"❌ Setor {setor} não encontrado em /api/dados/mes")
         return jsonify({'error': f'Setor {setor} não encontrado ou dados não disponíveis'}), 404
@@ -1141,14 +2303,14 @@ def dados_mes():
 def dados_hoje():
     """Rota para obter dados do dia atual"""
     setor = request.args.get(SETOR_PARAM, 'suporte')
-    # app.logger.info(f"📥 /api/dados/hoje - Setor recebido: {setor}")
     force = request.args.get(FORCE_REFRESH_PARAM, 'false').lower() == 'true'
+    if MODO == 'api':
+        return responder_snapshot(setor, 'hoje', force)
+    
     dados = atualizar_cache(setor, 'hoje', force=force)
     
     if dados:
-        dados['setor'] = setor
-        # app.logger.info(f"📤 Respondendo /api/dados/hoje: {len(dados.get('data', []))} registros para setor {setor}")
-        return jsonify(dados)
+        return responder_dados(setor, 'hoje', compor_resposta(setor, 'hoje', dados))
     else:
         app.logger.error(f"❌ Setor {setor} não encontrado em /api/dados/hoje")
         return jsonify({'error': f'Setor {setor} não encontrado ou dados não disponíveis'}), 404
@@ -1158,11 +2320,13 @@ def dados_ultimos_7_dias():
     """Rota para obter dados dos últimos 7 dias"""
     setor = request.args.get(SETOR_PARAM, 'suporte')
     force = request.args.get(FORCE_REFRESH_PARAM, 'false').lower() == 'true'
+    if MODO == 'api':
+        return responder_snapshot(setor, '7dias', force)
+    
     dados = atualizar_cache(setor, '7dias', force=force)
     
     if dados:
-        dados['setor'] = setor
-        return jsonify(dados)
+        return responder_dados(setor, '7dias', compor_resposta(setor, '7dias', dados))
     else:
         return jsonify({'error': f'Setor {setor} não encontrado ou dados não disponíveis'}), 404
 
@@ -1171,24 +2335,14 @@ def dados_ligacoes_ativas_mes():
     """Rota para obter o total de ligações ativas (atendidas) no mês, por atendente"""
     try:
         setor = request.args.get(SETOR_PARAM, 'suporte')
-        # app.logger.info(f"📥 /api/dados/ligacoes-ativas-mes - Setor recebido: {setor}")
         force = request.args.get(FORCE_REFRESH_PARAM, 'false').lower() == 'true'
+        if MODO == 'api':
+            return responder_snapshot(setor, 'ligacoesAtivasMes', force)
         
         dados = atualizar_cache(setor, 'ligacoesAtivasMes', force=force, background=True)
         
         if dados:
-            with background_lock:
-                dados['background_info'] = {
-                    'is_updating': background_tasks[setor]['ligacoesAtivasMes']['is_running'],
-                    'last_started': background_tasks[setor]['ligacoesAtivasMes']['last_started'].isoformat() if background_tasks[setor]['ligacoesAtivasMes']['last_started'] else None,
-                    'last_completed': background_tasks[setor]['ligacoesAtivasMes']['last_completed'].isoformat() if background_tasks[setor]['ligacoesAtivasMes']['last_completed'] else None,
-                    'progress': background_tasks[setor]['ligacoesAtivasMes']['progress'],
-                    'has_error': background_tasks[setor]['ligacoesAtivasMes']['error'] is not None
-                }
-                dados['setor'] = setor
-            
-            # app.logger.info(f"📤 Respondendo /api/dados/ligacoes-ativas-mes: {len(dados.get('data', []))} registros para setor {setor}")
-            return jsonify(dados)
+            return responder_dados(setor, 'ligacoesAtivasMes', compor_resposta(setor, 'ligacoesAtivasMes', dados))
         else:
             app.logger.error(f"❌ Setor {setor} não encontrado em /api/dados/ligacoes-ativas-mes")
             return jsonify({'error': f'Setor {setor} não encontrado ou dados não disponíveis'}), 404
@@ -1203,41 +2357,15 @@ def dados_ligacoes_recuperadas():
     """Rota para obter o total de ligações recuperadas no dia e no mês, por atendente"""
     try:
         setor = request.args.get(SETOR_PARAM, 'suporte')
-        # app.logger.info(f"📥 /api/dados/ligacoes-recuperadas - Setor recebido: {setor}")
         force = request.args.get(FORCE_REFRESH_PARAM, 'false').lower() == 'true'
+        if MODO == 'api':
+            return responder_snapshot(setor, 'ligacoesRecuperadas', force)
         
-        # Para ligações recuperadas, usar background se for forçar
-        if force and BACKGROUND_UPDATE_ENABLED:
-            with background_lock:
-                if background_tasks[setor]['ligacoesRecuperadas']['is_running']:
-                    # app.logger.info(f"Atualização em background para {setor} já está em execução")
-                    pass
-                else:
-                    atualizar_cache_ligacoes_recuperadas_background(setor)
-            
-            # Retornar cache atual se existir
-            with cache_lock:
-                if cache[setor]['ligacoesRecuperadas']['data']:
-                    dados = cache[setor]['ligacoesRecuperadas']['data']
-                else:
-                    # Se não houver cache, buscar síncrono
-                    dados = atualizar_cache(setor, 'ligacoesRecuperadas', force=True)
-        else:
-            dados = atualizar_cache(setor, 'ligacoesRecuperadas', force=force)
+        # Forçando, a atualização vai para a fila e o cache atual é respondido (se existir)
+        dados = atualizar_cache(setor, 'ligacoesRecuperadas', force=force)
         
         if dados:
-            with background_lock:
-                dados['background_info'] = {
-                    'is_updating': background_tasks[setor]['ligacoesRecuperadas']['is_running'],
-                    'last_started': background_tasks[setor]['ligacoesRecuperadas']['last_started'].isoformat() if background_tasks[setor]['ligacoesRecuperadas']['last_started'] else None,
-                    'last_completed': background_tasks[setor]['ligacoesRecuperadas']['last_completed'].isoformat() if background_tasks[setor]['ligacoesRecuperadas']['last_completed'] else None,
-                    'progress': background_tasks[setor]['ligacoesRecuperadas']['progress'],
-                    'has_error': background_tasks[setor]['ligacoesRecuperadas']['error'] is not None
-                }
-                dados['setor'] = setor
-            
-            # app.logger.info(f"📤 Respondendo /api/dados/ligacoes-recuperadas: {len(dados.get('dia', []))} registros para setor {setor}")
-            return jsonify(dados)
+            return responder_dados(setor, 'ligacoesRecuperadas', compor_resposta(setor, 'ligacoesRecuperadas', dados))
         else:
             app.logger.error(f"❌ Setor {setor} não encontrado em /api/dados/ligacoes-recuperadas")
             return jsonify({'error': f'Setor {setor} não encontrado ou dados não disponíveis'}), 404
@@ -1247,15 +2375,335 @@ def dados_ligacoes_recuperadas():
         app.logger.error(traceback.format_exc())
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/kpis', methods=['GET'])
+def dados_kpis():
+    """Indicadores por atendente de um dia (padrão: hoje) e os totais do mês até ele, da tabela materializada"""
+    setor = request.args.get(SETOR_PARAM, 'suporte')
+    dia = request.args.get('dia') or datetime.now().strftime('%Y-%m-%d')
+    
+    if setor not in SETORES:
+        return jsonify({'error': f'Setor {setor} não encontrado'}), 404
+    try:
+        datetime.strptime(dia, '%Y-%m-%d')
+    except ValueError:
+        return jsonify({'error': 'dia deve estar no formato YYYY-MM-DD'}), 400
+    
+    nomes = {atendente['codigo']: atendente['nome'] for atendente in SETORES[setor]}
+    if MODO == 'api':
+        publicado = snapshot_store.ler(setor, 'kpis')
+        if publicado is None:
+            return jsonify({'error': f'Indicadores de {setor} ainda não publicados pelo coletor'}), 503
+        linhas_por_dia, versao, truncado = publicado['dias'], publicado['versao'], publicado.get('truncado')
+    else:
+        linhas_por_dia = {dia_tabela: tabela_kpis.linhas(dia_tabela, list(nomes)) for dia_tabela in tabela_kpis.dias()}
+        versao, truncado = tabela_kpis.versao, dict(kpis_truncados) or None
+    linhas = linhas_kpis_com_mes(linhas_por_dia, dia, nomes)
+    dias = sorted(linhas_por_dia)
+    
+    return jsonify({
+        'setor': setor,
+        'dia': dia,
+        'data': linhas,
+        'dias_disponiveis': dias,
+        'versao': versao,
+        'truncado': truncado
+    })
+
+@app.route('/api/duracoes', methods=['GET'])
+def dados_duracoes():
+    """Percentis (p50/p90/p99) da duração das ligações ativas atendidas por atendente e do setor.
+    
+    data_inicial/data_final em YYYY-MM-DD (padrão: mês atual); o período sai
+    da junção dos sketches diários.
+    """
+    setor = request.args.get(SETOR_PARAM, 'suporte')
+    padrao_inicial, padrao_final = calcular_periodo('mes')
+    data_inicial = request.args.get('data_inicial') or padrao_inicial
+    data_final = request.args.get('data_final') or padrao_final
+    
+    if setor not in SETORES:
+        return jsonify({'error': f'Setor {setor} não encontrado'}), 404
+    try:
+        datetime.strptime(data_inicial, '%Y-%m-%d')
+        datetime.strptime(data_final, '%Y-%m-%d')
+    except ValueError:
+        return jsonify({'error': 'data_inicial e data_final devem estar no formato YYYY-MM-DD'}), 400
+    
+    sketches = sketches_duracoes(setor, data_inicial, data_final)
+    if sketches is None:
+        return jsonify({'error': f'Durações de {setor} ainda não publicadas pelo coletor'}), 503
+    truncado = duracoes_truncadas['motivo']
+    if MODO == 'api':
+        truncado = (snapshot_store.ler(setor, 'duracoes') or {}).get('truncado')
+    
+    return jsonify({
+        'setor': setor,
+        'periodo': {'data_inicial': data_inicial, 'data_final': data_final},
+        'unidade': 'segundos',
+        'truncado': truncado,
+        'data': [dict(sketches[atendente['codigo']].resumo(), codigo=atendente['codigo'], nome=atendente['nome'])
+                 for atendente in SETORES[setor]],
+        'totais': juntar(sketches.values()).resumo()
+    })
+
+@app.route('/api/dados/periodo', methods=['GET'])
+def dados_periodo():
+    """Rota para obter um relatório em um intervalo de datas livre (data_inicial/data_final em YYYY-MM-DD)"""
+    setor = request.args.get(SETOR_PARAM, 'suporte')
+    relatorio = request.args.get('relatorio', 'atendimentos')
+    data_inicial = request.args.get('data_inicial', '')
+    data_final = request.args.get('data_final', '')
+    force = request.args.get(FORCE_REFRESH_PARAM, 'false').lower() == 'true'
+    
+    if setor not in SETORES:
+        return jsonify({'error': f'Setor {setor} não encontrado'}), 404
+    if relatorio not in RELATORIOS_PERIODO:
+        return jsonify({'error': f'Relatório inválido. Use: {", ".join(RELATORIOS_PERIODO)}'}), 400
+    try:
+        inicio = datetime.strptime(data_inicial, '%Y-%m-%d')
+        fim = datetime.strptime(data_final, '%Y-%m-%d')
+    except ValueError:
+        return jsonify({'error': 'data_inicial e data_final devem estar no formato YYYY-MM-DD'}), 400
+    if fim < inicio or (fim - inicio).days >= MAX_DIAS_PERIODO:
+        return jsonify({'error': f'Intervalo inválido (máximo de {MAX_DIAS_PERIODO} dias)'}), 400
+    
+    try:
+        dados = consultar_periodo(setor, relatorio, data_inicial, data_final, force)
+    except Exception as e:
+        app.logger.error(f"❌ Erro em /api/dados/periodo: {str(e)}")
+        app.logger.error(traceback.format_exc())
+        return jsonify({'error': str(e)}), 500
+    
+    if 'error' in dados:
+        return jsonify({'error': dados['error']}), 502
+    return jsonify(dados)
+
+@app.route('/api/dados/mes/<mes>', methods=['GET'])
+def dados_mes_arquivado(mes):
+    """Rota para obter um mês encerrado (YYYY-MM) direto do arquivo, sem consultar o Escallo"""
+    setor = request.args.get(SETOR_PARAM, 'suporte')
+    if not FORMATO_MES.match(mes):
+        return jsonify({'error': 'Mês deve estar no formato YYYY-MM'}), 400
+    if mes >= datetime.now().strftime('%Y-%m'):
+        return jsonify({'error': f'O mês {mes} ainda não foi encerrado; use /api/dados/mes'}), 400
+    if setor not in SETORES:
+        return jsonify({'error': f'Setor {setor} não encontrado'}), 404
+    
+    dados = ler_mes_arquivado(setor, mes)
+    if dados is None:
+        return jsonify({'error': f'Mês {mes} não arquivado', 'meses_arquivados': arquivo_meses.meses()}), 404
+    
+    versao = impressao_pagina(f"{setor}|{mes}|{dados['arquivado_em']}|{impressao_elenco(setor)}".encode())
+    etag = f'"{versao}"'
+    headers = {'ETag': etag}
+    # Mês encerrado nunca muda: o navegador e proxies podem guardar a resposta indefinidamente.
+    # Não vale para um mês truncado (pode ser arquivado de novo) nem para um setor
+    # reprocessado com os atendentes atuais; esses revalidam pelo ETag.
+    if dados['truncado'] or dados['reprocessado']:
+        headers['Cache-Control'] = 'no-cache'
+    else:
+        headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    if request.headers.get('If-None-Match') == etag:
+        return Response(status=304, headers=headers)
+    
+    resposta = jsonify(dados)
+    resposta.headers.update(headers)
+    return resposta
+
+@app.route('/api/dados/mes/<mes>/arquivar', methods=['POST'])
+def arquivar_mes_rota(mes):
+    """Arquiva um mês encerrado que ainda não está no arquivo (ex.: meses antigos).
+    
+    Um mês arquivado que parou no limite de páginas é buscado e arquivado de novo.
+    """
+    if not FORMATO_MES.match(mes) or mes >= datetime.now().strftime('%Y-%m'):
+        return jsonify({'error': 'Informe um mês encerrado no formato YYYY-MM'}), 400
+    if MODO == 'api':
+        return jsonify({'error': 'O arquivamento é feito pelo processo coletor'}), 409
+    substituir = False
+    if arquivo_meses.existe(mes):
+        resumo = arquivo_meses.ler_resumo(mes) or {}
+        if not resumo.get('truncado'):
+            return jsonify({'status': 'arquivado', 'mes': mes})
+        substituir = True
+    
+    def executar():
+        try:
+            arquivar_mes(mes, substituir)
+        except Exception as e:
+            app.logger.error(f"Erro ao arquivar {mes}: {str(e)}")
+    
+    threading.Thread(target=executar, daemon=True).start()
+    return jsonify({'status': 'arquivando', 'mes': mes}), 202
+
+@app.route('/api/exportar/ligacoes', methods=['GET'])
+def exportar_ligacoes():
+    """Exporta em streaming (CSV ou NDJSON) os registros do rel003/rel030 de um período.
+    
+    Filtros: relatorio (ligacoesAtivas/ligacoesRecuperadas), data_inicial, data_final,
+    setor, agente (código) e status. Os registros vão saindo conforme as páginas chegam
+    do Escallo, sem montar a lista inteira em memória.
+    """
+    relatorio = request.args.get('relatorio', 'ligacoesAtivas')
+    formato = request.args.get('formato', 'csv').lower()
+    data_inicial = request.args.get('data_inicial', '')
+    data_final = request.args.get('data_final', '')
+    setor = request.args.get(SETOR_PARAM)
+    agente = request.args.get('agente')
+    status = request.args.get('status')
+    
+    if relatorio not in EXPORTACOES:
+        return jsonify({'error': f'Relatório inválido. Use: {", ".join(EXPORTACOES)}'}), 400
+    if formato not in ('csv', 'ndjson'):
+        return jsonify({'error': 'Formato inválido. Use: csv, ndjson'}), 400
+    try:
+        inicio = datetime.strptime(data_inicial, '%Y-%m-%d')
+        fim = datetime.strptime(data_final, '%Y-%m-%d')
+    except ValueError:
+        return jsonify({'error': 'data_inicial e data_final devem estar no formato YYYY-MM-DD'}), 400
+    if fim < inicio:
+        return jsonify({'error': 'data_final anterior a data_inicial'}), 400
+    if setor is not None and setor not in SETORES:
+        return jsonify({'error': f'Setor {setor} não encontrado'}), 404
+    
+    codigos = None
+    if setor is not None:
+        codigos = {atendente['codigo'] for atendente in SETORES[setor]}
+    if agente:
+        codigos = {agente} if codigos is None else codigos & {agente}
+    
+    registros = filtrar_exportacao(relatorio, data_inicial, data_final, codigos, status)
+    # Busca a primeira página antes de responder, para que erros do Escallo ainda virem um status HTTP
+    try:
+        primeiro = next(registros, None)
+    except RuntimeError as e:
+        app.logger.error(f"❌ Erro na exportação de {relatorio}: {str(e)}")
+        return jsonify({'error': str(e)}), 502
+    
+    def todos():
+        if primeiro is not None:
+            yield primeiro
+            yield from registros
+    
+    def gerar_csv():
+        colunas = EXPORTACOES[relatorio][4] + ['setor'] + (['fonte'] if len(FONTES) > 1 else [])
+        escritor = csv.DictWriter(_LinhaCSV(), fieldnames=colunas, extrasaction='ignore')
+        yield escritor.writeheader()
+        try:
+            for registro in todos():
+                yield escritor.writerow(registro)
+        except RuntimeError as e:
+            # Cabeçalhos já enviados: só resta registrar e encerrar o arquivo
+            app.logger.error(f"❌ Exportação de {relatorio} interrompida: {str(e)}")
+    
+    def gerar_ndjson():
+        try:
+            for registro in todos():
+                yield json.dumps(registro, ensure_ascii=False) + '\n'
+        except RuntimeError as e:
+            app.logger.error(f"❌ Exportação de {relatorio} interrompida: {str(e)}")
+            yield json.dumps({'error': str(e)}, ensure_ascii=False) + '\n'
+    
+    nome_arquivo = f"{relatorio}_{data_inicial}_{data_final}.{formato}"
+    headers = {
+        'Content-Disposition': f'attachment; filename="{nome_arquivo}"',
+        'X-Accel-Buffering': 'no'  # Não deixar proxies segurarem o streaming
+    }
+    if formato == 'csv':
+        return Response(gerar_csv(), mimetype='text/csv', headers=headers)
+    return Response(gerar_ndjson(), mimetype='application/x-ndjson', headers=headers)
+
+@app.route('/api/cache/periodos', methods=['GET'])
+def status_cache_periodos():
+    """Uso de memória e descartes do cache de períodos"""
+    return jsonify(cache_periodos.estatisticas())
+
+def medir_estruturas():
+    """Bytes aproximados de cada entrada do cache e das demais estruturas retidas pelo processo"""
+    componentes = {
+        'dados_brutos': dados_brutos,
+        'checkpoints': checkpoints_coleta,
+        'cache_periodos': cache_periodos,
+        'historico_versoes': historico_versoes,
+        'vistas': ordens_vistas,
+        'kpis': tabela_kpis,
+        'duracoes': duracoes_ligacoes,
+        'tempo_real': seguidores_hoje
+    }
+    # O total não conta duas vezes o que é compartilhado (ex.: os dados do cache e do histórico de versões)
+    vistos = set()
+    total = tamanho_profundo(cache, vistos) + sum(tamanho_profundo(estrutura, vistos) for estrutura in componentes.values())
+    return {
+        'cache': {setor: {tipo: tamanho_profundo(entrada) for tipo, entrada in list(entradas.items())}
+                  for setor, entradas in list(cache.items())},
+        'estruturas': {nome: tamanho_profundo(estrutura) for nome, estrutura in componentes.items()},
+        'total_bytes': total
+    }
+
+@app.route('/api/memoria', methods=['GET'])
+def status_memoria():
+    """Memória do processo, tamanho das estruturas retidas, picos por coleta e maiores alocações"""
+    limite = request.args.get('alocacoes', 10, type=int)
+    threads = threading.enumerate()
+    return jsonify({
+        'processo': memoria_processo(),
+        **medir_estruturas(),
+        'threads': {'total': len(threads), 'nomes': sorted(thread.name for thread in threads)},
+        'rastreamento': monitor_memoria.estado(),
+        'alocacoes': monitor_memoria.principais_alocacoes(limite),
+        'medido_em': datetime.now().isoformat()
+    })
+
+@app.route('/api/memoria/rastreamento', methods=['POST'])
+def alternar_rastreamento_memoria():
+    """Liga ou desliga o tracemalloc: {"ativo": true, "quadros": 1}"""
+    corpo = request.get_json(silent=True) or {}
+    if 'ativo' not in corpo:
+        return jsonify({'error': 'Informe "ativo": true ou false'}), 400
+    if corpo['ativo']:
+        monitor_memoria.ligar(corpo.get('quadros'))
+    else:
+        monitor_memoria.desligar()
+    return jsonify(monitor_memoria.estado())
+
+@app.route('/api/rastreio', methods=['GET'])
+def status_rastreio():
+    """Canais de rastreio e últimos eventos (?subsistema=&setor=&limite=100)"""
+    return jsonify({
+        'canais': rastreio.estado(),
+        'eventos': rastreio.ultimos(request.args.get('subsistema'), request.args.get(SETOR_PARAM),
+                                    request.args.get('limite', 100, type=int))
+    })
+
+@app.route('/api/rastreio', methods=['POST'])
+def alternar_rastreio():
+    """Liga ou desliga um canal de rastreio (subsistema, ativo, setores, amostragem, duracao_segundos)"""
+    corpo = request.get_json(silent=True) or {}
+    subsistema = corpo.get('subsistema')
+    try:
+        if corpo.get('ativo', True):
+            setores = corpo.get('setores')
+            invalidos = [setor for setor in setores or [] if setor not in SETORES]
+            if invalidos:
+                return jsonify({'error': f"Setores não encontrados: {', '.join(invalidos)}"}), 404
+            rastreio.ligar(subsistema, setores, float(corpo.get('amostragem', 1.0)), corpo.get('duracao_segundos'))
+        else:
+            rastreio.desligar(subsistema)
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 404
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(rastreio.estado())
+
 @app.route('/api/limpar-cache', methods=['POST'])
 def limpar_cache():
     """Limpa todo o cache (para debug e testes)"""
     with cache_lock:
         for setor in SETORES.keys():
             for tipo in ['hoje', 'mes', '7dias', 'ligacoesAtivasMes', 'ligacoesRecuperadas']:
-                cache[setor][tipo]['data'] = None
-                cache[setor][tipo]['timestamp'] = None
-                cache[setor][tipo]['hash'] = None
+                # A versão continua contando, para os clientes não confundirem dados novos com antigos
+                cache[setor][tipo] = MappingProxyType(dict(ENTRADA_VAZIA, versao=cache[setor][tipo]['versao']))
+        cache_periodos.limpar()
         
         # app.logger.info("🧹 Cache limpo com sucesso")
         pass
@@ -1263,11 +2711,11 @@ def limpar_cache():
 
 @app.route('/api/teste-comercial', methods=['GET'])
 def teste_comercial():
-    """Teste direto para verificar se a API do Escallo tem dados do comercial"""
+    """Teste direto para verificar se as fontes do Escallo têm dados do comercial"""
     hoje = datetime.now().strftime('%Y-%m-%d')
     # app.logger.info(f"🧪 TESTE COMERCIAL - buscando dados para {hoje}")
     
-    resultados = buscar_dados_escallo(hoje, hoje)
+    resultados = consultar_fontes('rel025', (hoje, hoje))
     
     if isinstance(resultados, dict) and 'error' in resultados:
         return jsonify({'error': resultados['error']}), 500
@@ -1282,6 +2730,7 @@ def teste_comercial():
             if codigo in codigos_comercial:
                 encontrados.append({
                     'codigo': codigo,
+                    'fonte': resultado.get('fonte'),
                     'nome': resultado.get('nome', ''),
                     'ligacoesOferecidas': resultado.get('ligacoesOferecidas', 0),
                     'ligacoesOferecidasAtendidas': resultado.get('ligacoesOferecidasAtendidas', 0)
@@ -1292,6 +2741,7 @@ def teste_comercial():
     return jsonify({
         'data_consulta': hoje,
         'total_registros_api': len(resultados),
+        'por_fonte': resultados.por_fonte,
         'codigos_comercial': codigos_comercial,
         'encontrados_no_api': encontrados,
         'total_encontrados': len(encontrados),
@@ -1303,21 +2753,23 @@ def teste_comercial():
 @app.route('/api/background/status', methods=['GET'])
 def background_status():
     """Rota para verificar status das atualizações em background"""
-    with background_lock:
-        status_info = {}
-        for setor in SETORES.keys():
-            status_info[setor] = {}
-            for task_name, task_info in background_tasks[setor].items():
-                status_info[setor][task_name] = {
-                    'is_running': task_info['is_running'],
-                    'last_started': task_info['last_started'].isoformat() if task_info['last_started'] else None,
-                    'last_completed': task_info['last_completed'].isoformat() if task_info['last_completed'] else None,
-                    'progress': task_info['progress'],
-                    'error': task_info['error']
-                }
+    status_info = {}
+    for setor in SETORES.keys():
+        status_info[setor] = {}
+        for task_name, task_info in background_tasks[setor].items():
+            status_info[setor][task_name] = {
+                'is_running': task_info['is_running'],
+                'last_started': task_info['last_started'].isoformat() if task_info['last_started'] else None,
+                'last_completed': task_info['last_completed'].isoformat() if task_info['last_completed'] else None,
+                'progress': task_info['progress'],
+                'error': task_info['error']
+            }
     
     return jsonify({
         'background_tasks': status_info,
+        'fila': fila_atualizacoes.estado(),
+        'checkpoints': {'/'.join(chave): checkpoint.estado() for chave, checkpoint in list(checkpoints_coleta.items())
+                        if checkpoint.paginas},
         'current_time': datetime.now().isoformat(),
         'setores': list(SETORES.keys())
     })
@@ -1331,32 +2783,35 @@ def trigger_background_update():
         
         if setor not in SETORES:
             return jsonify({'error': f'Setor {setor} não encontrado'}), 404
-        
-        if tipo == 'ligacoesAtivasMes':
-            atualizar_cache_ligacoes_ativas_background(setor)
-            return jsonify({
-                'status': 'success',
-                'message': f'Atualização em background iniciada para {setor}',
-                'tipo': tipo,
-                'setor': setor,
-                'timestamp': datetime.now().isoformat()
-            })
-        elif tipo == 'ligacoesRecuperadas':
-            atualizar_cache_ligacoes_recuperadas_background(setor)
-            return jsonify({
-                'status': 'success',
-                'message': f'Atualização em background de ligações recuperadas iniciada para {setor}',
-                'tipo': tipo,
-                'setor': setor,
-                'timestamp': datetime.now().isoformat()
-            })
-        else:
+        if tipo not in PRIORIDADE_AQUECIMENTO:
             return jsonify({'error': f'Atualização em background não implementada para {tipo}'}), 400
         
+        tarefa = atualizar_cache_background(setor, tipo)
+        return jsonify({
+            'status': 'success',
+            'message': f'Atualização em background de {tipo} agendada (vale para todos os setores)',
+            'tipo': tipo,
+            'setor': setor,
+            'tarefa': tarefa.resumo() if tarefa else None,
+            'timestamp': datetime.now().isoformat()
+        })
+        
     except Exception as e:
         app.logger.error(f"Erro ao acionar atualização em background: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/background/cancelar', methods=['POST'])
+def cancelar_atualizacao_background():
+    """Cancela a atualização de um tipo, esteja ela na fila ou rodando"""
+    tipo = (request.get_json(silent=True) or {}).get('tipo') or request.args.get('tipo')
+    if tipo not in PRIORIDADE_AQUECIMENTO:
+        return jsonify({'error': f'Tipo {tipo} inválido'}), 400
+    if MODO == 'api':
+        return jsonify({'error': 'No modo api as atualizações rodam no coletor'}), 409
+    
+    cancelada = fila_atualizacoes.cancelar(('coleta', tipo))
+    return jsonify({'tipo': tipo, 'cancelada': cancelada}), (200 if cancelada else 404)
+
 @app.route('/api/setores', methods=['GET'])
 def listar_setores():
     """Rota para listar todos os setores disponíveis"""
@@ -1369,43 +2824,95 @@ def listar_setores():
     
     return jsonify({
         'setores': setores_info,
-        'total_setores': len(SETORES)
+        'total_setores': len(SETORES),
+        'codigo_para_setor': CODIGO_PARA_SETOR,
+        'carregado_de': os.path.basename(SETORES_FILE),
+        'modificado_em': datetime.fromtimestamp(setores_mtime / 1e9).isoformat()
+    })
+
+@app.route('/api/setores/recarregar', methods=['POST'])
+def recarregar_setores():
+    """Força a releitura do arquivo de setores"""
+    alterados = verificar_registro_setores(forcar=True)
+    if alterados is None:
+        return jsonify({'error': 'Não foi possível recarregar o arquivo de setores, registro atual mantido'}), 500
+    
+    return jsonify({
+        'status': 'success',
+        'setores_alterados': alterados,
+        'setores': list(SETORES.keys())
     })
 
+@app.route('/health/live', methods=['GET'])
+def health_live():
+    """O processo está de pé e atendendo (não depende do Escallo nem do cache)"""
+    return jsonify({'status': 'vivo', 'modo': MODO})
+
+@app.route('/health/ready', methods=['GET'])
+def health_ready():
+    """Pronto quando todos os (setor, tipo) têm dados; 503 com o estado de cada um enquanto não"""
+    estados = {
+        setor: {tipo: estado_aquecimento(setor, tipo) for tipo in PRIORIDADE_AQUECIMENTO}
+        for setor in list(SETORES.keys())
+    }
+    pronto = all(estado == 'pronto' for por_tipo in estados.values() for estado in por_tipo.values())
+    resposta = jsonify({
+        'pronto': pronto,
+        'modo': MODO,
+        'aquecimento': {
+            'em_andamento': aquecimento['em_andamento'],
+            'iniciado_em': aquecimento['iniciado_em'].isoformat() if aquecimento['iniciado_em'] else None,
+            'concluido_em': aquecimento['concluido_em'].isoformat() if aquecimento['concluido_em'] else None,
+            'tentativas': aquecimento['tentativas'],
+            'erros': dict(aquecimento['erros'])
+        },
+        'setores': estados
+    })
+    return resposta, (200 if pronto else 503)
+
 @app.route('/api/status', methods=['GET'])
 def status():
     """Rota para verificar status do servidor"""
-    with background_lock:
-        background_status = {}
-        for setor in SETORES.keys():
-            ligacoes_status = background_tasks[setor]['ligacoesAtivasMes']
-            recuperadas_status = background_tasks[setor]['ligacoesRecuperadas']
-            background_status[setor] = {
-                'ligacoesAtivasMes': {
-                    'is_running': ligacoes_status['is_running'],
-                    'last_started': ligacoes_status['last_started'].isoformat() if ligacoes_status['last_started'] else None,
-                    'last_completed': ligacoes_status['last_completed'].isoformat() if ligacoes_status['last_completed'] else None
-                },
-                'ligacoesRecuperadas': {
-                    'is_running': recuperadas_status['is_running'],
-                    'last_started': recuperadas_status['last_started'].isoformat() if recuperadas_status['last_started'] else None,
-                    'last_completed': recuperadas_status['last_completed'].isoformat() if recuperadas_status['last_completed'] else None
-                }
+    background_status = {}
+    for setor in SETORES.keys():
+        ligacoes_status = background_tasks[setor]['ligacoesAtivasMes']
+        recuperadas_status = background_tasks[setor]['ligacoesRecuperadas']
+        background_status[setor] = {
+            'ligacoesAtivasMes': {
+                'is_running': ligacoes_status['is_running'],
+                'last_started': ligacoes_status['last_started'].isoformat() if ligacoes_status['last_started'] else None,
+                'last_completed': ligacoes_status['last_completed'].isoformat() if ligacoes_status['last_completed'] else None
+            },
+            'ligacoesRecuperadas': {
+                'is_running': recuperadas_status['is_running'],
+                'last_started': recuperadas_status['last_started'].isoformat() if recuperadas_status['last_started'] else None,
+                'last_completed': recuperadas_status['last_completed'].isoformat() if recuperadas_status['last_completed'] else None
             }
+        }
     
     return jsonify({
         'status': 'online',
         'servidor': 'API Escallo Dashboard',
         'versao': '2.0.0',
+        'modo': MODO,
         'atualizado_em': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
         'setores_disponiveis': list(SETORES.keys()),
         'total_atendentes': {setor: len(atendentes) for setor, atendentes in SETORES.items()},
         'cache_config': {
             'duracao_horas': CACHE_DURATION_HOURS,
             'auto_atualizacao': True,
-            'background_update': BACKGROUND_UPDATE_ENABLED
+            'background_update': BACKGROUND_UPDATE_ENABLED,
+            'periodos': cache_periodos.estatisticas()
         },
-        'background_tasks': background_status
+        'background_tasks': background_status,
+        'fontes': [fonte.estado() for fonte in FONTES],
+        'kpis': tabela_kpis.estado(),
+        'duracoes': duracoes_ligacoes.estado(),
+        'vistas': ordens_vistas.estado(),
+        'memoria': memoria_processo(),
+        'motor': motor_coleta.estado(),
+        'virada': dict(virada),
+        'tempo_real': {tipo: seguidor.estado() for tipo, seguidor in list(seguidores_hoje.items())}
     })
 
 # ==================== INICIALIZAÇÃO ====================
@@ -1421,57 +2928,9 @@ if __name__ == '__main__':
     # Inicializa cache na primeira execução
     # print("Inicializando cache para todos os setores...")
     
-    def inicializar_cache_com_retry():
-        """Inicializa cache com retry em caso de falha"""
-        max_retries = 3
-        for tentativa in range(max_retries):
-            try:
-                # print(f"\n=== Tentativa {tentativa + 1} de {max_retries} ===")
-                
-                # Ordem de inicialização: primeiro os mais rápidos para cada setor
-                for setor in SETORES.keys():
-                    # print(f"\nInicializando cache para setor: {setor}")
-                    # print(f"  Quantidade de atendentes: {len(SETORES[setor])}")
-                    # print(f"  Códigos: {[a['codigo'] for a in SETORES[setor]]}")
-                    
-                    for tipo in ['hoje', 'mes', '7dias']:
-                        # print(f"    Inicializando cache para {tipo}...")
-                        dados = atualizar_cache(setor, tipo, force=True)
-                        if dados:
-                            # print(f"      ✅ {len(dados.get('data', []))} registros")
-                            pass
-                        time.sleep(1)
-                        
-                    
-                    # Ligações ativas - inicia em background
-                    # print(f"    Inicializando cache para ligacoesAtivasMes em background...")
-                    atualizar_cache_ligacoes_ativas_background(setor)
-                    
-                    # Ligações recuperadas - inicia em background
-                    # print(f"    Inicializando cache para ligacoesRecuperadas em background...")
-                    atualizar_cache_ligacoes_recuperadas_background(setor)
-                
-                # print("\n✅ Cache inicializado com sucesso para todos os setores!")
-                return True
-            except Exception as e:
-                # print(f"\n❌ Erro na tentativa {tentativa + 1}: {str(e)}")
-                # print(traceback.format_exc())
-                if tentativa < max_retries - 1:
-                    # print(f"Aguardando 10 segundos antes de tentar novamente...")
-                    time.sleep(10)
-        
-        # print("\n❌ Falha ao inicializar cache após todas as tentativas")
-        return False
-    
-    # Tenta inicializar o cache
-    if not inicializar_cache_com_retry():
-        # print("⚠️ AVISO: Sistema iniciado com cache vazio. O front-end pode não funcionar até a primeira atualização automática.")
-        pass
-    
-    # Inicia thread de atualização periódica
-    iniciar_atualizador_periodico()
-    iniciar_atualizador_ligacoes_background()
-    iniciar_atualizador_ligacoes_recuperadas_background()
+    # No modo api os dados vêm do coletor; nos demais este processo coleta
+    if MODO != 'api':
+        iniciar_coleta()
     
     port = int(os.getenv('PORT', 5000))
     debug = os.getenv('DEBUG', 'False').lower() == 'true'
@@ -0,0 +1,80 @@
+"""Arquivo em disco dos meses encerrados.
+
+Um mês que já terminou não muda mais no Escallo. Ele é buscado uma única
+vez e gravado aqui, comprimido com gzip, em dois arquivos:
+
+- `{YYYY-MM}.brutos.json.gz`: os registros brutos de cada relatório, para
+  reprocessar setores que ainda não existiam quando o mês foi arquivado;
+- `{YYYY-MM}.resumo.json.gz`: os dados já processados de cada setor, que é
+  o que as rotas servem.
+
+Os arquivos só são sobrescritos quando se pede para arquivar de novo um mês
+que parou no limite de páginas. O resumo é gravado por último, então a
+existência dele indica um mês arquivado por completo.
+"""
+import gzip
+import json
+import os
+import re
+import threading
+from datetime import datetime
+
+FORMATO_MES = re.compile(r'^\d{4}-(0[1-9]|1[0-2])$')
+
+
+class ArquivoMeses:
+    """Grava e lê os meses encerrados em um diretório (compartilhável entre processos)"""
+
+    def __init__(self, diretorio):
+        self.diretorio = diretorio
+        os.makedirs(diretorio, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _caminho(self, mes, parte):
+        return os.path.join(self.diretorio, f"{mes}.{parte}.json.gz")
+
+    def existe(self, mes):
+        return os.path.exists(self._caminho(mes, 'resumo'))
+
+    def meses(self):
+        """Meses arquivados, do mais antigo para o mais recente"""
+        sufixo = '.resumo.json.gz'
+        return sorted(nome[:-len(sufixo)] for nome in os.listdir(self.diretorio) if nome.endswith(sufixo))
+
+    def _gravar_json(self, caminho, conteudo):
+        temporario = f"{caminho}.{os.getpid()}.tmp"
+        try:
+            with gzip.open(temporario, 'wt', encoding='utf-8') as f:
+                json.dump(conteudo, f, ensure_ascii=False)
+            os.replace(temporario, caminho)
+        except BaseException:
+            try:
+                os.unlink(temporario)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def _ler_json(self, caminho):
+        try:
+            with gzip.open(caminho, 'rt', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def gravar(self, mes, resumo, brutos, substituir=False):
+        """Arquiva um mês; retorna False se ele já estava arquivado e `substituir` não foi pedido"""
+        with self._lock:
+            if self.existe(mes) and not substituir:
+                return False
+            resumo = dict(resumo, mes=mes, arquivado_em=datetime.now().isoformat())
+            self._gravar_json(self._caminho(mes, 'brutos'), brutos)
+            self._gravar_json(self._caminho(mes, 'resumo'), resumo)
+            return True
+
+    def ler_resumo(self, mes):
+        """Dados processados por setor do mês, ou None se não arquivado"""
+        return self._ler_json(self._caminho(mes, 'resumo'))
+
+    def ler_brutos(self, mes):
+        """Registros brutos de cada relatório do mês, ou None se não arquivado"""
+        return self._ler_json(self._caminho(mes, 'brutos'))
@@ -0,0 +1,314 @@
+"""Benchmark de carga concorrente das rotas /api/dados/*.
+
+Sobe o app Flask real (servidor werkzeug com threads) apontando para o
+Escallo falso e simula vários dashboards consultando as rotas em paralelo,
+como as TVs e abas de supervisores fazem em produção. Os clientes rodam em
+processos separados para que o GIL do gerador de carga não distorça a
+latência do servidor.
+
+Relata latência p50/p90/p99 por rota, vazão, proporção 304/200 (os clientes
+mandam If-None-Match quando recebem ETag) e a contenção em `cache_lock` e
+`background_lock` (tempo esperando para adquirir e tempo segurando).
+
+Com --refresh-durante, um supervisor simulado força atualização
+(`force_refresh=true`) periodicamente durante a execução, expondo o
+bloqueio dos leitores enquanto uma atualização segura o `cache_lock`.
+
+Uso:
+    python bench/bench_carga.py --dashboards 40 --duracao 30
+    python bench/bench_carga.py --dashboards 40 --refresh-durante --latencia-ms 300
+"""
+import argparse
+import multiprocessing
+import random
+import threading
+import time
+
+import requests
+
+from comum import (EscalloFalso, VOLUME_ATUAL, carregar_relatorio, importar_app,
+                   metadados, percentil, salvar_relatorio, variacao)
+
+ROTAS = {
+    'hoje': '/api/dados/hoje',
+    'mes': '/api/dados/mes',
+    '7dias': '/api/dados/ultimos-7-dias',
+    'ligacoesAtivasMes': '/api/dados/ligacoes-ativas-mes',
+    'ligacoesRecuperadas': '/api/dados/ligacoes-recuperadas',
+}
+
+
+class LockInstrumentado:
+    """Envolve um RLock medindo espera para adquirir e tempo de posse"""
+
+    def __init__(self, lock):
+        self._lock = lock
+        self._stats_lock = threading.Lock()
+        self._local = threading.local()
+        self.aquisicoes = 0
+        self.contendidas = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self.posse_total = 0.0
+        self.posse_max = 0.0
+
+    def acquire(self, blocking=True, timeout=-1):
+        inicio = time.perf_counter()
+        contendida = not self._lock.acquire(blocking=False)
+        if contendida:
+            if not self._lock.acquire(blocking, timeout):
+                return False
+        espera = time.perf_counter() - inicio
+        profundidade = getattr(self._local, 'profundidade', 0)
+        if profundidade == 0:
+            self._local.inicio_posse = time.perf_counter()
+        self._local.profundidade = profundidade + 1
+        with self._stats_lock:
+            self.aquisicoes += 1
+            if contendida:
+                self.contendidas += 1
+                self.espera_total += espera
+                self.espera_max = max(self.espera_max, espera)
+        return True
+
+    def release(self):
+        self._local.profundidade -= 1
+        if self._local.profundidade == 0:
+            posse = time.perf_counter() - self._local.inicio_posse
+            with self._stats_lock:
+                self.posse_total += posse
+                self.posse_max = max(self.posse_max, posse)
+        self._lock.release()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def resumo(self):
+        with self._stats_lock:
+            return {
+                'aquisicoes': self.aquisicoes,
+                'contendidas': self.contendidas,
+                'espera_total_s': round(self.espera_total, 4),
+                'espera_max_ms': round(self.espera_max * 1000, 2),
+                'posse_total_s': round(self.posse_total, 4),
+                'posse_max_ms': round(self.posse_max * 1000, 2),
+            }
+
+
+def simular_dashboards(base_url, quantidade, duracao, intervalo, setores, rotas, semente):
+    """Executado em um processo filho: roda `quantidade` dashboards em threads"""
+    amostras = []
+    amostras_lock = threading.Lock()
+    fim = time.time() + duracao
+
+    def dashboard(indice):
+        rng = random.Random(semente * 1000 + indice)
+        sessao = requests.Session()
+        setor = setores[indice % len(setores)]
+        etags = {}
+        # Desencontra os dashboards como acontece com telas abertas em horários diferentes
+        time.sleep(rng.uniform(0, intervalo))
+        while time.time() < fim:
+            for tipo in rotas:
+                headers = {}
+                if tipo in etags:
+                    headers['If-None-Match'] = etags[tipo]
+                inicio = time.perf_counter()
+                try:
+                    resposta = sessao.get(base_url + ROTAS[tipo], params={'setor': setor},
+                                          headers=headers, timeout=120)
+                    status = resposta.status_code
+                    if resposta.headers.get('ETag'):
+                        etags[tipo] = resposta.headers['ETag']
+                    tamanho = len(resposta.content)
+                except requests.RequestException:
+                    status, tamanho = 0, 0
+                latencia = time.perf_counter() - inicio
+                with amostras_lock:
+                    amostras.append((tipo, status, latencia, tamanho))
+            time.sleep(intervalo * rng.uniform(0.8, 1.2))
+
+    threads = [threading.Thread(target=dashboard, args=(i,)) for i in range(quantidade)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return amostras
+
+
+def supervisor_forcando_refresh(base_url, setores, intervalo, fim, registro):
+    """Dispara force_refresh periodicamente, como o botão de atualizar do dashboard"""
+    sessao = requests.Session()
+    while time.time() < fim:
+        time.sleep(intervalo)
+        for setor in setores:
+            for tipo in ('hoje', 'mes'):
+                inicio = time.perf_counter()
+                try:
+                    sessao.get(base_url + ROTAS[tipo],
+                               params={'setor': setor, 'force_refresh': 'true'}, timeout=120)
+                except requests.RequestException:
+                    pass
+                registro.append((tipo, time.perf_counter() - inicio))
+
+
+def resumir(amostras, duracao):
+    por_rota = {}
+    for tipo in ROTAS:
+        da_rota = [a for a in amostras if a[0] == tipo]
+        if not da_rota:
+            continue
+        latencias = [a[2] for a in da_rota]
+        status = {}
+        for a in da_rota:
+            status[str(a[1])] = status.get(str(a[1]), 0) + 1
+        por_rota[tipo] = {
+            'requisicoes': len(da_rota),
+            'p50_ms': round(percentil(latencias, 50) * 1000, 2),
+            'p90_ms': round(percentil(latencias, 90) * 1000, 2),
+            'p99_ms': round(percentil(latencias, 99) * 1000, 2),
+            'max_ms': round(max(latencias) * 1000, 2),
+            'status': status,
+            'bytes_medio': round(sum(a[3] for a in da_rota) / len(da_rota)),
+        }
+    latencias = [a[2] for a in amostras]
+    total_200 = sum(1 for a in amostras if a[1] == 200)
+    total_304 = sum(1 for a in amostras if a[1] == 304)
+    return {
+        'requisicoes': len(amostras),
+        'vazao_rps': round(len(amostras) / duracao, 1),
+        'p50_ms': round(percentil(latencias, 50) * 1000, 2),
+        'p99_ms': round(percentil(latencias, 99) * 1000, 2),
+        'respostas_200': total_200,
+        'respostas_304': total_304,
+        'proporcao_304': round(total_304 / max(total_200 + total_304, 1), 3),
+        'erros': sum(1 for a in amostras if a[1] not in (200, 304)),
+        'por_rota': por_rota,
+    }
+
+
+def executar(args):
+    import logging
+    from werkzeug.serving import make_server
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    setores_arg = [s for s in args.setores.split(',') if s]
+    rotas = [r for r in args.rotas.split(',') if r] or list(ROTAS)
+
+    with EscalloFalso(latencia_ms=args.latencia_ms, jitter_ms=args.jitter_ms,
+                      taxa_erro=args.taxa_erro, **VOLUME_ATUAL) as escallo:
+        app_module = importar_app(escallo.host)
+        setores = setores_arg or list(app_module.SETORES.keys())
+        escallo.configurar(agentes=sorted({a['codigo'] for lista in app_module.SETORES.values() for a in lista}))
+
+        # Aquecimento síncrono: a medição começa com o cache preenchido
+        background_original = app_module.BACKGROUND_UPDATE_ENABLED
+        app_module.BACKGROUND_UPDATE_ENABLED = False
+        for setor in setores:
+            for tipo in rotas:
+                app_module.atualizar_cache(setor, tipo, force=True)
+        app_module.BACKGROUND_UPDATE_ENABLED = background_original
+
+        locks = {
+            'cache_lock': LockInstrumentado(app_module.cache_lock),
+            'background_lock': LockInstrumentado(app_module.background_lock),
+        }
+        app_module.cache_lock = locks['cache_lock']
+        app_module.background_lock = locks['background_lock']
+
+        servidor = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{servidor.server_port}"
+
+        escallo.resetar()
+        inicio = time.time()
+        refreshes = []
+        if args.refresh_durante:
+            threading.Thread(
+                target=supervisor_forcando_refresh,
+                args=(base_url, setores, args.intervalo_refresh, inicio + args.duracao, refreshes),
+                daemon=True
+            ).start()
+
+        por_processo = [args.dashboards // args.processos + (1 if i < args.dashboards % args.processos else 0)
+                        for i in range(args.processos)]
+        contexto = multiprocessing.get_context('spawn')
+        with contexto.Pool(args.processos) as pool:
+            resultados = pool.starmap(simular_dashboards, [
+                (base_url, n, args.duracao, args.intervalo, setores, rotas, i)
+                for i, n in enumerate(por_processo) if n
+            ])
+        duracao_real = time.time() - inicio
+        servidor.shutdown()
+
+        amostras = [a for lote in resultados for a in lote]
+        relatorio = {
+            'metadados': metadados(),
+            'parametros': {k: v for k, v in vars(args).items() if k not in ('saida', 'comparar')},
+            'leitura': resumir(amostras, duracao_real),
+            'locks': {nome: lock.resumo() for nome, lock in locks.items()},
+            'requisicoes_upstream': escallo.estatisticas()['requisicoes'],
+        }
+        if refreshes:
+            relatorio['refreshes_forcados'] = {
+                'quantidade': len(refreshes),
+                'p50_ms': round(percentil([r[1] for r in refreshes], 50) * 1000, 2),
+                'max_ms': round(max(r[1] for r in refreshes) * 1000, 2),
+            }
+
+        app_module.cache_lock = locks['cache_lock']._lock
+        app_module.background_lock = locks['background_lock']._lock
+        return relatorio
+
+
+def imprimir(relatorio, anterior=None):
+    base = (anterior or {}).get('leitura', {})
+    leitura = relatorio['leitura']
+    print(f"Requisições: {leitura['requisicoes']}  vazão: {leitura['vazao_rps']} req/s "
+          f"{variacao(leitura['vazao_rps'], base.get('vazao_rps'))}")
+    print(f"Latência p50: {leitura['p50_ms']} ms {variacao(leitura['p50_ms'], base.get('p50_ms'))}  "
+          f"p99: {leitura['p99_ms']} ms {variacao(leitura['p99_ms'], base.get('p99_ms'))}")
+    print(f"200: {leitura['respostas_200']}  304: {leitura['respostas_304']}  "
+          f"proporção 304: {leitura['proporcao_304']}  erros: {leitura['erros']}")
+    print(f"\n{'rota':<20} {'reqs':>6} {'p50(ms)':>9} {'p90(ms)':>9} {'p99(ms)':>9} {'max(ms)':>9}")
+    for tipo, r in leitura['por_rota'].items():
+        print(f"{tipo:<20} {r['requisicoes']:>6} {r['p50_ms']:>9} {r['p90_ms']:>9} {r['p99_ms']:>9} {r['max_ms']:>9}")
+    print()
+    for nome, lock in relatorio['locks'].items():
+        print(f"{nome}: {lock['aquisicoes']} aquisições, {lock['contendidas']} contendidas, "
+              f"espera total {lock['espera_total_s']} s (máx {lock['espera_max_ms']} ms), "
+              f"posse máx {lock['posse_max_ms']} ms")
+    if 'refreshes_forcados' in relatorio:
+        r = relatorio['refreshes_forcados']
+        print(f"refreshes forçados: {r['quantidade']} (p50 {r['p50_ms']} ms, máx {r['max_ms']} ms)")
+    print(f"requisições ao Escallo: {relatorio['requisicoes_upstream']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de carga das rotas de leitura')
+    parser.add_argument('--dashboards', type=int, default=30)
+    parser.add_argument('--processos', type=int, default=min(4, multiprocessing.cpu_count()))
+    parser.add_argument('--duracao', type=float, default=20, help='segundos de carga')
+    parser.add_argument('--intervalo', type=float, default=1.0, help='segundos entre ciclos de cada dashboard')
+    parser.add_argument('--setores', default='')
+    parser.add_argument('--rotas', default='', help='tipos separados por vírgula (padrão: todos)')
+    parser.add_argument('--refresh-durante', action='store_true', help='força atualizações durante a carga')
+    parser.add_argument('--intervalo-refresh', type=float, default=5.0)
+    parser.add_argument('--latencia-ms', type=float, default=100)
+    parser.add_argument('--jitter-ms', type=float, default=50)
+    parser.add_argument('--taxa-erro', type=float, default=0.0)
+    parser.add_argument('--saida', help='grava o relatório em JSON')
+    parser.add_argument('--comparar', help='relatório JSON anterior para comparação')
+    args = parser.parse_args()
+
+    relatorio = executar(args)
+    imprimir(relatorio, carregar_relatorio(args.comparar) if args.comparar else None)
+    if args.saida:
+        salvar_relatorio(args.saida, relatorio)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""Benchmark de atualização do cache contra o Escallo falso.
+
+Mede, para cada escala de volume (1x = volume atual de produção) e para
+cada tipo de cache, o tempo de ponta a ponta de `atualizar_cache`, a
+quantidade de requisições feitas ao Escallo e o pico de memória alocada
+durante a atualização (tracemalloc).
+
+O limite de páginas por coleta (ESCALLO_MAX_PAGINAS, 50 em produção) é
+elevado para caber a maior escala: senão 10x e 100x parariam nas mesmas
+5000 linhas de 1x. `--max-paginas` fixa o limite; uma atualização que
+ainda assim parou nele aparece como truncada no relatório.
+
+Uso:
+    python bench/bench_refresh.py --escalas 1,10,100 --saida atual.json
+    python bench/bench_refresh.py --comparar atual.json   # compara com uma execução anterior
+"""
+import argparse
+import gc
+import math
+import statistics
+import time
+import tracemalloc
+
+from comum import (EscalloFalso, VOLUME_ATUAL, carregar_relatorio, importar_app,
+                   metadados, salvar_relatorio, variacao)
+
+TIPOS = ['hoje', 'mes', '7dias', 'ligacoesAtivasMes', 'ligacoesRecuperadas']
+
+
+def paginas_necessarias(escalas, registros_por_pagina=100):
+    """Páginas da maior coleta paginada na maior escala, com uma de folga"""
+    maior = max(VOLUME_ATUAL['rel003'], VOLUME_ATUAL['rel030']) * max(escalas)
+    return math.ceil(maior / registros_por_pagina) + 1
+
+
+def medir_atualizacao(app_module, escallo, setor, tipo):
+    """Executa uma atualização forçada e retorna (segundos, pico_bytes, requisicoes, bytes, truncado)"""
+    escallo.resetar()
+    gc.collect()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    inicio = time.perf_counter()
+    app_module.atualizar_cache(setor, tipo, force=True)
+    duracao = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = escallo.estatisticas()
+    bruto = app_module.dados_brutos.get(tipo) or {}
+    truncado = getattr(bruto.get('registros'), 'truncado', None)
+    return duracao, pico, stats['requisicoes'], stats['bytes_enviados'], truncado
+
+
+def executar(escalas, setores, repeticoes, latencia_ms, jitter_ms, taxa_erro, max_paginas=None):
+    max_paginas = max_paginas or paginas_necessarias(escalas)
+    relatorio = {'metadados': metadados(), 'parametros': {
+        'escalas': escalas, 'setores': setores, 'repeticoes': repeticoes,
+        'latencia_ms': latencia_ms, 'jitter_ms': jitter_ms, 'taxa_erro': taxa_erro, 'max_paginas': max_paginas
+    }, 'resultados': {}}
+
+    with EscalloFalso(latencia_ms=latencia_ms, jitter_ms=jitter_ms, taxa_erro=taxa_erro) as escallo:
+        app_module = importar_app(escallo.host, max_paginas=max_paginas)
+        # Tudo síncrono, para medir a atualização completa dentro da chamada
+        app_module.BACKGROUND_UPDATE_ENABLED = False
+
+        agentes = sorted({a['codigo'] for lista in app_module.SETORES.values() for a in lista})
+        setores = setores or list(app_module.SETORES.keys())
+
+        for escala in escalas:
+            escallo.configurar(
+                agentes=agentes,
+                rel025=VOLUME_ATUAL['rel025'] * escala,
+                rel003=VOLUME_ATUAL['rel003'] * escala,
+                rel030=VOLUME_ATUAL['rel030'] * escala,
+            )
+            resultado_escala = {}
+            for tipo in TIPOS:
+                tempos, picos, requisicoes, bytes_recebidos, truncado = [], [], {}, 0, None
+                for _ in range(repeticoes):
+                    for setor in setores:
+                        duracao, pico, reqs, recebidos, truncado_agora = medir_atualizacao(app_module, escallo, setor, tipo)
+                        truncado = truncado or truncado_agora
+                        tempos.append(duracao)
+                        picos.append(pico)
+                        bytes_recebidos = recebidos
+                        requisicoes = {k: v for k, v in reqs.items() if v}
+                resultado_escala[tipo] = {
+                    'tempo_mediana_s': round(statistics.median(tempos), 4),
+                    'tempo_min_s': round(min(tempos), 4),
+                    'tempo_max_s': round(max(tempos), 4),
+                    'pico_memoria_kb': round(max(picos) / 1024, 1),
+                    'requisicoes_upstream': requisicoes,
+                    'bytes_upstream': bytes_recebidos,
+                    'truncado': truncado,
+                }
+            relatorio['resultados'][f'{escala}x'] = resultado_escala
+
+    return relatorio
+
+
+def imprimir(relatorio, anterior=None):
+    print(f"{'escala':>6} {'tipo':<20} {'tempo(s)':>9} {'Δ':>7} {'pico(KB)':>10} {'Δ':>7} {'reqs':>5}")
+    truncados = []
+    for escala, tipos in relatorio['resultados'].items():
+        for tipo, r in tipos.items():
+            base = (anterior or {}).get('resultados', {}).get(escala, {}).get(tipo, {})
+            reqs = sum(r['requisicoes_upstream'].values())
+            print(f"{escala:>6} {tipo:<20} {r['tempo_mediana_s']:>9.3f} "
+                  f"{variacao(r['tempo_mediana_s'], base.get('tempo_mediana_s')):>7} "
+                  f"{r['pico_memoria_kb']:>10.1f} "
+                  f"{variacao(r['pico_memoria_kb'], base.get('pico_memoria_kb')):>7} {reqs:>5}"
+                  f"{' TRUNCADO' if r.get('truncado') else ''}")
+            if r.get('truncado'):
+                truncados.append(f"{escala} {tipo}: {r['truncado']}")
+    if truncados:
+        print("\nAtualizações que pararam no limite de páginas (volume menor que o da escala):")
+        for linha in truncados:
+            print(f"  {linha}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de atualização do cache')
+    parser.add_argument('--escalas', default='1,10,100', help='multiplicadores do volume atual')
+    parser.add_argument('--setores', default='', help='setores separados por vírgula (padrão: todos)')
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--latencia-ms', type=float, default=20)
+    parser.add_argument('--jitter-ms', type=float, default=10)
+    parser.add_argument('--taxa-erro', type=float, default=0.0)
+    parser.add_argument('--max-paginas', type=int, default=0,
+                        help='limite de páginas por coleta (padrão: o necessário para a maior escala)')
+    parser.add_argument('--saida', help='grava o relatório em JSON')
+    parser.add_argument('--comparar', help='relatório JSON anterior para comparação')
+    args = parser.parse_args()
+
+    escalas = [int(e) for e in args.escalas.split(',') if e]
+    setores = [s for s in args.setores.split(',') if s]
+    relatorio = executar(escalas, setores, args.repeticoes, args.latencia_ms, args.jitter_ms, args.taxa_erro,
+                         args.max_paginas)
+
+    anterior = carregar_relatorio(args.comparar) if args.comparar else None
+    imprimir(relatorio, anterior)
+
+    if args.saida:
+        salvar_relatorio(args.saida, relatorio)
+
+
+if __name__ == '__main__':
+    main()
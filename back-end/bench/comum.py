@@ -0,0 +1,106 @@
+"""Utilidades compartilhadas pelos benchmarks"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+
+# Volume aproximado de um mês de produção (escala 1x)
+VOLUME_ATUAL = {'rel025': 60, 'rel003': 3000, 'rel030': 800}
+
+
+class EscalloFalso:
+    """Sobe o fake_escallo.py em um subprocesso para não poluir as medições de memória"""
+
+    def __init__(self, **config):
+        self.config = config
+        self.processo = None
+        self.host = None
+
+    def __enter__(self):
+        self.processo = subprocess.Popen(
+            [sys.executable, os.path.join(BENCH_DIR, 'fake_escallo.py'), '--port', '0'],
+            stdout=subprocess.PIPE,
+            text=True
+        )
+        linha = self.processo.stdout.readline().strip()
+        if not linha.startswith('ESCALLO_FALSO '):
+            self.processo.kill()
+            raise RuntimeError(f"Servidor falso não iniciou: {linha!r}")
+        self.host = linha.split(' ', 1)[1]
+        if self.config:
+            self.configurar(**self.config)
+        return self
+
+    def __exit__(self, *exc):
+        if self.processo:
+            self.processo.terminate()
+            self.processo.wait(timeout=5)
+
+    def _url(self, rota):
+        return f"http://{self.host}/_bench/{rota}"
+
+    def configurar(self, **config):
+        return requests.post(self._url('config'), json=config, timeout=5).json()
+
+    def resetar(self):
+        requests.post(self._url('reset'), timeout=5)
+
+    def estatisticas(self):
+        return requests.get(self._url('stats'), timeout=5).json()
+
+
+def importar_app(host, token='bench', max_paginas=None):
+    """Importa o app.py apontando para o servidor falso (`max_paginas` troca o limite de páginas por coleta)"""
+    os.environ['ESCALLO_HOST'] = host
+    os.environ['ESCALLO_TOKEN'] = token
+    if max_paginas:
+        os.environ['ESCALLO_MAX_PAGINAS'] = str(max_paginas)
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    import logging
+    import app as app_module
+    app_module.app.logger.setLevel(logging.CRITICAL)
+    return app_module
+
+
+def percentil(valores, p):
+    """Percentil por interpolação linear (p entre 0 e 100)"""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    posicao = (len(ordenados) - 1) * p / 100.0
+    inferior = int(posicao)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    fracao = posicao - inferior
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * fracao
+
+
+def salvar_relatorio(caminho, relatorio):
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump(relatorio, f, indent=2, ensure_ascii=False)
+
+
+def carregar_relatorio(caminho):
+    with open(caminho, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def variacao(atual, anterior):
+    """Formata a variação percentual entre duas medições"""
+    if not anterior:
+        return '   n/a'
+    return f"{(atual - anterior) / anterior * 100:+6.1f}%"
+
+
+def metadados():
+    return {
+        'gerado_em': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': sys.version.split()[0],
+        'plataforma': sys.platform,
+    }
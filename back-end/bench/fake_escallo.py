@@ -0,0 +1,303 @@
+"""Servidor falso do Escallo para benchmarks offline.
+
+Implementa os relatórios rel025, rel003 e rel030 com o mesmo formato de
+resposta da API real (inclusive o rel030 devolvendo `registros` como
+dicionário de registros por página). Os registros são gerados de forma
+determinística a partir de uma semente, então duas execuções com a mesma
+configuração devolvem exatamente os mesmos bytes.
+
+Uso:
+    python fake_escallo.py --port 8099 --rel003 3000 --latencia-ms 80
+
+Rotas de controle (usadas pelos scripts de benchmark):
+    GET  /_bench/stats   - contadores de requisições por relatório
+    POST /_bench/reset   - zera os contadores
+    POST /_bench/config  - altera a configuração em tempo de execução
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Códigos usados quando o benchmark não informa a lista de agentes
+AGENTES_PADRAO = [str(c) for c in range(4000, 4040)] + [str(c) for c in range(1200, 1215)]
+
+STATUS_REL003 = ['Atendido'] * 7 + ['Não atendido'] * 2 + ['Ocupado']
+STATUS_REL030 = ['Concluído'] * 6 + ['Pendente'] * 3 + ['Não concluído']
+
+config = {
+    'rel025': 60,           # registros (agentes) devolvidos pelo rel025
+    'rel003': 3000,         # total de registros do rel003 no período
+    'rel030': 800,          # total de registros do rel030 no período
+    'latencia_ms': 0,       # latência fixa por página
+    'jitter_ms': 0,         # variação aleatória somada à latência
+    'taxa_erro': 0.0,       # probabilidade de responder 500
+    'paginas_lentas': [],   # páginas que sofrem `latencia_lenta_ms`
+    'taxa_lenta': 0.0,      # probabilidade de qualquer requisição sofrer `latencia_lenta_ms`
+    'latencia_lenta_ms': 0,
+    'semente': 42,
+    'agentes': AGENTES_PADRAO,
+}
+
+estatisticas = {
+    'requisicoes': {'rel025': 0, 'rel003': 0, 'rel030': 0},
+    'erros_injetados': 0,
+    'bytes_enviados': 0,
+}
+
+config_lock = threading.Lock()
+stats_lock = threading.Lock()
+# Sorteio de latência/erros não precisa ser determinístico entre execuções
+rng_rede = random.Random()
+
+
+def _periodo(payload):
+    """Retorna (data_inicial, data_final) limitados a hoje"""
+    hoje = datetime.now().date()
+    try:
+        inicio = datetime.strptime(payload.get('dataInicial', ''), '%Y-%m-%d').date()
+    except ValueError:
+        inicio = hoje
+    try:
+        fim = datetime.strptime(payload.get('dataFinal', ''), '%Y-%m-%d').date()
+    except ValueError:
+        fim = hoje
+    fim = min(fim, hoje)
+    if inicio > fim:
+        inicio = fim
+    return inicio, fim
+
+
+def _data_registro(rng, inicio, fim, indice, total):
+    """Distribui os registros em ordem cronológica dentro do período"""
+    dias = (fim - inicio).days + 1
+    dia = inicio + timedelta(days=min(dias - 1, indice * dias // max(total, 1)))
+    segundos = rng.randint(8 * 3600, 18 * 3600)
+    momento = datetime.combine(dia, datetime.min.time()) + timedelta(seconds=segundos)
+    return momento
+
+
+def _duracao(segundos):
+    return f"{segundos // 3600:02d}:{(segundos % 3600) // 60:02d}:{segundos % 60:02d}"
+
+
+def gerar_rel025(cfg, payload):
+    rng = random.Random(f"{cfg['semente']}-rel025-{payload.get('dataInicial')}-{payload.get('dataFinal')}")
+    inicio, fim = _periodo(payload)
+    dias = (fim - inicio).days + 1
+    agentes = list(cfg['agentes'])
+    while len(agentes) < cfg['rel025']:
+        agentes.append(str(9000 + len(agentes)))
+    registros = []
+    for codigo in agentes[:cfg['rel025']]:
+        oferecidas = rng.randint(5, 40) * dias
+        atendidas = rng.randint(int(oferecidas * 0.6), oferecidas)
+        tempo_atendimento = atendidas * rng.randint(120, 420)
+        tempo_login = dias * rng.randint(4 * 3600, 8 * 3600)
+        registros.append({
+            'codigo': codigo,
+            'nome': f'Agente {codigo}',
+            'ligacoesOferecidas': oferecidas,
+            'ligacoesOferecidasAtendidas': atendidas,
+            'percentualOferecidasAtendidas': round(atendidas / oferecidas * 100, 2),
+            'tempoAtendimento': tempo_atendimento,
+            'TMA': tempo_atendimento // max(atendidas, 1),
+            'ligacoesRealizadas': rng.randint(0, 30) * dias,
+            'tempoLogin': tempo_login,
+            'tempoPausa': rng.randint(0, 3600) * dias,
+            'chamadasPorHora': f"{atendidas / (tempo_login / 3600):.2f}".replace('.', ','),
+        })
+    return registros, len(registros)
+
+
+def gerar_rel003(cfg, payload, pagina, por_pagina):
+    total = cfg['rel003']
+    inicio, fim = _periodo(payload)
+    registros = []
+    for indice in range(pagina * por_pagina, min(total, (pagina + 1) * por_pagina)):
+        rng = random.Random(f"{cfg['semente']}-rel003-{indice}")
+        momento = _data_registro(rng, inicio, fim, indice, total)
+        status = rng.choice(STATUS_REL003)
+        duracao = rng.randint(20, 900) if status == 'Atendido' else 0
+        registros.append({
+            'ligacao.id': f"{indice + 1}",
+            'ligacao.dataHoraInicio': momento.strftime('%d/%m/%Y %H:%M:%S'),
+            'ligacao.codigoAgenteOrigem': rng.choice(cfg['agentes']),
+            'ligacao.numeroDestino': f"11{rng.randint(900000000, 999999999)}",
+            'ligacao.statusFormatado': status,
+            'ligacao.duracao': _duracao(duracao),
+            'ligacao.duracaoSegundos': duracao,
+        })
+    return registros, total
+
+
+def gerar_rel030(cfg, payload, pagina, por_pagina):
+    total = cfg['rel030']
+    inicio, fim = _periodo(payload)
+    registros = {}
+    for indice in range(pagina * por_pagina, min(total, (pagina + 1) * por_pagina)):
+        rng = random.Random(f"{cfg['semente']}-rel030-{indice}")
+        momento = _data_registro(rng, inicio, fim, indice, total)
+        # A API real devolve um dicionário indexado, não uma lista
+        registros[str(indice - pagina * por_pagina)] = {
+            'id': f"{indice + 1}",
+            'agente': f"Agente {rng.choice(cfg['agentes'])}",
+            'origem': rng.choice(cfg['agentes']),
+            'numero': f"11{rng.randint(900000000, 999999999)}",
+            'status': rng.choice(STATUS_REL030),
+            'data': momento.strftime('%d/%m/%Y %H:%M:%S'),
+        }
+    return registros, total
+
+
+GERADORES = {
+    'rel025': lambda cfg, payload, pagina, por_pagina: gerar_rel025(cfg, payload),
+    'rel003': gerar_rel003,
+    'rel030': gerar_rel030,
+}
+
+
+class EscalloFalsoHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _responder(self, status, corpo):
+        dados = json.dumps(corpo).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+        with stats_lock:
+            estatisticas['bytes_enviados'] += len(dados)
+
+    def _ler_json(self):
+        tamanho = int(self.headers.get('Content-Length') or 0)
+        if not tamanho:
+            return {}
+        try:
+            return json.loads(self.rfile.read(tamanho))
+        except ValueError:
+            return {}
+
+    def do_GET(self):
+        if urlparse(self.path).path == '/_bench/stats':
+            with stats_lock:
+                copia = json.loads(json.dumps(estatisticas))
+            self._responder(200, copia)
+            return
+        self._responder(404, {'error': 'rota desconhecida'})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        corpo = self._ler_json()
+
+        if url.path == '/_bench/reset':
+            with stats_lock:
+                for relatorio in estatisticas['requisicoes']:
+                    estatisticas['requisicoes'][relatorio] = 0
+                estatisticas['erros_injetados'] = 0
+                estatisticas['bytes_enviados'] = 0
+            self._responder(200, {'status': 'ok'})
+            return
+
+        if url.path == '/_bench/config':
+            with config_lock:
+                for chave, valor in corpo.items():
+                    if chave in config:
+                        config[chave] = valor
+                atual = dict(config)
+            self._responder(200, atual)
+            return
+
+        partes = [p for p in url.path.split('/') if p]
+        relatorio = partes[-1] if partes else ''
+        if relatorio not in GERADORES or 'relatorio' not in partes:
+            self._responder(404, {'error': 'relatório desconhecido'})
+            return
+
+        if not self.headers.get('Authorization', '').startswith('Partner '):
+            self._responder(401, {'error': 'token ausente'})
+            return
+
+        query = parse_qs(url.query)
+        pagina = int(query.get('pagina', ['0'])[0])
+        por_pagina = int(query.get('registros', ['100'])[0])
+
+        with config_lock:
+            cfg = dict(config)
+
+        with stats_lock:
+            estatisticas['requisicoes'][relatorio] += 1
+
+        atraso = cfg['latencia_ms'] + rng_rede.uniform(0, cfg['jitter_ms'])
+        if pagina in cfg['paginas_lentas'] or (cfg['taxa_lenta'] and rng_rede.random() < cfg['taxa_lenta']):
+            atraso += cfg['latencia_lenta_ms']
+        if atraso > 0:
+            time.sleep(atraso / 1000.0)
+
+        if cfg['taxa_erro'] and rng_rede.random() < cfg['taxa_erro']:
+            with stats_lock:
+                estatisticas['erros_injetados'] += 1
+            self._responder(500, {'error': 'erro injetado'})
+            return
+
+        registros, total = GERADORES[relatorio](cfg, corpo, pagina, por_pagina)
+        self._responder(200, {
+            'status': 'sucesso',
+            'data': {
+                'registros': registros,
+                'pagina': pagina,
+                'registrosPorPagina': por_pagina,
+                'totalRegistros': total,
+            }
+        })
+
+
+def criar_servidor(host='127.0.0.1', port=0):
+    """Cria o servidor (port=0 escolhe uma porta livre)"""
+    return ThreadingHTTPServer((host, port), EscalloFalsoHandler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor falso do Escallo para benchmarks')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--rel025', type=int, default=config['rel025'])
+    parser.add_argument('--rel003', type=int, default=config['rel003'])
+    parser.add_argument('--rel030', type=int, default=config['rel030'])
+    parser.add_argument('--latencia-ms', type=float, default=0)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--taxa-erro', type=float, default=0.0)
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args()
+
+    config.update({
+        'rel025': args.rel025,
+        'rel003': args.rel003,
+        'rel030': args.rel030,
+        'latencia_ms': args.latencia_ms,
+        'jitter_ms': args.jitter_ms,
+        'taxa_erro': args.taxa_erro,
+        'semente': args.semente,
+    })
+
+    servidor = criar_servidor(args.host, args.port)
+    # A linha abaixo é lida pelos scripts de benchmark para descobrir a porta
+    print(f"ESCALLO_FALSO {servidor.server_address[0]}:{servidor.server_address[1]}", flush=True)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+if __name__ == '__main__':
+    main()
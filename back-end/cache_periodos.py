@@ -0,0 +1,116 @@
+"""Cache LRU com orçamento de memória para resultados de períodos arbitrários.
+
+O `cache` do app tem cinco posições fixas por setor (hoje, mês, 7 dias...)
+que são sobrescritas quando o dia ou o mês vira. Consultas de meses
+anteriores e intervalos livres ficam aqui, indexadas por
+(setor, relatório, data_inicial, data_final).
+
+Cada entrada guarda o tamanho do JSON serializado; quando a soma passa do
+orçamento, as menos usadas recentemente são descartadas. Períodos já
+encerrados não mudam mais no Escallo, então são marcados como imutáveis e
+nunca expiram (só saem por falta de espaço).
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def tamanho_serializado(valor):
+    """Tamanho aproximado de um resultado: bytes do JSON que seria enviado ao cliente"""
+    return len(json.dumps(valor, ensure_ascii=False, default=str).encode('utf-8'))
+
+
+class CachePeriodos:
+    """LRU limitado por bytes, com entradas imutáveis para períodos encerrados"""
+
+    def __init__(self, limite_bytes):
+        self.limite_bytes = limite_bytes
+        # chave -> (valor, tamanho, imutavel, criado_em)
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._acertos = 0
+        self._faltas = 0
+        self._expiradas = 0
+        self._descartes = 0
+        self._bytes_descartados = 0
+        self._rejeitadas = 0
+
+    def obter(self, chave, validade_segundos=None):
+        """Retorna o valor em cache ou None.
+
+        Entradas mutáveis mais velhas que `validade_segundos` contam como
+        falta e são removidas; as imutáveis nunca são revalidadas.
+        """
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                self._faltas += 1
+                return None
+
+            valor, tamanho, imutavel, criado_em = entrada
+            if not imutavel and validade_segundos is not None and time.time() - criado_em > validade_segundos:
+                del self._entradas[chave]
+                self._bytes -= tamanho
+                self._expiradas += 1
+                self._faltas += 1
+                return None
+
+            self._entradas.move_to_end(chave)
+            self._acertos += 1
+            return valor
+
+    def guardar(self, chave, valor, imutavel=False, tamanho=None):
+        """Guarda um resultado, descartando os menos usados até caber no orçamento.
+
+        Um resultado maior que o orçamento inteiro não é guardado.
+        """
+        tamanho = tamanho if tamanho is not None else tamanho_serializado(valor)
+        with self._lock:
+            anterior = self._entradas.pop(chave, None)
+            if anterior is not None:
+                self._bytes -= anterior[1]
+
+            if tamanho > self.limite_bytes:
+                self._rejeitadas += 1
+                return False
+
+            while self._entradas and self._bytes + tamanho > self.limite_bytes:
+                _, (_, tamanho_descartado, _, _) = self._entradas.popitem(last=False)
+                self._bytes -= tamanho_descartado
+                self._descartes += 1
+                self._bytes_descartados += tamanho_descartado
+
+            self._entradas[chave] = (valor, tamanho, imutavel, time.time())
+            self._bytes += tamanho
+            return True
+
+    def remover(self, chave):
+        with self._lock:
+            entrada = self._entradas.pop(chave, None)
+            if entrada is not None:
+                self._bytes -= entrada[1]
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+
+    def estatisticas(self):
+        """Uso de memória, acertos e descartes do cache"""
+        with self._lock:
+            consultas = self._acertos + self._faltas
+            return {
+                'entradas': len(self._entradas),
+                'imutaveis': sum(1 for entrada in self._entradas.values() if entrada[2]),
+                'bytes': self._bytes,
+                'limite_bytes': self.limite_bytes,
+                'acertos': self._acertos,
+                'faltas': self._faltas,
+                'taxa_acerto': round(self._acertos / consultas * 100, 2) if consultas else 0,
+                'expiradas': self._expiradas,
+                'descartes': self._descartes,
+                'bytes_descartados': self._bytes_descartados,
+                'rejeitadas_por_tamanho': self._rejeitadas
+            }
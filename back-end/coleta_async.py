@@ -0,0 +1,640 @@
+"""Motor assíncrono de coleta dos relatórios do Escallo.
+
+Dispara todas as requisições necessárias (rel025 do dia/7 dias/mês e as
+paginações do rel003/rel030) ao mesmo tempo, limitadas por um teto global
+de concorrência, com prazo por requisição e cancelamento. Roda em um event
+loop próprio numa thread dedicada, para ser usado a partir do app Flask com
+threads via `MotorColeta.executar`.
+
+Usa aiohttp quando instalado; sem ele, cada requisição roda o `requests`
+em uma thread (asyncio.to_thread) sob o mesmo semáforo.
+
+Com várias instâncias do Escallo (ver fontes_escallo.py), cada requisição
+respeita também o orçamento e o disjuntor da sua fonte, e
+`buscar_em_fontes` consulta todas as fontes juntas e une os registros.
+
+Cada coleta pode ter um Prazo de ponta a ponta: o prazo de cada página é o
+menor entre o prazo por requisição e o que resta da coleta, e as páginas
+que não cabem mais no prazo falham na hora (a coleta sai incompleta e o
+checkpoint retoma dali). Uma página que demora mais que o percentil
+`percentil_hedge` das páginas recentes do mesmo relatório ganha uma
+segunda requisição igual, e vale a primeira resposta que chegar; no máximo
+`fracao_hedge` das páginas é duplicada, para não dobrar a carga no Escallo
+quando ele todo fica lento.
+"""
+import asyncio
+import concurrent.futures
+import json
+import math
+import threading
+import time
+from collections import deque
+
+import requests
+
+from fontes_escallo import DisjuntorAberto
+from impressoes import RegistrosColetados, impressao_pagina
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class CheckpointColeta:
+    """Páginas já buscadas de uma paginação que não terminou, para retomar dali.
+
+    Guarda os registros e a impressão de cada página recebida. Na próxima
+    tentativa a página 0 é buscada de novo; se ela continua idêntica e o
+    checkpoint não passou de `validade_segundos`, as páginas guardadas são
+    aproveitadas e só as que faltam são buscadas. Uma coleta completa
+    esvazia o checkpoint.
+    """
+
+    def __init__(self, validade_segundos=900):
+        self.validade_segundos = validade_segundos
+        self.paginas = {}  # pagina -> (registros, impressao)
+        self.atualizado_em = time.time()
+        self.retomadas = 0
+        self._lock = threading.Lock()
+
+    def expirado(self):
+        return time.time() - self.atualizado_em > self.validade_segundos
+
+    def guardar(self, pagina, registros, impressao, renovar=True):
+        """Guarda uma página; com `renovar=False` a validade só começa a contar se o checkpoint estava vazio"""
+        with self._lock:
+            if renovar or not self.paginas:
+                self.atualizado_em = time.time()
+            self.paginas[pagina] = (registros, impressao)
+
+    def retomar(self, impressao_primeira):
+        """Páginas aproveitáveis (sem a 0) se a página 0 não mudou; senão descarta o checkpoint"""
+        with self._lock:
+            primeira = self.paginas.get(0)
+            if primeira is None or primeira[1] != impressao_primeira or self.expirado():
+                self.paginas.clear()
+                return {}
+            self.retomadas += 1
+            return {pagina: valor for pagina, valor in self.paginas.items() if pagina != 0}
+
+    def limpar(self):
+        with self._lock:
+            self.paginas.clear()
+            self.atualizado_em = time.time()
+
+    def estado(self):
+        with self._lock:
+            return {
+                'paginas': sorted(self.paginas),
+                'registros': sum(len(registros) for registros, _ in self.paginas.values()),
+                'retomadas': self.retomadas,
+                'atualizado_em': self.atualizado_em
+            }
+
+
+class Prazo:
+    """Prazo de ponta a ponta de uma coleta, compartilhado por todas as requisições dela"""
+
+    def __init__(self, segundos):
+        self.segundos = segundos
+        self.fim = time.monotonic() + segundos
+
+    def restante(self):
+        return max(0.0, self.fim - time.monotonic())
+
+
+class LatenciasPagina:
+    """Durações das últimas páginas de cada (host, relatório), para o limiar de duplicação"""
+
+    def __init__(self, amostras=200, minimo_amostras=10):
+        self.amostras = amostras
+        self.minimo_amostras = minimo_amostras
+        self._duracoes = {}
+
+    def registrar(self, chave, segundos):
+        self._duracoes.setdefault(chave, deque(maxlen=self.amostras)).append(segundos)
+
+    def percentil(self, chave, q):
+        """Duração no percentil q das páginas recentes, ou None com poucas amostras"""
+        duracoes = self._duracoes.get(chave)
+        if not duracoes or len(duracoes) < self.minimo_amostras:
+            return None
+        ordenadas = sorted(duracoes)
+        return ordenadas[min(len(ordenadas) - 1, int(q * len(ordenadas)))]
+
+    def resumo(self):
+        resumo = {}
+        for chave, duracoes in list(self._duracoes.items()):
+            p50, p95 = self.percentil(chave, 0.5), self.percentil(chave, 0.95)
+            resumo['/'.join(chave)] = {
+                'amostras': len(duracoes),
+                'p50': None if p50 is None else round(p50, 3),
+                'p95': None if p95 is None else round(p95, 3)
+            }
+        return resumo
+
+
+class MotorColeta:
+    """Event loop dedicado para buscar relatórios do Escallo concorrentemente"""
+
+    def __init__(self, max_concorrencia=8, prazo_requisicao=60, logger=None, fontes=None, rastreio=None,
+                 percentil_hedge=0.95, hedge_minimo=1.0, fracao_hedge=0.1):
+        self.max_concorrencia = max_concorrencia
+        self.prazo_requisicao = prazo_requisicao
+        self.logger = logger
+        # Duplicação de páginas lentas: limiar = max(hedge_minimo, percentil_hedge das páginas recentes);
+        # percentil_hedge=None desliga
+        self.percentil_hedge = percentil_hedge
+        self.hedge_minimo = hedge_minimo
+        self.fracao_hedge = fracao_hedge
+        self.latencias = LatenciasPagina()
+        self.paginas = 0
+        self.hedges = 0
+        self.hedges_vencedores = 0
+        self.paginas_sem_prazo = 0
+        # Canal de rastreio (ver rastreio.py) para cada página recebida
+        self.rastreio = rastreio
+        # (host, token) -> FonteEscallo, para aplicar orçamento e disjuntor de cada fonte
+        self.fontes = {(fonte.host, fonte.token): fonte for fonte in fontes or []}
+        self._loop = None
+        self._thread = None
+        self._semaforo = None
+        self._sessao = None
+        self._lock = threading.Lock()
+
+    # ---------- ciclo de vida do loop ----------
+
+    def iniciar(self):
+        """Sobe o event loop na thread dedicada (idempotente)"""
+        with self._lock:
+            if self._loop is not None:
+                return
+            pronto = threading.Event()
+
+            def rodar_loop():
+                self._loop = asyncio.new_event_loop()
+                asyncio.set_event_loop(self._loop)
+                self._semaforo = asyncio.Semaphore(self.max_concorrencia)
+                pronto.set()
+                self._loop.run_forever()
+
+            self._thread = threading.Thread(target=rodar_loop, name='motor-coleta', daemon=True)
+            self._thread.start()
+            pronto.wait()
+
+    def submeter(self, coro):
+        """Agenda uma corrotina no loop do motor e retorna o concurrent.futures.Future.
+
+        Corrotinas submetidas antes disputam o semáforo antes, então a
+        ordem de submissão funciona como prioridade.
+        """
+        self.iniciar()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def executar(self, coro, timeout=None):
+        """Executa uma corrotina no loop do motor a partir de qualquer thread.
+
+        Se o prazo estourar, a corrotina é cancelada (junto com todas as
+        requisições que ela disparou) e concurrent.futures.TimeoutError é
+        levantado.
+        """
+        futuro = self.submeter(coro)
+        try:
+            return futuro.result(timeout)
+        except concurrent.futures.TimeoutError:
+            futuro.cancel()
+            raise
+
+    def cancelar_tudo(self):
+        """Cancela todas as coletas em andamento"""
+        if self._loop is None:
+            return
+
+        def cancelar():
+            for tarefa in asyncio.all_tasks(self._loop):
+                tarefa.cancel()
+
+        self._loop.call_soon_threadsafe(cancelar)
+
+    # ---------- requisição individual ----------
+
+    def _log(self, nivel, mensagem):
+        if self.logger:
+            getattr(self.logger, nivel)(mensagem)
+
+    async def _enviar(self, url, payload, headers, prazo):
+        """Faz o POST e retorna (status, json, bytes da resposta)"""
+        if aiohttp is not None:
+            if self._sessao is None or self._sessao.closed:
+                self._sessao = aiohttp.ClientSession()
+            async with self._sessao.post(url, json=payload, headers=headers) as resposta:
+                if resposta.status != 200:
+                    return resposta.status, None, None
+                conteudo = await resposta.read()
+                return resposta.status, json.loads(conteudo), conteudo
+
+        def enviar_sincrono():
+            resposta = requests.post(url, json=payload, headers=headers, timeout=prazo)
+            if resposta.status_code != 200:
+                return resposta.status_code, None, None
+            return resposta.status_code, resposta.json(), resposta.content
+
+        return await asyncio.to_thread(enviar_sincrono)
+
+    async def post(self, host, token, relatorio, pagina, registros, payload, prazo=None, ao_enviar=None,
+                   fora_da_fila=False):
+        """POST em um relatório respeitando o teto de concorrência e o prazo.
+
+        `ao_enviar()` é chamado quando a requisição sai (depois da espera nos
+        semáforos). `fora_da_fila` não espera os semáforos de concorrência
+        (cópias de páginas lentas, limitadas por fracao_hedge); o orçamento
+        por segundo e o disjuntor da fonte continuam valendo.
+        """
+        prazo = prazo or self.prazo_requisicao
+        url = f"http://{host}/escallo/api/v1/recurso/relatorio/{relatorio}/?registros={registros}&pagina={pagina}"
+        headers = {
+            'Content-Type': 'application/json',
+            'Authorization': f'Partner {token}'
+        }
+        fonte = self.fontes.get((host, token))
+
+        async def enviar():
+            if ao_enviar:
+                ao_enviar()
+            return await asyncio.wait_for(self._enviar(url, payload, headers, prazo), prazo)
+
+        if fonte is None:
+            if fora_da_fila:
+                return await enviar()
+            async with self._semaforo:
+                return await enviar()
+
+        if not fonte.disjuntor.permite():
+            raise DisjuntorAberto(f"Disjuntor aberto para a fonte {fonte.nome}")
+        try:
+            semaforo_fonte = None if fora_da_fila else fonte.semaforo()
+            if semaforo_fonte is not None:
+                await semaforo_fonte.acquire()
+            try:
+                espera = fonte.reservar()
+                if espera:
+                    await asyncio.sleep(espera)
+                if fora_da_fila:
+                    resultado = await enviar()
+                else:
+                    async with self._semaforo:
+                        resultado = await enviar()
+            finally:
+                if semaforo_fonte is not None:
+                    semaforo_fonte.release()
+        except asyncio.CancelledError:
+            fonte.disjuntor.liberar()
+            raise
+        except asyncio.TimeoutError:
+            fonte.registrar(f"Timeout no {relatorio}")
+            raise
+        except Exception as e:
+            fonte.registrar(str(e))
+            raise
+        fonte.registrar(None if resultado[0] == 200 else f"HTTP {resultado[0]} no {relatorio}")
+        return resultado
+
+    def _limiar_hedge(self, chave, prazo):
+        """Segundos de espera antes de duplicar a página, ou None se ela não deve ser duplicada"""
+        if self.percentil_hedge is None or self.hedges >= self.fracao_hedge * self.paginas:
+            return None
+        percentil = self.latencias.percentil(chave, self.percentil_hedge)
+        if percentil is None:
+            return None
+        limiar = max(self.hedge_minimo, percentil)
+        return limiar if limiar < prazo else None
+
+    async def _post_com_hedge(self, host, token, relatorio, pagina, registros, payload, prazo):
+        """POST de uma página que, se passar do limiar, ganha uma cópia; vale a primeira resposta 200.
+
+        O limiar e as latências contam a partir do envio: a espera pelo
+        semáforo não é lentidão do Escallo. A cópia sai fora da fila. As
+        tentativas que sobram são canceladas; sem aiohttp a requisição
+        cancelada ainda termina na thread dela, mas já liberou o semáforo.
+        """
+        chave = (host, relatorio)
+        fim = time.monotonic() + prazo
+        self.paginas += 1
+        enviadas = {}  # tarefa -> momento do envio
+
+        def disparar(prazo_tentativa, fora_da_fila=False):
+            saiu = asyncio.Event()
+
+            def ao_enviar():
+                enviadas[tarefa] = time.monotonic()
+                saiu.set()
+
+            tarefa = asyncio.ensure_future(self.post(host, token, relatorio, pagina, registros, payload,
+                                                     prazo_tentativa, ao_enviar, fora_da_fila))
+            return tarefa, saiu
+
+        original, saiu = disparar(prazo)
+        pendentes = {original}
+        try:
+            limiar = self._limiar_hedge(chave, prazo)
+            if limiar is not None:
+                espera_envio = asyncio.ensure_future(saiu.wait())
+                try:
+                    await asyncio.wait({original, espera_envio}, timeout=max(0.0, fim - time.monotonic()),
+                                       return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    espera_envio.cancel()
+                if not original.done() and time.monotonic() + limiar < fim:
+                    feitas, _ = await asyncio.wait(pendentes, timeout=limiar)
+                    if not feitas and self._limiar_hedge(chave, prazo) is not None:
+                        self.hedges += 1
+                        pendentes.add(disparar(fim - time.monotonic(), fora_da_fila=True)[0])
+                        if self.rastreio is not None and self.rastreio.ativo:
+                            self.rastreio(f'página {relatorio} duplicada', host=host, pagina=pagina,
+                                          limiar_ms=round(limiar * 1000))
+
+            ultimo = None
+            while pendentes:
+                feitas, pendentes = await asyncio.wait(pendentes, timeout=max(0.0, fim - time.monotonic()),
+                                                       return_when=asyncio.FIRST_COMPLETED)
+                if not feitas:
+                    raise asyncio.TimeoutError()
+                for tarefa in feitas:
+                    ultimo = tarefa.exception() or tarefa.result()
+                    if not isinstance(ultimo, BaseException) and ultimo[0] == 200:
+                        if tarefa in enviadas:
+                            self.latencias.registrar(chave, time.monotonic() - enviadas[tarefa])
+                        if tarefa is not original:
+                            self.hedges_vencedores += 1
+                        return ultimo
+            if isinstance(ultimo, BaseException):
+                raise ultimo
+            return ultimo
+        finally:
+            for tarefa in pendentes:
+                tarefa.cancel()
+
+    async def _pagina(self, host, token, relatorio, pagina, registros, payload, prazo, prazo_total=None):
+        """Busca uma página e retorna (registros, total_informado, bytes) ou levanta RuntimeError.
+
+        Com `prazo_total` (Prazo da coleta), a página tem no máximo o tempo
+        que resta dele, e falha na hora se já não resta nada.
+        """
+        inicio = time.monotonic()
+        prazo = prazo or self.prazo_requisicao
+        if prazo_total is not None:
+            restante = prazo_total.restante()
+            if restante <= 0:
+                self.paginas_sem_prazo += 1
+                raise RuntimeError(f"Prazo de {prazo_total.segundos}s da coleta esgotado antes da página {pagina} do {relatorio}")
+            prazo = min(prazo, restante)
+        try:
+            status, data, conteudo = await self._post_com_hedge(host, token, relatorio, pagina, registros, payload, prazo)
+        except asyncio.TimeoutError:
+            if prazo_total is not None and prazo_total.restante() <= 0:
+                raise RuntimeError(f"Prazo de {prazo_total.segundos}s da coleta esgotado na página {pagina} do {relatorio}")
+            raise RuntimeError(f"Timeout na página {pagina} do {relatorio}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            raise RuntimeError(f"Erro na página {pagina} do {relatorio}: {str(e)}")
+
+        if status != 200:
+            raise RuntimeError(f"Erro na API {relatorio} (página {pagina}): {status}")
+        if not isinstance(data, dict) or 'data' not in data or 'registros' not in data['data']:
+            raise RuntimeError(f"Estrutura inválida na página {pagina} do {relatorio}")
+
+        registros_pagina = data['data']['registros']
+        # O rel030 devolve um dicionário de registros em vez de lista
+        if isinstance(registros_pagina, dict):
+            registros_pagina = list(registros_pagina.values())
+        total = data['data'].get('totalRegistros')
+        if self.rastreio is not None and self.rastreio.ativo:
+            self.rastreio(f'página {relatorio}', host=host, pagina=pagina, registros=len(registros_pagina or []),
+                          total=total, bytes=len(conteudo or b''), duracao_ms=round((time.monotonic() - inicio) * 1000))
+        return registros_pagina or [], total, conteudo
+
+    # ---------- relatórios ----------
+
+    async def buscar_unico(self, host, token, relatorio, payload, registros=100, prazo=None, prazo_total=None):
+        """Relatório de página única (rel025). Retorna lista ou {'error': ...}"""
+        try:
+            lista, _, conteudo = await self._pagina(host, token, relatorio, 0, registros, payload, prazo, prazo_total)
+            coletados = RegistrosColetados()
+            coletados.adicionar_pagina(conteudo, lista)
+            return coletados
+        except RuntimeError as e:
+            self._log('error', str(e))
+            return {"error": str(e)}
+
+    async def buscar_paginado(self, host, token, relatorio, payload, registros_por_pagina=100,
+                              max_paginas=50, janela=4, prazo=None, progress_callback=None,
+                              checkpoint=None, prazo_total=None):
+        """Pagina um relatório buscando várias páginas em paralelo.
+
+        Se a API informa o total de registros, todas as páginas restantes
+        são disparadas de uma vez; senão, vai em janelas de `janela` páginas
+        até encontrar uma página incompleta. Em erro após a primeira página,
+        retorna os dados das páginas anteriores marcados como incompletos
+        (`completo=False`); com um `checkpoint`, as páginas recebidas ficam
+        guardadas e a próxima chamada retoma da página que falhou.
+        Retorna RegistrosColetados ou {'error': ...}.
+
+        `progress_callback(paginas_buscadas, total_paginas)` é chamado a cada
+        página; `total_paginas` é None quando a API não informa o total.
+        `prazo_total` (Prazo) limita a paginação inteira.
+        """
+        try:
+            primeira, total, conteudo = await self._pagina(host, token, relatorio, 0, registros_por_pagina, payload, prazo,
+                                                           prazo_total)
+        except RuntimeError as e:
+            self._log('error', str(e))
+            return {"error": str(e)}
+
+        paginas = {0: (primeira, impressao_pagina(conteudo))}
+        if len(primeira) < registros_por_pagina:
+            if checkpoint:
+                checkpoint.limpar()
+            if progress_callback:
+                progress_callback(1, 1)
+            return RegistrosColetados() if not primeira else self._juntar(paginas)
+
+        if checkpoint:
+            # Só páginas cheias: a última página de uma coleta ainda pode crescer
+            retomadas = {pagina: valor for pagina, valor in checkpoint.retomar(paginas[0][1]).items()
+                         if len(valor[0]) >= registros_por_pagina}
+            if retomadas:
+                self._log('info', f"Retomando {relatorio} com {len(retomadas)} páginas do checkpoint")
+            paginas.update(retomadas)
+            # Retomar não renova a validade: senão as páginas guardadas nunca seriam buscadas de novo
+            checkpoint.guardar(0, *paginas[0], renovar=False)
+
+        total_paginas = paginas_informadas = None
+        if isinstance(total, int) and total > 0:
+            paginas_informadas = math.ceil(total / registros_por_pagina)
+            total_paginas = min(max_paginas, paginas_informadas)
+
+        concluidas = [len(paginas)]
+        if progress_callback:
+            progress_callback(concluidas[0], total_paginas)
+
+        async def buscar(pagina):
+            resultado = await self._pagina(host, token, relatorio, pagina, registros_por_pagina, payload, prazo,
+                                           prazo_total)
+            concluidas[0] += 1
+            if progress_callback:
+                progress_callback(concluidas[0], total_paginas)
+            return resultado
+
+        proxima = 1
+        fim = total_paginas or max_paginas
+        falha = None
+        while proxima < fim:
+            lote = list(range(proxima, fim if total_paginas else min(fim, proxima + janela)))
+            # Páginas cheias do checkpoint não são buscadas de novo
+            pendentes = [p for p in lote if p not in paginas]
+            tarefas = [asyncio.ensure_future(buscar(p)) for p in pendentes]
+            try:
+                resultados = await asyncio.gather(*tarefas, return_exceptions=True)
+            except asyncio.CancelledError:
+                for tarefa in tarefas:
+                    tarefa.cancel()
+                raise
+
+            erros = {}
+            for pagina, resultado in zip(pendentes, resultados):
+                if isinstance(resultado, BaseException):
+                    erros[pagina] = resultado
+                    continue
+                registros_pagina, _, conteudo = resultado
+                paginas[pagina] = (registros_pagina, impressao_pagina(conteudo))
+                if checkpoint:
+                    checkpoint.guardar(pagina, *paginas[pagina])
+
+            terminou = False
+            for pagina in lote:
+                if pagina in erros:
+                    falha = f"{erros[pagina]}"
+                    self._log('warning', f"{falha} - coleta incompleta a partir da página {pagina}")
+                    terminou = True
+                    break
+                if len(paginas[pagina][0]) < registros_por_pagina:
+                    terminou = True
+                    break
+            if terminou:
+                break
+            proxima = lote[-1] + 1
+
+        truncado = None
+        if falha is None and proxima >= max_paginas and (paginas_informadas or max_paginas + 1) > max_paginas:
+            truncado = f"Limite de {max_paginas} páginas atingido no {relatorio}"
+            self._log('warning', truncado)
+
+        if progress_callback:
+            progress_callback(len(paginas), len(paginas))
+
+        # Só as páginas em sequência a partir da 0 entram no resultado
+        contiguas = {}
+        for pagina in sorted(paginas):
+            if pagina != len(contiguas):
+                break
+            contiguas[pagina] = paginas[pagina]
+        coletados = self._juntar(contiguas)
+        if truncado is not None:
+            coletados.marcar_truncado(truncado)
+        if falha is not None:
+            coletados.marcar_incompleto(falha)
+        elif checkpoint:
+            checkpoint.limpar()
+        return coletados
+
+    @staticmethod
+    def _juntar(paginas):
+        """Junta as páginas (registros, impressao) em ordem"""
+        todos_registros = RegistrosColetados()
+        for pagina in sorted(paginas):
+            registros_pagina, impressao = paginas[pagina]
+            if registros_pagina:
+                todos_registros.adicionar_pagina(None, registros_pagina, impressao)
+        return todos_registros
+
+    async def buscar_em_fontes(self, fontes, buscar, progress_callback=None):
+        """Roda `buscar(fonte, progress_callback)` em todas as fontes ao mesmo tempo e une os registros.
+
+        Cada registro ganha o campo 'fonte' com o nome da sua fonte, e as
+        impressões das páginas levam o nome da fonte na frente. O resultado
+        só é completo se todas as fontes responderam por inteiro; uma fonte
+        com erro deixa o resultado incompleto, e o erro só é devolvido
+        ({'error': ...}) se nenhuma fonte respondeu. `por_fonte` traz
+        registros, completo, erro e truncado de cada fonte; `truncado` do
+        resultado junta as fontes que pararam no limite de páginas.
+        """
+        progresso = {}
+
+        def progresso_fonte(nome):
+            def atualizar(paginas, total_paginas):
+                progresso[nome] = (paginas, total_paginas)
+                if progress_callback:
+                    totais = [total for _, total in progresso.values()]
+                    conhecido = len(progresso) == len(fontes) and all(totais)
+                    progress_callback(sum(paginas for paginas, _ in progresso.values()),
+                                      sum(totais) if conhecido else None)
+            return atualizar
+
+        resultados = await asyncio.gather(*(buscar(fonte, progresso_fonte(fonte.nome)) for fonte in fontes),
+                                          return_exceptions=True)
+
+        unidos = RegistrosColetados(por_fonte={})
+        falhas = []
+        truncados = []
+        respondidas = 0
+        for fonte, resultado in zip(fontes, resultados):
+            if isinstance(resultado, BaseException) or (isinstance(resultado, dict) and 'error' in resultado):
+                erro = resultado['error'] if isinstance(resultado, dict) else str(resultado)
+                unidos.por_fonte[fonte.nome] = {'registros': 0, 'completo': False, 'erro': erro, 'truncado': None}
+                falhas.append(f"{fonte.nome}: {erro}")
+                continue
+
+            respondidas += 1
+            completo = getattr(resultado, 'completo', True)
+            truncado = getattr(resultado, 'truncado', None)
+            unidos.por_fonte[fonte.nome] = {'registros': len(resultado), 'completo': completo,
+                                            'erro': None if completo else resultado.falha, 'truncado': truncado}
+            if not completo:
+                falhas.append(f"{fonte.nome}: {resultado.falha}")
+            if truncado:
+                truncados.append(f"{fonte.nome}: {truncado}")
+            for registro in resultado:
+                if isinstance(registro, dict):
+                    registro['fonte'] = fonte.nome
+            unidos.extend(resultado)
+            unidos.paginas.extend((f"{fonte.nome}:{impressao}", quantidade)
+                                  for impressao, quantidade in getattr(resultado, 'paginas', []))
+
+        if not respondidas:
+            return {"error": '; '.join(falhas)}
+        if falhas:
+            unidos.marcar_incompleto('; '.join(falhas))
+        if truncados:
+            unidos.marcar_truncado('; '.join(truncados))
+        return unidos
+
+    def estado(self):
+        return {
+            'paginas': self.paginas,
+            'hedges': self.hedges,
+            'hedges_vencedores': self.hedges_vencedores,
+            'paginas_sem_prazo': self.paginas_sem_prazo,
+            'latencias': self.latencias.resumo()
+        }
+
+    async def coletar(self, pedidos):
+        """Executa vários pedidos juntos.
+
+        `pedidos` é um dict nome -> corrotina (ex.: buscar_unico/buscar_paginado);
+        retorna um dict nome -> resultado.
+        """
+        nomes = list(pedidos)
+        resultados = await asyncio.gather(*(pedidos[nome] for nome in nomes))
+        return dict(zip(nomes, resultados))
@@ -0,0 +1,29 @@
+"""Processo coletor do modo multi-processo.
+
+Único processo que consulta o Escallo: aquece o cache, roda os atualizadores
+periódicos e publica snapshots em ESCALLO_SNAPSHOT_DIR. Os workers da API
+(ESCALLO_MODO=api) apenas leem esses snapshots, então a carga no Escallo
+continua a mesma independente de quantos workers estiverem servindo.
+
+Uso:
+    python coletor.py
+    ESCALLO_MODO=api gunicorn app:app --workers 4 --bind 0.0.0.0:5000
+"""
+import logging
+import os
+import time
+
+os.environ['ESCALLO_MODO'] = 'coletor'
+
+import app as escallo_app  # noqa: E402
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    
+    escallo_app.iniciar_coleta()
+    
+    while True:
+        time.sleep(3600)
@@ -0,0 +1,224 @@
+"""Fila de atualizações em background com um número fixo de trabalhadores.
+
+Toda atualização de cache (rel025, rel003 e rel030) vira uma tarefa numa
+fila de prioridade atendida por poucas threads fixas, em vez de uma thread
+nova por pedido. Cada tarefa tem uma chave (ex.: o tipo de cache): pedir de
+novo uma chave que já está na fila ou rodando devolve a mesma tarefa.
+
+Tarefas na fila podem ser canceladas e simplesmente não rodam; nas que já
+estão rodando, o cancelamento é repassado à coleta em andamento pelas ações
+registradas em `Tarefa.ao_cancelar`.
+
+O progresso é informado em páginas buscadas do total conhecido.
+"""
+import concurrent.futures
+import heapq
+import itertools
+import threading
+from datetime import datetime
+
+
+class Tarefa:
+    """Uma atualização agendada: `funcao(tarefa)` roda num trabalhador da fila"""
+
+    def __init__(self, chave, funcao, prioridade):
+        self.chave = chave
+        self.funcao = funcao
+        self.prioridade = prioridade
+        self.futuro = concurrent.futures.Future()
+        self.criada_em = datetime.now()
+        self.iniciada_em = None
+        self.concluida_em = None
+        self.paginas = 0
+        self.total_paginas = None
+        self._cancelada = False
+        self._ao_cancelar = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelada(self):
+        return self._cancelada
+
+    @property
+    def estado(self):
+        if not self.futuro.done():
+            return 'rodando' if self.iniciada_em else 'na_fila'
+        if self.futuro.cancelled() or isinstance(self.futuro.exception(), concurrent.futures.CancelledError):
+            return 'cancelada'
+        return 'erro' if self.futuro.exception() is not None else 'concluida'
+
+    @property
+    def percentual(self):
+        """Páginas buscadas do total conhecido, em %; 100 só quando a tarefa termina"""
+        if self.futuro.done():
+            return 100
+        if not self.total_paginas:
+            return 0
+        return min(99, int(self.paginas / self.total_paginas * 100))
+
+    def progresso(self, paginas, total_paginas=None):
+        """Callback de progresso das coletas: páginas buscadas e total (None se ainda desconhecido)"""
+        self.paginas = paginas
+        if total_paginas:
+            self.total_paginas = total_paginas
+
+    def ao_cancelar(self, acao):
+        """Registra o que fazer se a tarefa for cancelada enquanto roda (ex.: cancelar a coleta)"""
+        with self._lock:
+            if not self._cancelada:
+                self._ao_cancelar.append(acao)
+                return
+        acao()
+
+    def cancelar(self):
+        """Cancela a tarefa; retorna False se ela já tinha terminado"""
+        with self._lock:
+            if self.futuro.done():
+                return False
+            self._cancelada = True
+            acoes = list(self._ao_cancelar)
+        # Ainda na fila: o futuro é cancelado e o trabalhador descarta a tarefa
+        if self.futuro.cancel():
+            return True
+        for acao in acoes:
+            acao()
+        return True
+
+    def aguardar(self, timeout=None):
+        """Resultado da tarefa; levanta a exceção dela, CancelledError ou TimeoutError"""
+        return self.futuro.result(timeout)
+
+    def resumo(self):
+        return {
+            'chave': list(self.chave) if isinstance(self.chave, tuple) else self.chave,
+            'estado': self.estado,
+            'prioridade': self.prioridade,
+            'paginas': self.paginas,
+            'total_paginas': self.total_paginas,
+            'progresso': self.percentual,
+            'criada_em': self.criada_em.isoformat(),
+            'iniciada_em': self.iniciada_em.isoformat() if self.iniciada_em else None,
+            'concluida_em': self.concluida_em.isoformat() if self.concluida_em else None
+        }
+
+
+class FilaAtualizacoes:
+    """Fila de prioridade (menor número primeiro) com trabalhadores fixos e uma tarefa por chave"""
+
+    def __init__(self, trabalhadores=3, logger=None):
+        self.trabalhadores = trabalhadores
+        self.logger = logger
+        self._heap = []
+        self._sequencia = itertools.count()
+        self._tarefas = {}  # chave -> Tarefa na fila ou rodando
+        self._condicao = threading.Condition()
+        self._threads = []
+        self._concluidas = 0
+        self._falhas = 0
+        self._canceladas = 0
+        self._deduplicadas = 0
+
+    def iniciar(self):
+        """Sobe os trabalhadores (idempotente)"""
+        with self._condicao:
+            if self._threads:
+                return
+            for indice in range(self.trabalhadores):
+                thread = threading.Thread(target=self._trabalhar, name=f'fila-atualizacoes-{indice}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def agendar(self, chave, funcao, prioridade=10):
+        """Coloca `funcao(tarefa)` na fila e retorna a Tarefa.
+
+        Se a chave já está na fila ou rodando, devolve a tarefa existente;
+        se ela ainda está na fila, fica com a prioridade mais alta dos dois pedidos.
+        """
+        self.iniciar()
+        with self._condicao:
+            existente = self._tarefas.get(chave)
+            if existente is not None and not existente.futuro.done():
+                self._deduplicadas += 1
+                if existente.iniciada_em is None and prioridade < existente.prioridade:
+                    existente.prioridade = prioridade
+                    # A entrada antiga continua no heap e é ignorada quando sair
+                    heapq.heappush(self._heap, (prioridade, next(self._sequencia), existente))
+                    self._condicao.notify()
+                return existente
+
+            tarefa = Tarefa(chave, funcao, prioridade)
+            self._tarefas[chave] = tarefa
+            heapq.heappush(self._heap, (prioridade, next(self._sequencia), tarefa))
+            self._condicao.notify()
+            return tarefa
+
+    def cancelar(self, chave):
+        """Cancela a tarefa da chave, na fila ou rodando; retorna False se não havia nenhuma"""
+        with self._condicao:
+            tarefa = self._tarefas.get(chave)
+        if tarefa is None or not tarefa.cancelar():
+            return False
+        with self._condicao:
+            if tarefa.iniciada_em is None:
+                self._descartar(tarefa)
+                self._canceladas += 1
+        return True
+
+    def tarefa(self, chave):
+        """Tarefa na fila ou rodando para a chave, ou None"""
+        with self._condicao:
+            return self._tarefas.get(chave)
+
+    def _descartar(self, tarefa):
+        if self._tarefas.get(tarefa.chave) is tarefa:
+            del self._tarefas[tarefa.chave]
+
+    def _proxima(self):
+        with self._condicao:
+            while True:
+                while not self._heap:
+                    self._condicao.wait()
+                _, _, tarefa = heapq.heappop(self._heap)
+                # Entrada repetida de uma tarefa repriorizada, ou tarefa cancelada na fila
+                if tarefa.iniciada_em is not None or tarefa.futuro.done():
+                    continue
+                if not tarefa.futuro.set_running_or_notify_cancel():
+                    continue
+                tarefa.iniciada_em = datetime.now()
+                return tarefa
+
+    def _trabalhar(self):
+        while True:
+            tarefa = self._proxima()
+            try:
+                resultado = tarefa.funcao(tarefa)
+            except Exception as e:
+                if tarefa.cancelada:
+                    tarefa.futuro.set_exception(concurrent.futures.CancelledError())
+                    contador = '_canceladas'
+                else:
+                    if self.logger:
+                        self.logger.error(f"Erro na tarefa {tarefa.chave}: {str(e)}")
+                    tarefa.futuro.set_exception(e)
+                    contador = '_falhas'
+            else:
+                tarefa.futuro.set_result(resultado)
+                contador = '_concluidas'
+            tarefa.concluida_em = datetime.now()
+            with self._condicao:
+                setattr(self, contador, getattr(self, contador) + 1)
+                self._descartar(tarefa)
+
+    def estado(self):
+        """Tarefas na fila e rodando, e contadores desde o início"""
+        with self._condicao:
+            tarefas = sorted(self._tarefas.values(), key=lambda tarefa: (tarefa.prioridade, tarefa.criada_em))
+            return {
+                'trabalhadores': self.trabalhadores,
+                'rodando': [tarefa.resumo() for tarefa in tarefas if tarefa.iniciada_em is not None],
+                'na_fila': [tarefa.resumo() for tarefa in tarefas if tarefa.iniciada_em is None],
+                'concluidas': self._concluidas,
+                'falhas': self._falhas,
+                'canceladas': self._canceladas,
+                'deduplicadas': self._deduplicadas
+            }
@@ -0,0 +1,179 @@
+"""Instâncias (fontes) do Escallo atendidas por um único dashboard.
+
+Cada fonte tem host e token próprios, um orçamento de requisições (teto de
+concorrência e requisições por segundo) e um disjuntor: depois de
+`limite_falhas` falhas seguidas a fonte deixa de ser consultada por
+`espera_segundos`, e então uma única requisição de teste decide se ela
+volta. Uma fonte fora do ar não atrasa nem derruba as outras.
+
+As fontes vêm de um arquivo JSON (lista de objetos com nome, host e token
+ou token_env); sem o arquivo, ESCALLO_HOST/ESCALLO_TOKEN formam uma fonte
+única chamada 'principal'.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+
+class DisjuntorAberto(RuntimeError):
+    """A fonte está com o disjuntor aberto e não é consultada agora"""
+
+
+class Disjuntor:
+    """Disjuntor fechado -> aberto (após falhas seguidas) -> meio_aberto (um teste) -> fechado"""
+
+    def __init__(self, limite_falhas=5, espera_segundos=60):
+        self.limite_falhas = limite_falhas
+        self.espera_segundos = espera_segundos
+        self.estado = 'fechado'
+        self.falhas_seguidas = 0
+        self.aberto_em = None
+        self.aberturas = 0
+        self._teste_em_andamento = False
+        self._lock = threading.Lock()
+
+    def permite(self):
+        """True se a requisição pode seguir; no meio_aberto só passa uma por vez"""
+        with self._lock:
+            if self.estado == 'aberto':
+                if time.monotonic() - self.aberto_em < self.espera_segundos:
+                    return False
+                self.estado = 'meio_aberto'
+            if self.estado == 'meio_aberto':
+                if self._teste_em_andamento:
+                    return False
+                self._teste_em_andamento = True
+            return True
+
+    def registrar_sucesso(self):
+        with self._lock:
+            self.estado = 'fechado'
+            self.falhas_seguidas = 0
+            self._teste_em_andamento = False
+
+    def registrar_falha(self):
+        with self._lock:
+            self.falhas_seguidas += 1
+            self._teste_em_andamento = False
+            if self.estado == 'meio_aberto' or (self.estado == 'fechado' and self.falhas_seguidas >= self.limite_falhas):
+                self.estado = 'aberto'
+                self.aberto_em = time.monotonic()
+                self.aberturas += 1
+
+    def liberar(self):
+        """Requisição cancelada sem resultado: libera a vaga de teste sem mudar o estado"""
+        with self._lock:
+            self._teste_em_andamento = False
+
+    def resumo(self):
+        with self._lock:
+            restante = None
+            if self.estado == 'aberto':
+                restante = max(0, round(self.espera_segundos - (time.monotonic() - self.aberto_em), 1))
+            return {
+                'estado': self.estado,
+                'falhas_seguidas': self.falhas_seguidas,
+                'aberturas': self.aberturas,
+                'reabre_em_segundos': restante
+            }
+
+
+class FonteEscallo:
+    """Uma instância do Escallo com credenciais, orçamento de requisições e disjuntor próprios"""
+
+    def __init__(self, nome, host, token, max_concorrencia=None, requisicoes_por_segundo=None,
+                 limite_falhas=5, espera_disjuntor=60):
+        self.nome = nome
+        self.host = host
+        self.token = token
+        self.max_concorrencia = max_concorrencia
+        self.requisicoes_por_segundo = requisicoes_por_segundo
+        self.disjuntor = Disjuntor(limite_falhas, espera_disjuntor)
+        self.requisicoes = 0
+        self.falhas = 0
+        self.ultimo_erro = None
+        self.ultimo_sucesso = None
+        self._proxima_vaga = 0.0
+        self._semaforo = None
+        self._lock = threading.Lock()
+
+    def reservar(self):
+        """Reserva a próxima vaga do orçamento por segundo e retorna quantos segundos esperar por ela"""
+        if not self.requisicoes_por_segundo:
+            return 0
+        with self._lock:
+            agora = time.monotonic()
+            vaga = max(agora, self._proxima_vaga)
+            self._proxima_vaga = vaga + 1 / self.requisicoes_por_segundo
+            return vaga - agora
+
+    def semaforo(self):
+        """Teto de concorrência da fonte no event loop do motor (None se só vale o teto global)"""
+        if self.max_concorrencia and self._semaforo is None:
+            self._semaforo = asyncio.Semaphore(self.max_concorrencia)
+        return self._semaforo
+
+    def registrar(self, erro=None):
+        """Resultado de uma requisição: alimenta o disjuntor e os contadores da fonte"""
+        with self._lock:
+            self.requisicoes += 1
+            if erro is None:
+                self.ultimo_sucesso = datetime.now()
+            else:
+                self.falhas += 1
+                self.ultimo_erro = erro
+        if erro is None:
+            self.disjuntor.registrar_sucesso()
+        else:
+            self.disjuntor.registrar_falha()
+
+    def estado(self):
+        with self._lock:
+            return {
+                'nome': self.nome,
+                'host': self.host,
+                'max_concorrencia': self.max_concorrencia,
+                'requisicoes_por_segundo': self.requisicoes_por_segundo,
+                'requisicoes': self.requisicoes,
+                'falhas': self.falhas,
+                'ultimo_erro': self.ultimo_erro,
+                'ultimo_sucesso': self.ultimo_sucesso.isoformat() if self.ultimo_sucesso else None,
+                'disjuntor': self.disjuntor.resumo()
+            }
+
+
+def carregar_fontes(caminho, host_padrao=None, token_padrao=None):
+    """Lista de FonteEscallo do arquivo `caminho`, ou a fonte única de host/token padrão.
+
+    Formato: [{"nome": ..., "host": ..., "token": ... (ou "token_env": VARIAVEL),
+    "max_concorrencia": N, "requisicoes_por_segundo": N, "limite_falhas": N,
+    "espera_disjuntor": segundos}, ...]
+    """
+    if not caminho or not os.path.exists(caminho):
+        return [FonteEscallo('principal', host_padrao, token_padrao)]
+
+    with open(caminho, encoding='utf-8') as f:
+        bruto = json.load(f)
+    if not isinstance(bruto, list) or not bruto:
+        raise ValueError("O arquivo de fontes deve ser uma lista não vazia de fontes")
+
+    fontes = []
+    for item in bruto:
+        if not isinstance(item, dict) or not item.get('nome') or not item.get('host'):
+            raise ValueError(f"Fonte inválida {item!r}: nome e host são obrigatórios")
+        token = item.get('token') or os.getenv(item.get('token_env', ''))
+        if not token:
+            raise ValueError(f"Fonte {item['nome']}: informe token ou token_env")
+        if any(fonte.nome == item['nome'] for fonte in fontes):
+            raise ValueError(f"Fonte {item['nome']} repetida")
+        fontes.append(FonteEscallo(
+            item['nome'], item['host'], token,
+            max_concorrencia=item.get('max_concorrencia'),
+            requisicoes_por_segundo=item.get('requisicoes_por_segundo'),
+            limite_falhas=item.get('limite_falhas', 5),
+            espera_disjuntor=item.get('espera_disjuntor', 60)
+        ))
+    return fontes
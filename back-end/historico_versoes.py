@@ -0,0 +1,73 @@
+"""Últimas versões dos dados de cada (setor, tipo), para respostas em delta.
+
+O cliente informa a versão que já tem (`desde`) e recebe só as linhas de
+atendentes que mudaram desde então, em vez das listas inteiras. Para isso
+guardamos, por chave, as últimas versões publicadas num buffer circular;
+se a versão do cliente já saiu do buffer, ele recebe os dados completos.
+"""
+import threading
+from collections import OrderedDict
+
+# Listas de linhas por atendente (identificadas por 'codigo') nas respostas de /api/dados/*
+LISTAS_POR_ATENDENTE = ('data', 'dia', 'mes')
+
+
+def calcular_delta(anterior, atual, desde, versao):
+    """Resposta com as linhas alteradas de `atual` em relação a `anterior`.
+
+    Campos que não são listas por atendente (totais, atualizado_em, ...)
+    são pequenos e vão sempre inteiros. `ordem` traz a sequência de códigos
+    de cada lista, para o cliente remontar a ordenação sem recalcular.
+    """
+    resposta = {}
+    alterados, removidos, ordem = {}, {}, {}
+    for chave, valor in atual.items():
+        if chave not in LISTAS_POR_ATENDENTE or not isinstance(valor, list):
+            resposta[chave] = valor
+            continue
+
+        antigas = {linha.get('codigo'): linha for linha in anterior.get(chave) or []}
+        codigos = [linha.get('codigo') for linha in valor]
+        alterados[chave] = [linha for linha in valor if antigas.get(linha.get('codigo')) != linha]
+        presentes = set(codigos)
+        removidos[chave] = [codigo for codigo in antigas if codigo not in presentes]
+        ordem[chave] = codigos
+
+    resposta.update({
+        'delta': True,
+        'desde': desde,
+        'versao': versao,
+        'alterados': alterados,
+        'removidos': removidos,
+        'ordem': ordem
+    })
+    return resposta
+
+
+class HistoricoVersoes:
+    """Buffer circular das últimas versões de cada chave"""
+
+    def __init__(self, tamanho=8):
+        self.tamanho = tamanho
+        self._versoes = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, chave, versao, dados):
+        with self._lock:
+            versoes = self._versoes.setdefault(chave, OrderedDict())
+            if versao in versoes:
+                return
+            versoes[versao] = dados
+            while len(versoes) > self.tamanho:
+                versoes.popitem(last=False)
+
+    def obter(self, chave, versao):
+        with self._lock:
+            return self._versoes.get(chave, {}).get(versao)
+
+    def delta(self, chave, desde, atual, versao):
+        """Delta de `desde` até `atual`, ou None se a versão `desde` já expirou"""
+        anterior = self.obter(chave, desde)
+        if anterior is None:
+            return None
+        return calcular_delta(anterior, atual, desde, versao)
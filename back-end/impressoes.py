@@ -0,0 +1,46 @@
+"""Impressões digitais das páginas brutas vindas do Escallo.
+
+Cada página recebida é identificada pelo hash dos bytes da resposta. Os
+registros coletados carregam a lista de impressões das páginas de origem,
+o que permite saber, sem processar nada, se uma nova coleta é igual à
+anterior ou se só a última página mudou.
+"""
+import hashlib
+
+
+def impressao_pagina(conteudo):
+    """Hash curto e barato dos bytes de uma resposta"""
+    return hashlib.blake2b(conteudo, digest_size=16).hexdigest()
+
+
+class RegistrosColetados(list):
+    """Lista de registros de um relatório com as impressões das páginas de origem.
+
+    `paginas` é uma lista de (impressao, quantidade_de_registros) na ordem em
+    que as páginas foram coletadas. `completo` é False quando a paginação
+    parou antes do fim por erro numa página; `falha` diz o motivo. Parar no
+    limite de páginas não é falha: a coleta é completa até ali (tentar de
+    novo pararia no mesmo ponto) e `truncado` diz o motivo. `por_fonte`
+    resume, por instância do Escallo, quantos registros vieram dela e se a
+    coleta dela terminou.
+    """
+
+    def __init__(self, registros=(), paginas=None, completo=True, falha=None, por_fonte=None, truncado=None):
+        super().__init__(registros)
+        self.paginas = list(paginas or [])
+        self.completo = completo
+        self.falha = falha
+        self.por_fonte = por_fonte
+        self.truncado = truncado
+
+    def adicionar_pagina(self, conteudo, registros_pagina, impressao=None):
+        """Acrescenta uma página; `impressao` evita recalcular o hash de uma página já conhecida"""
+        self.paginas.append((impressao or impressao_pagina(conteudo), len(registros_pagina)))
+        self.extend(registros_pagina)
+
+    def marcar_incompleto(self, falha):
+        self.completo = False
+        self.falha = falha
+
+    def marcar_truncado(self, motivo):
+        self.truncado = motivo
@@ -0,0 +1,197 @@
+"""Tabela materializada de indicadores por atendente e dia.
+
+Junta numa linha por (dia, atendente) o que vem de três relatórios:
+rel025 (ligações oferecidas/atendidas e tempo de login), rel003 (ligações
+ativas atendidas) e rel030 (ligações recuperadas). Os indicadores
+derivados são calculados na gravação, então quem lê só consulta a linha.
+
+Cada relatório atualiza só as suas colunas, e só nas linhas que mudaram.
+As contagens por dia do rel003/rel030 são guardadas por impressão de
+página: uma página que não mudou desde a última coleta não é recontada.
+
+As linhas são imutáveis e cada dia é trocado por inteiro numa
+atualização, para que as leituras não precisem de lock.
+"""
+import threading
+from collections import defaultdict
+from types import MappingProxyType
+
+COLUNAS_ATENDIMENTO = ('ligacoesOferecidas', 'ligacoesOferecidasAtendidas', 'tempoAtendimento', 'tempoLogin')
+COLUNAS_SOMADAS = COLUNAS_ATENDIMENTO + ('ligacoesAtivas', 'ligacoesRecuperadas')
+
+
+def segundos(valor):
+    """Duração do Escallo em segundos: número ou 'H:MM:SS' / 'MM:SS'"""
+    if isinstance(valor, (int, float)):
+        return int(valor)
+    texto = str(valor or '').strip()
+    if not texto:
+        return 0
+    if texto.isdigit():
+        return int(texto)
+    total = 0
+    try:
+        for parte in texto.split(':'):
+            total = total * 60 + int(parte)
+    except ValueError:
+        return 0
+    return total
+
+
+def derivar(linha):
+    """Indicadores calculados a partir das colunas brutas (None quando falta a base)"""
+    oferecidas = linha.get('ligacoesOferecidas')
+    atendidas = linha.get('ligacoesOferecidasAtendidas')
+    perdidas = None if oferecidas is None or atendidas is None else max(0, oferecidas - atendidas)
+    # rel003/rel030 cobrem o mês inteiro: atendente sem registro no dia tem zero
+    recuperadas = linha.get('ligacoesRecuperadas') or 0
+    ativas = linha.get('ligacoesAtivas') or 0
+    horas_login = (linha.get('tempoLogin') or 0) / 3600
+
+    return {
+        'ligacoesPerdidas': perdidas,
+        'tma': (linha.get('tempoAtendimento') or 0) // atendidas if atendidas else None,
+        'taxaRecuperacao': round(recuperadas / perdidas * 100, 2) if perdidas else None,
+        'retornosPorPerdida': round(ativas / perdidas, 2) if perdidas else None,
+        'ativasPorHoraLogin': round(ativas / horas_login, 2) if horas_login else None
+    }
+
+
+def totalizar(linhas):
+    """Soma as colunas de várias linhas de um atendente (vários dias) e recalcula os indicadores"""
+    total = dict.fromkeys(COLUNAS_SOMADAS, 0)
+    for linha in linhas:
+        for coluna in COLUNAS_SOMADAS:
+            total[coluna] += linha.get(coluna) or 0
+    total.update(derivar(total))
+    return total
+
+
+class TabelaKpis:
+    """Linhas (dia, atendente) com as colunas dos três relatórios e os indicadores derivados"""
+
+    def __init__(self):
+        self._dias = {}  # 'YYYY-MM-DD' -> MappingProxyType {codigo: MappingProxyType(linha)}
+        self._paginas = {}  # coluna -> {impressao: {dia: {codigo: n}}} das páginas da última coleta
+        self._lock = threading.Lock()
+        self.versao = 0
+        self.linhas_alteradas = 0
+        self.paginas_recontadas = 0
+        self.paginas_reaproveitadas = 0
+
+    def _gravar(self, dia, colunas_por_codigo, colunas, zerar_ausentes=False):
+        """Troca as `colunas` das linhas de um dia; retorna quantas linhas mudaram.
+
+        Com `zerar_ausentes`, atendentes que já tinham a coluna e não vieram
+        agora ficam com zero (a contagem do dia inteiro foi refeita).
+        """
+        atual = self._dias.get(dia, {})
+        novo = dict(atual)
+        codigos = set(colunas_por_codigo)
+        if zerar_ausentes:
+            codigos |= {codigo for codigo, linha in atual.items() if any(linha.get(c) for c in colunas)}
+
+        alteradas = 0
+        for codigo in codigos:
+            anterior = atual.get(codigo)
+            linha = dict(anterior) if anterior else {'dia': dia, 'codigo': codigo}
+            valores = colunas_por_codigo.get(codigo, {})
+            for coluna in colunas:
+                linha[coluna] = valores.get(coluna, 0)
+            if anterior is not None and all(anterior.get(coluna) == linha[coluna] for coluna in colunas):
+                continue
+            linha.update(derivar(linha))
+            novo[codigo] = MappingProxyType(linha)
+            alteradas += 1
+
+        if alteradas:
+            self._dias[dia] = MappingProxyType(novo)
+            self.versao += 1
+            self.linhas_alteradas += alteradas
+        return alteradas
+
+    def atualizar_atendimentos(self, dia, registros):
+        """Colunas do rel025 de um dia (registros do mesmo código em várias fontes são somados)"""
+        por_codigo = {}
+        for registro in registros:
+            if not isinstance(registro, dict):
+                continue
+            codigo = str(registro.get('codigo', '')).strip()
+            if not codigo:
+                continue
+            linha = por_codigo.setdefault(codigo, dict.fromkeys(COLUNAS_ATENDIMENTO, 0))
+            linha['ligacoesOferecidas'] += int(registro.get('ligacoesOferecidas') or 0)
+            linha['ligacoesOferecidasAtendidas'] += int(registro.get('ligacoesOferecidasAtendidas') or 0)
+            linha['tempoAtendimento'] += segundos(registro.get('tempoAtendimento'))
+            linha['tempoLogin'] += segundos(registro.get('tempoLogin'))
+        with self._lock:
+            return self._gravar(dia, por_codigo, COLUNAS_ATENDIMENTO, zerar_ausentes=True)
+
+    def atualizar_contagens(self, coluna, registros, paginas, contar_pagina):
+        """Coluna de contagem (rel003/rel030) de todos os dias presentes nos registros.
+
+        `paginas` é a lista (impressao, quantidade) dos registros;
+        `contar_pagina(registros)` retorna {dia: {codigo: n}}. Só as
+        páginas com impressão nova são contadas.
+        """
+        with self._lock:
+            anteriores = self._paginas.get(coluna, {})
+            atuais = {}
+            totais = defaultdict(lambda: defaultdict(int))
+            inicio = 0
+            for impressao, quantidade in paginas or [(None, len(registros))]:
+                contagem = anteriores.get(impressao) if impressao is not None else None
+                if contagem is None:
+                    contagem = contar_pagina(registros[inicio:inicio + quantidade])
+                    self.paginas_recontadas += 1
+                else:
+                    self.paginas_reaproveitadas += 1
+                if impressao is not None:
+                    atuais[impressao] = contagem
+                for dia, por_codigo in contagem.items():
+                    for codigo, total in por_codigo.items():
+                        totais[dia][codigo] += total
+                inicio += quantidade
+            self._paginas[coluna] = atuais
+
+            alteradas = 0
+            # Dias que tinham a coluna e sumiram da coleta (ex.: virou o mês) não são apagados
+            for dia, por_codigo in totais.items():
+                alteradas += self._gravar(dia, {codigo: {coluna: total} for codigo, total in por_codigo.items()},
+                                          (coluna,), zerar_ausentes=True)
+            return alteradas
+
+    def sobrepor_dia(self, coluna, dia, contagens):
+        """Troca a coluna de um dia pelas contagens do acompanhamento em tempo real"""
+        with self._lock:
+            return self._gravar(dia, {codigo: {coluna: total} for codigo, total in contagens.items()},
+                                (coluna,), zerar_ausentes=True)
+
+    def linhas(self, dia, codigos=None):
+        """Linhas de um dia (todas ou só dos códigos informados), sem lock"""
+        linhas_dia = self._dias.get(dia, {})
+        if codigos is None:
+            return list(linhas_dia.values())
+        return [linhas_dia[codigo] for codigo in codigos if codigo in linhas_dia]
+
+    def linha(self, dia, codigo):
+        return self._dias.get(dia, {}).get(codigo)
+
+    def dias(self):
+        return sorted(self._dias)
+
+    def descartar_antes(self, dia):
+        """Remove os dias anteriores a `dia` (a tabela guarda só o período acompanhado)"""
+        with self._lock:
+            for antigo in [d for d in self._dias if d < dia]:
+                del self._dias[antigo]
+
+    def estado(self):
+        return {
+            'dias': len(self._dias),
+            'linhas': sum(len(linhas) for linhas in list(self._dias.values())),
+            'versao': self.versao,
+            'linhas_alteradas': self.linhas_alteradas,
+            'paginas_recontadas': self.paginas_recontadas,
+            'paginas_reaproveitadas': self.paginas_reaproveitadas
+        }
@@ -0,0 +1,156 @@
+"""Medição de memória do processo: tamanho das estruturas retidas e picos por atualização.
+
+O tamanho de uma estrutura é aproximado: a soma de sys.getsizeof de todos
+os objetos alcançáveis a partir dela (via gc.get_referents), contando cada
+objeto uma vez e sem entrar em classes, módulos e funções.
+
+Os picos por atualização usam tracemalloc, que custa CPU e memória, então
+só é ligado quando pedido (variável de ambiente ou rota de administração).
+O tracemalloc tem um único pico por processo: atualizações simultâneas
+compartilham o mesmo pico e são marcadas como `sobreposta`.
+"""
+import gc
+import logging
+import sys
+import threading
+import time
+import tracemalloc
+import types
+from contextlib import contextmanager
+from datetime import datetime
+
+# Objetos compartilhados com o resto do processo, que não pertencem à estrutura medida
+NAO_PERCORRER = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, logging.Logger)
+
+
+def tamanho_profundo(objeto, vistos=None):
+    """Bytes aproximados de `objeto` e de tudo que ele alcança.
+
+    `vistos` (set de ids) pode ser compartilhado entre chamadas para não
+    contar duas vezes o que duas estruturas têm em comum.
+    """
+    vistos = set() if vistos is None else vistos
+    total = 0
+    pendentes = [objeto]
+    while pendentes:
+        atual = pendentes.pop()
+        if isinstance(atual, NAO_PERCORRER) or id(atual) in vistos:
+            continue
+        vistos.add(id(atual))
+        total += sys.getsizeof(atual, 0)
+        pendentes.extend(gc.get_referents(atual))
+    return total
+
+
+def memoria_processo():
+    """RSS atual e pico do processo em bytes (None onde o sistema não informa)"""
+    atual = pico = None
+    try:
+        with open('/proc/self/status', encoding='ascii') as f:
+            for linha in f:
+                if linha.startswith('VmRSS:'):
+                    atual = int(linha.split()[1]) * 1024
+                elif linha.startswith('VmHWM:'):
+                    pico = int(linha.split()[1]) * 1024
+    except OSError:
+        try:
+            import resource
+            # ru_maxrss vem em KB no Linux
+            pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        except ImportError:
+            pass
+    return {'rss_bytes': atual, 'pico_rss_bytes': pico}
+
+
+class MonitorMemoria:
+    """Picos de alocação de cada atualização (por nome), medidos com tracemalloc quando ligado"""
+
+    def __init__(self, quadros=1):
+        self.quadros = quadros
+        self.medicoes = {}  # nome -> última medição
+        self.maiores_picos = {}  # nome -> maior pico já medido
+        self._ativas = 0
+        self._iniciadas = 0
+        self._lock = threading.Lock()
+
+    def ativo(self):
+        return tracemalloc.is_tracing()
+
+    def ligar(self, quadros=None):
+        """Liga o tracemalloc guardando `quadros` níveis da pilha de cada alocação"""
+        if quadros:
+            self.quadros = quadros
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.quadros)
+
+    def desligar(self):
+        """Desliga o tracemalloc e libera os rastros (as medições já feitas continuam)"""
+        tracemalloc.stop()
+
+    @contextmanager
+    def medir(self, nome):
+        """Mede o pico de memória alocada durante o bloco (não faz nada com o rastreamento desligado)"""
+        if not tracemalloc.is_tracing():
+            yield
+            return
+
+        with self._lock:
+            sobreposta = self._ativas > 0
+            if not sobreposta:
+                tracemalloc.reset_peak()
+            self._ativas += 1
+            self._iniciadas += 1
+            iniciadas = self._iniciadas
+            inicio = tracemalloc.get_traced_memory()[0]
+        comeco = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._ativas -= 1
+                # Rastreamento desligado no meio do bloco: não há o que medir
+                if tracemalloc.is_tracing():
+                    atual, pico = tracemalloc.get_traced_memory()
+                    medicao = {
+                        'pico_bytes': max(0, pico - inicio),
+                        'retidos_bytes': atual - inicio,
+                        'duracao_segundos': round(time.monotonic() - comeco, 3),
+                        'em': datetime.now().isoformat(),
+                        'sobreposta': sobreposta or self._iniciadas != iniciadas
+                    }
+                    self.medicoes[nome] = medicao
+                    if medicao['pico_bytes'] > self.maiores_picos.get(nome, {}).get('pico_bytes', -1):
+                        self.maiores_picos[nome] = medicao
+
+    def principais_alocacoes(self, limite=10):
+        """Linhas de código com mais memória alocada ainda viva (vazio com o rastreamento desligado)"""
+        if not tracemalloc.is_tracing():
+            return []
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+            tracemalloc.Filter(False, '<unknown>')
+        ))
+        return [
+            {
+                'local': f'{estatistica.traceback[0].filename}:{estatistica.traceback[0].lineno}',
+                'bytes': estatistica.size,
+                'blocos': estatistica.count
+            }
+            for estatistica in snapshot.statistics('lineno')[:limite]
+        ]
+
+    def estado(self):
+        with self._lock:
+            ativo = tracemalloc.is_tracing()
+            atual, pico = tracemalloc.get_traced_memory() if ativo else (None, None)
+            return {
+                'ativo': ativo,
+                'quadros': self.quadros,
+                'rastreado_bytes': atual,
+                'pico_rastreado_bytes': pico,
+                'sobrecarga_bytes': tracemalloc.get_tracemalloc_memory() if ativo else None,
+                'ultimas': dict(self.medicoes),
+                'maiores': dict(self.maiores_picos)
+            }
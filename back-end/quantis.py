@@ -0,0 +1,236 @@
+"""Distribuição das durações das ligações por atendente e por dia.
+
+O TMA do rel025 é uma média e esconde as ligações longas. Aqui cada
+ligação atendida do rel003 entra num sketch de quantis de tamanho fixo
+(buckets logarítmicos, no estilo DDSketch): o quantil devolvido tem erro
+relativo de no máximo `erro_relativo` e dois sketches se juntam somando
+os buckets. Guardamos um sketch por atendente e dia; os percentis de
+qualquer período (e do setor) saem da junção dos sketches diários, sem
+reordenar as ligações.
+
+Como nas contagens da tabela de indicadores, os sketches de cada página
+do rel003 ficam guardados pela impressão da página: uma página que não
+mudou não é relida, e só os dias tocados por páginas novas são remontados.
+"""
+import math
+import threading
+
+ERRO_RELATIVO = 0.01
+MAX_BUCKETS = 1024
+QUANTIS = (('p50', 0.5), ('p90', 0.9), ('p99', 0.99))
+
+
+class SketchQuantis:
+    """Sketch de quantis com erro relativo limitado e no máximo `max_buckets` buckets"""
+
+    def __init__(self, erro_relativo=ERRO_RELATIVO, max_buckets=MAX_BUCKETS):
+        self.erro_relativo = erro_relativo
+        self.max_buckets = max_buckets
+        self._gama = (1 + erro_relativo) / (1 - erro_relativo)
+        self._log_gama = math.log(self._gama)
+        self.buckets = {}  # índice -> quantidade; o bucket i cobre (gama^(i-1), gama^i]
+        self.zeros = 0
+        self.total = 0
+        self.soma = 0
+        self.minimo = None
+        self.maximo = None
+
+    def adicionar(self, valor, vezes=1):
+        if valor <= 0:
+            self.zeros += vezes
+            valor = 0
+        else:
+            indice = math.ceil(math.log(valor) / self._log_gama)
+            self.buckets[indice] = self.buckets.get(indice, 0) + vezes
+            self._limitar()
+        self.total += vezes
+        self.soma += valor * vezes
+        self.minimo = valor if self.minimo is None else min(self.minimo, valor)
+        self.maximo = valor if self.maximo is None else max(self.maximo, valor)
+
+    def _limitar(self):
+        """Acima de max_buckets, junta os menores buckets: o erro cai nas durações mais curtas"""
+        if len(self.buckets) <= self.max_buckets:
+            return
+        indices = sorted(self.buckets)
+        excedentes = indices[:len(indices) - self.max_buckets + 1]
+        destino = indices[len(excedentes)]
+        self.buckets[destino] += sum(self.buckets.pop(indice) for indice in excedentes)
+
+    def mesclar(self, outro):
+        """Soma outro sketch (com o mesmo erro relativo) a este e retorna este"""
+        if outro.erro_relativo != self.erro_relativo:
+            raise ValueError("Só é possível juntar sketches com o mesmo erro relativo")
+        for indice, quantidade in outro.buckets.items():
+            self.buckets[indice] = self.buckets.get(indice, 0) + quantidade
+        self._limitar()
+        self.zeros += outro.zeros
+        self.total += outro.total
+        self.soma += outro.soma
+        if outro.total:
+            self.minimo = outro.minimo if self.minimo is None else min(self.minimo, outro.minimo)
+            self.maximo = outro.maximo if self.maximo is None else max(self.maximo, outro.maximo)
+        return self
+
+    def quantil(self, q):
+        """Valor no quantil q (0..1), ou None se o sketch está vazio"""
+        if not self.total:
+            return None
+        posicao = q * (self.total - 1)
+        acumulado = self.zeros
+        if posicao < acumulado:
+            return 0
+        for indice in sorted(self.buckets):
+            acumulado += self.buckets[indice]
+            if acumulado > posicao:
+                # Meio do bucket em erro relativo: 2·gama^i / (gama + 1)
+                valor = 2 * self._gama ** indice / (self._gama + 1)
+                return min(max(valor, self.minimo), self.maximo)
+        return self.maximo
+
+    def resumo(self):
+        resumo = {
+            'total': self.total,
+            'media': round(self.soma / self.total, 1) if self.total else None,
+            'maximo': self.maximo
+        }
+        for nome, q in QUANTIS:
+            valor = self.quantil(q)
+            resumo[nome] = round(valor, 1) if valor is not None else None
+        return resumo
+
+    def para_dict(self):
+        return {
+            'erro_relativo': self.erro_relativo,
+            'buckets': self.buckets,
+            'zeros': self.zeros,
+            'soma': self.soma,
+            'minimo': self.minimo,
+            'maximo': self.maximo
+        }
+
+    @classmethod
+    def de_dict(cls, dados):
+        sketch = cls(dados['erro_relativo'])
+        sketch.buckets = {int(indice): quantidade for indice, quantidade in dados['buckets'].items()}
+        sketch.zeros = dados['zeros']
+        sketch.total = dados['zeros'] + sum(sketch.buckets.values())
+        sketch.soma = dados['soma']
+        sketch.minimo = dados['minimo']
+        sketch.maximo = dados['maximo']
+        return sketch
+
+
+def juntar(sketches):
+    """Novo sketch com a soma dos informados"""
+    resultado = SketchQuantis()
+    for sketch in sketches:
+        resultado.mesclar(sketch)
+    return resultado
+
+
+class DuracoesPorDia:
+    """Sketches de duração por dia e atendente, mantidos página a página.
+
+    `extrair(registro)` retorna (dia 'YYYY-MM-DD', codigo, segundos) ou None
+    se a ligação não entra na distribuição.
+    """
+
+    def __init__(self, extrair, retencao_dias=62):
+        self.extrair = extrair
+        self.retencao_dias = retencao_dias
+        self._dias = {}  # dia -> {codigo: SketchQuantis}, trocado por inteiro
+        self._paginas = {}  # impressao -> {dia: {codigo: SketchQuantis}} da última coleta
+        self._lock = threading.Lock()
+        self.versao = 0
+        self.paginas_lidas = 0
+        self.paginas_reaproveitadas = 0
+
+    def _sketches_pagina(self, registros):
+        por_dia = {}
+        for registro in registros:
+            extraido = self.extrair(registro) if isinstance(registro, dict) else None
+            if extraido is None:
+                continue
+            dia, codigo, segundos = extraido
+            por_dia.setdefault(dia, {}).setdefault(codigo, SketchQuantis()).adicionar(segundos)
+        return por_dia
+
+    def atualizar(self, registros, paginas, data_inicial, data_final):
+        """Aplica uma coleta do rel003 que cobre de data_inicial a data_final (YYYY-MM-DD).
+
+        Só os dias desse intervalo tocados por páginas novas ou que saíram
+        são remontados; os demais (ex.: meses anteriores) ficam como estão.
+        Retorna os dias remontados.
+        """
+        with self._lock:
+            atuais = {}
+            tocados = set()
+            inicio = 0
+            for impressao, quantidade in paginas or [(None, len(registros))]:
+                sketches = self._paginas.get(impressao) if impressao is not None else None
+                if sketches is None:
+                    sketches = self._sketches_pagina(registros[inicio:inicio + quantidade])
+                    tocados.update(sketches)
+                    self.paginas_lidas += 1
+                else:
+                    self.paginas_reaproveitadas += 1
+                atuais[impressao if impressao is not None else len(atuais)] = sketches
+                inicio += quantidade
+            for impressao, sketches in self._paginas.items():
+                if impressao not in atuais:
+                    tocados.update(sketches)
+            self._paginas = atuais
+
+            remontados = sorted(dia for dia in tocados if data_inicial <= dia <= data_final)
+            if not remontados:
+                return remontados
+            # Dicionário novo trocado de uma vez: quem lê não precisa de lock
+            dias = dict(self._dias)
+            for dia in remontados:
+                por_codigo = {}
+                for sketches in atuais.values():
+                    for codigo, sketch in sketches.get(dia, {}).items():
+                        por_codigo.setdefault(codigo, SketchQuantis()).mesclar(sketch)
+                if por_codigo:
+                    dias[dia] = por_codigo
+                else:
+                    dias.pop(dia, None)
+            for antigo in sorted(dias)[:max(0, len(dias) - self.retencao_dias)]:
+                del dias[antigo]
+            self._dias = dias
+            self.versao += 1
+            return remontados
+
+    def periodo(self, data_inicial, data_final, codigos):
+        """Sketch de cada código no intervalo, juntando os sketches diários"""
+        resultado = {codigo: SketchQuantis() for codigo in codigos}
+        for dia, por_codigo in self._dias.items():
+            if not data_inicial <= dia <= data_final:
+                continue
+            for codigo in codigos:
+                sketch = por_codigo.get(codigo)
+                if sketch is not None:
+                    resultado[codigo].mesclar(sketch)
+        return resultado
+
+    def dias(self):
+        return sorted(self._dias)
+
+    def exportar(self, codigos):
+        """Sketches diários dos códigos, em dicts (para os snapshots do modo coletor)"""
+        return {
+            dia: {codigo: sketch.para_dict() for codigo, sketch in por_codigo.items() if codigo in codigos}
+            for dia, por_codigo in list(self._dias.items())
+        }
+
+    def estado(self):
+        return {
+            'dias': len(self._dias),
+            'sketches': sum(len(por_codigo) for por_codigo in list(self._dias.values())),
+            'buckets': sum(len(sketch.buckets) for por_codigo in list(self._dias.values())
+                           for sketch in por_codigo.values()),
+            'versao': self.versao,
+            'paginas_lidas': self.paginas_lidas,
+            'paginas_reaproveitadas': self.paginas_reaproveitadas
+        }
@@ -0,0 +1,122 @@
+"""Rastreio estruturado para depuração, ligado por subsistema e setor em tempo de execução.
+
+Cada subsistema tem um Canal. Desligado, o custo é ler `canal.ativo` antes
+da chamada:
+
+    if rastreio_coleta.ativo:
+        rastreio_coleta('página recebida', setor=setor, pagina=pagina, amostra=lambda: registros[0])
+
+A mensagem e os campos podem ser funções sem argumentos: só são chamadas
+quando o evento passa pelo filtro de setor e pela amostragem. Os eventos
+vão para o logger (uma linha JSON) e para um buffer circular consultado
+pela rota de administração.
+"""
+import json
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+
+class Canal:
+    """Canal de um subsistema; `ativo` só é True enquanto há uma regra ligada para ele"""
+
+    __slots__ = ('nome', 'ativo', 'setores', 'amostragem', 'expira_em', 'emitidos', 'descartados', '_rastreio')
+
+    def __init__(self, nome, rastreio):
+        self.nome = nome
+        self.ativo = False
+        self.setores = None  # None = todos
+        self.amostragem = 1.0
+        self.expira_em = None
+        self.emitidos = 0
+        self.descartados = 0
+        self._rastreio = rastreio
+
+    def __call__(self, mensagem, setor=None, **campos):
+        if not self.ativo:
+            return
+        if self.expira_em is not None and time.monotonic() >= self.expira_em:
+            self._rastreio.desligar(self.nome)
+            return
+        # Eventos sem setor (ex.: páginas do Escallo, que valem para todos) passam pelo filtro
+        if self.setores is not None and setor is not None and setor not in self.setores:
+            return
+        if self.amostragem < 1 and random.random() >= self.amostragem:
+            self.descartados += 1
+            return
+        self.emitidos += 1
+        self._rastreio.emitir(self.nome, setor, mensagem, campos)
+
+    def estado(self):
+        restante = None
+        if self.ativo and self.expira_em is not None:
+            restante = max(0, round(self.expira_em - time.monotonic(), 1))
+        return {
+            'ativo': self.ativo,
+            'setores': sorted(self.setores) if self.setores is not None else None,
+            'amostragem': self.amostragem,
+            'desliga_em_segundos': restante,
+            'emitidos': self.emitidos,
+            'descartados_amostragem': self.descartados
+        }
+
+
+class Rastreio:
+    """Conjunto dos canais de rastreio e dos últimos eventos emitidos"""
+
+    def __init__(self, logger=None, capacidade=1000):
+        self.logger = logger
+        self.canais = {}
+        self.eventos = deque(maxlen=capacidade)
+        self._lock = threading.Lock()
+
+    def canal(self, nome):
+        """Canal do subsistema `nome` (criado desligado na primeira vez)"""
+        with self._lock:
+            if nome not in self.canais:
+                self.canais[nome] = Canal(nome, self)
+            return self.canais[nome]
+
+    def ligar(self, nome, setores=None, amostragem=1.0, duracao_segundos=None):
+        """Liga um canal, opcionalmente só para alguns setores, com amostragem (0-1] e por um tempo"""
+        if nome not in self.canais:
+            raise KeyError(f"Subsistema {nome} não existe. Use: {', '.join(sorted(self.canais))}")
+        if not 0 < amostragem <= 1:
+            raise ValueError("amostragem deve estar entre 0 (exclusive) e 1")
+        canal = self.canais[nome]
+        canal.setores = frozenset(setores) if setores else None
+        canal.amostragem = amostragem
+        canal.expira_em = time.monotonic() + duracao_segundos if duracao_segundos else None
+        canal.ativo = True
+        return canal
+
+    def desligar(self, nome):
+        if nome not in self.canais:
+            raise KeyError(f"Subsistema {nome} não existe. Use: {', '.join(sorted(self.canais))}")
+        self.canais[nome].ativo = False
+
+    def emitir(self, subsistema, setor, mensagem, campos):
+        """Monta o evento (resolvendo a mensagem e os campos preguiçosos) e o registra"""
+        evento = {
+            'em': datetime.now().isoformat(),
+            'subsistema': subsistema,
+            'setor': setor,
+            'mensagem': mensagem() if callable(mensagem) else mensagem
+        }
+        for nome, valor in campos.items():
+            evento[nome] = valor() if callable(valor) else valor
+        self.eventos.append(evento)
+        if self.logger:
+            self.logger.info('[rastreio] %s', json.dumps(evento, ensure_ascii=False, default=str))
+
+    def ultimos(self, subsistema=None, setor=None, limite=100):
+        """Eventos mais recentes por último, filtrados por subsistema e setor"""
+        eventos = [evento for evento in list(self.eventos)
+                   if (subsistema is None or evento['subsistema'] == subsistema)
+                   and (setor is None or evento['setor'] == setor)]
+        return eventos[-limite:] if limite else eventos
+
+    def estado(self):
+        return {nome: canal.estado() for nome, canal in sorted(self.canais.items())}
@@ -0,0 +1,114 @@
+"""Acompanhamento quase em tempo real das ligações do dia (rel003/rel030).
+
+A varredura do mês inteiro roda a cada duas horas. Entre uma e outra, o
+seguidor consulta só o fim do dia atual (a partir do último horário visto,
+com uma margem de sobreposição) e atualiza as contagens por atendente.
+
+Linhas repetidas pela sobreposição são descartadas pelo id do registro
+(prefixado pela fonte, quando há várias instâncias do Escallo);
+se um registro já visto muda de situação (ex.: rel030 'Pendente' ->
+'Concluído'), a contagem antiga é desfeita e a nova aplicada.
+"""
+import json
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from impressoes import impressao_pagina
+
+FORMATO_DATA_HORA = '%d/%m/%Y %H:%M:%S'
+
+
+class SeguidorHoje:
+    """Cursor, registros vistos e contagens por atendente de um relatório no dia atual.
+
+    `classificar(registro)` retorna o código do atendente a quem o registro
+    conta, ou None se ele não entra na contagem.
+    """
+
+    def __init__(self, campo_id, campo_data, classificar, dia=None):
+        self.campo_id = campo_id
+        self.campo_data = campo_data
+        self.classificar = classificar
+        self.dia = dia or datetime.now().strftime('%Y-%m-%d')
+        self.criado_em = datetime.now()
+        self.cursor = None
+        self._vistos = {}
+        self._contagens = defaultdict(int)
+        self._lock = threading.Lock()
+        self.consultas = 0
+        self.registros_recebidos = 0
+        self.repetidos = 0
+        self.ultima_consulta = None
+
+    def _identificar(self, registro):
+        identificador = registro.get(self.campo_id)
+        if identificador:
+            # Ids só são únicos dentro de uma instância do Escallo
+            fonte = registro.get('fonte')
+            return f"{fonte}:{identificador}" if fonte else str(identificador)
+        # Sem id no registro: usa o próprio conteúdo como identidade
+        return impressao_pagina(json.dumps(registro, sort_keys=True, default=str).encode())
+
+    def horario_inicial(self, margem_segundos):
+        """Horário a partir do qual consultar: o cursor menos a margem (ou o dia todo)"""
+        if self.cursor is None:
+            return '00:00:01'
+        inicio = self.cursor - timedelta(seconds=margem_segundos)
+        if inicio.strftime('%Y-%m-%d') != self.dia:
+            return '00:00:01'
+        return inicio.strftime('%H:%M:%S')
+
+    def aplicar(self, registros):
+        """Aplica registros novos (ou repetidos) e retorna quantas contagens mudaram"""
+        alteradas = 0
+        with self._lock:
+            self.consultas += 1
+            self.ultima_consulta = datetime.now()
+            for registro in registros:
+                if not isinstance(registro, dict):
+                    continue
+                self.registros_recebidos += 1
+
+                try:
+                    momento = datetime.strptime(str(registro.get(self.campo_data, '')).strip(), FORMATO_DATA_HORA)
+                except ValueError:
+                    momento = None
+                if momento is not None:
+                    if momento.strftime('%Y-%m-%d') != self.dia:
+                        continue
+                    if self.cursor is None or momento > self.cursor:
+                        self.cursor = momento
+
+                identificador = self._identificar(registro)
+                codigo = self.classificar(registro)
+                anterior = self._vistos.get(identificador)
+                if identificador in self._vistos and anterior == codigo:
+                    self.repetidos += 1
+                    continue
+                self._vistos[identificador] = codigo
+                if anterior is not None:
+                    self._contagens[anterior] -= 1
+                    alteradas += 1
+                if codigo is not None:
+                    self._contagens[codigo] += 1
+                    alteradas += 1
+        return alteradas
+
+    def contagens(self):
+        """Cópia das contagens por código de atendente"""
+        with self._lock:
+            return {codigo: total for codigo, total in self._contagens.items() if total}
+
+    def estado(self):
+        with self._lock:
+            return {
+                'dia': self.dia,
+                'cursor': self.cursor.strftime(FORMATO_DATA_HORA) if self.cursor else None,
+                'registros_do_dia': len(self._vistos),
+                'total_contado': sum(self._contagens.values()),
+                'consultas': self.consultas,
+                'registros_recebidos': self.registros_recebidos,
+                'repetidos_descartados': self.repetidos,
+                'ultima_consulta': self.ultima_consulta.isoformat() if self.ultima_consulta else None
+            }
@@ -0,0 +1,166 @@
+"""Snapshots dos dados processados compartilhados entre processos.
+
+No modo multi-processo um único processo coletor faz todas as consultas ao
+Escallo e publica aqui o resultado de cada (setor, tipo). Os workers da API
+apenas leem esses snapshots, sem nunca falar com o Escallo.
+
+Cada snapshot é um arquivo com um cabeçalho fixo (magic, versão, tamanho)
+seguido do JSON já serializado. O escritor grava um arquivo temporário e o
+troca com `os.replace` (rename atômico); os leitores mapeiam o arquivo atual
+com mmap e recebem um memoryview dos bytes, sem cópia e sem nunca esperar o
+escritor: quem já mapeou a versão anterior continua lendo-a normalmente. Para
+responder, `abrir` devolve o próprio arquivo, que o servidor WSGI envia direto
+para o socket.
+
+A versão cresce a cada publicação e serve como ETag e sinal de mudança
+para os clientes.
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+MAGIC = b'ESNP'
+CABECALHO = struct.Struct('<4sQQ')  # magic, versão, tamanho do payload
+
+
+class SnapshotStore:
+    """Armazena um arquivo mapeado em memória por (setor, tipo) em um diretório compartilhado"""
+
+    def __init__(self, diretorio):
+        self.diretorio = diretorio
+        self.diretorio_pedidos = os.path.join(diretorio, 'pedidos')
+        os.makedirs(self.diretorio_pedidos, exist_ok=True)
+        # Mapeamentos abertos por este processo: (setor, tipo) -> (inode, mtime, mmap, versão, tamanho)
+        self._mapas = {}
+        # JSON já decodificado por versão, para quem precisa do dict (ex.: atualizar_cache)
+        self._decodificados = {}
+        self._lock = threading.Lock()
+        # Serializa escritores do mesmo processo (o coletor) para manter a versão crescente
+        self._lock_escrita = threading.Lock()
+
+    def _caminho(self, setor, tipo):
+        return os.path.join(self.diretorio, f"{setor}__{tipo}.snap")
+
+    def publicar(self, setor, tipo, dados):
+        """Publica uma nova versão do snapshot e retorna o número da versão.
+
+        O campo 'versao' é incluído no próprio JSON para que o cliente saiba
+        qual versão tem em mãos.
+        """
+        caminho = self._caminho(setor, tipo)
+        with self._lock_escrita:
+            versao = self.versao(setor, tipo) + 1
+            dados = dict(dados)
+            dados['versao'] = versao
+            payload = json.dumps(dados, ensure_ascii=False).encode('utf-8')
+
+            temporario = f"{caminho}.{os.getpid()}.tmp"
+            with open(temporario, 'wb') as f:
+                f.write(CABECALHO.pack(MAGIC, versao, len(payload)))
+                f.write(payload)
+            os.replace(temporario, caminho)
+        return versao
+
+    def _mapear(self, setor, tipo):
+        """Retorna o mapeamento da versão atual, reabrindo o arquivo só se ele foi trocado"""
+        chave = (setor, tipo)
+        caminho = self._caminho(setor, tipo)
+        try:
+            info = os.stat(caminho)
+        except FileNotFoundError:
+            return None
+
+        with self._lock:
+            atual = self._mapas.get(chave)
+            if atual and atual[0] == info.st_ino and atual[1] == info.st_mtime_ns:
+                return atual
+
+        try:
+            with open(caminho, 'rb') as f:
+                info = os.fstat(f.fileno())
+                mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        magic, versao, tamanho = CABECALHO.unpack_from(mapa, 0)
+        if magic != MAGIC or CABECALHO.size + tamanho > len(mapa):
+            return None
+
+        novo = (info.st_ino, info.st_mtime_ns, mapa, versao, tamanho)
+        with self._lock:
+            # O mapeamento antigo não é fechado aqui: leitores que ainda
+            # seguram um memoryview dele continuam válidos até soltá-lo
+            self._mapas[chave] = novo
+        return novo
+
+    def versao(self, setor, tipo):
+        """Versão atual do snapshot (0 se ainda não publicado)"""
+        mapeado = self._mapear(setor, tipo)
+        return mapeado[3] if mapeado else 0
+
+    def ler_bytes(self, setor, tipo):
+        """Retorna (versão, memoryview do JSON) sem copiar, ou (0, None)"""
+        mapeado = self._mapear(setor, tipo)
+        if not mapeado:
+            return 0, None
+        _, _, mapa, versao, tamanho = mapeado
+        return versao, memoryview(mapa)[CABECALHO.size:CABECALHO.size + tamanho]
+
+    def abrir(self, setor, tipo, versao):
+        """Arquivo do snapshot posicionado no início do JSON e o tamanho dele, ou (None, 0).
+
+        Só devolve o arquivo se ele ainda está na `versao` (o escritor pode ter
+        trocado o arquivo depois da leitura). Serve para enviar a resposta pelo
+        wsgi.file_wrapper, que no gunicorn vira sendfile e não passa os bytes
+        pelo Python; quem recebe o arquivo é responsável por fechá-lo.
+        """
+        try:
+            f = open(self._caminho(setor, tipo), 'rb')
+        except FileNotFoundError:
+            return None, 0
+        cabecalho = f.read(CABECALHO.size)
+        if len(cabecalho) == CABECALHO.size:
+            magic, versao_arquivo, tamanho = CABECALHO.unpack(cabecalho)
+            if magic == MAGIC and versao_arquivo == versao:
+                return f, tamanho
+        f.close()
+        return None, 0
+
+    def ler(self, setor, tipo):
+        """Retorna o snapshot atual decodificado ou None se ainda não foi publicado"""
+        versao, payload = self.ler_bytes(setor, tipo)
+        if payload is None:
+            return None
+
+        with self._lock:
+            decodificado = self._decodificados.get((setor, tipo))
+            if decodificado and decodificado[0] == versao:
+                return decodificado[1]
+
+        dados = json.loads(bytes(payload))
+        with self._lock:
+            self._decodificados[(setor, tipo)] = (versao, dados)
+        return dados
+
+    def solicitar_atualizacao(self, setor, tipo):
+        """Registra um pedido de atualização para o coletor (usado pelos workers da API)"""
+        caminho = os.path.join(self.diretorio_pedidos, f"{setor}__{tipo}")
+        with open(caminho, 'w') as f:
+            f.write(str(time.time()))
+
+    def consumir_pedidos(self):
+        """Retorna e remove os pedidos pendentes como lista de (setor, tipo)"""
+        pedidos = []
+        for nome in os.listdir(self.diretorio_pedidos):
+            if '__' not in nome:
+                continue
+            try:
+                os.remove(os.path.join(self.diretorio_pedidos, nome))
+            except FileNotFoundError:
+                continue
+            setor, tipo = nome.split('__', 1)
+            pedidos.append((setor, tipo))
+        return pedidos
@@ -0,0 +1,160 @@
+"""Vistas ordenadas, paginadas e com campos escolhidos das listas por atendente.
+
+As rotas /api/dados/* aceitam `sort=campo` (crescente) ou `sort=-campo`
+(decrescente), `limit`, `offset` e `fields=campo1,campo2`. As ordens de
+cada campo são calculadas uma vez por versão dos dados (na gravação do
+cache, ou na primeira leitura de um snapshot) e reaproveitadas por todas as
+requisições, que então só fatiam a lista.
+"""
+import threading
+from collections import OrderedDict
+
+from historico_versoes import LISTAS_POR_ATENDENTE
+from kpis import segundos
+
+PARAMETROS_VISTA = ('sort', 'limit', 'offset', 'fields')
+
+
+def valor_ordenavel(valor):
+    """Número para ordenar um campo (durações 'H:MM:SS' em segundos), ou None"""
+    if isinstance(valor, bool):
+        return None
+    if isinstance(valor, (int, float)):
+        return valor
+    if isinstance(valor, str):
+        texto = valor.strip()
+        if ':' in texto:
+            return segundos(texto)
+        try:
+            return float(texto.replace(',', '.'))
+        except ValueError:
+            return None
+    return None
+
+
+def calcular_ordens(dados):
+    """{lista: {campo: (crescente, decrescente)}} com os índices das linhas em cada ordem.
+
+    Campos numéricos em todas as linhas ordenam pelo valor; os demais
+    campos de texto (ex.: nome) em ordem alfabética. Empates mantêm a
+    ordem original da lista nos dois sentidos.
+    """
+    ordens = {}
+    for lista in LISTAS_POR_ATENDENTE:
+        linhas = dados.get(lista)
+        if not isinstance(linhas, list) or not linhas:
+            continue
+        campos = {}
+        for campo in linhas[0]:
+            valores = [valor_ordenavel(linha.get(campo)) for linha in linhas]
+            if any(valor is None for valor in valores):
+                if not all(isinstance(linha.get(campo), str) for linha in linhas):
+                    continue
+                valores = [linha[campo].casefold() for linha in linhas]
+                crescente = sorted(range(len(linhas)), key=lambda i: (valores[i], i))
+                decrescente = sorted(range(len(linhas)), key=lambda i: (valores[i], -i), reverse=True)
+            else:
+                crescente = sorted(range(len(linhas)), key=lambda i: (valores[i], i))
+                decrescente = sorted(range(len(linhas)), key=lambda i: (-valores[i], i))
+            campos[campo] = (tuple(crescente), tuple(decrescente))
+        ordens[lista] = campos
+    return ordens
+
+
+class OrdensPorVersao:
+    """Ordens calculadas por (chave, versão), guardando só as últimas versões de cada chave"""
+
+    def __init__(self, versoes_por_chave=2):
+        self.versoes_por_chave = versoes_por_chave
+        self._ordens = {}
+        self._lock = threading.Lock()
+        self.calculadas = 0
+        self.reaproveitadas = 0
+
+    def obter(self, chave, versao, dados):
+        with self._lock:
+            versoes = self._ordens.get(chave)
+            if versoes is not None and versao in versoes:
+                self.reaproveitadas += 1
+                return versoes[versao]
+        # Fora do lock: no pior caso duas requisições calculam a mesma ordem
+        ordens = calcular_ordens(dados)
+        with self._lock:
+            versoes = self._ordens.setdefault(chave, OrderedDict())
+            versoes[versao] = ordens
+            while len(versoes) > self.versoes_por_chave:
+                versoes.popitem(last=False)
+            self.calculadas += 1
+        return ordens
+
+    def estado(self):
+        with self._lock:
+            return {'chaves': len(self._ordens), 'calculadas': self.calculadas, 'reaproveitadas': self.reaproveitadas}
+
+
+def ler_parametros(args):
+    """Parâmetros de vista da requisição, ou None se nenhum foi informado.
+
+    Levanta ValueError com a mensagem para o cliente se algum for inválido.
+    """
+    if not any(nome in args for nome in PARAMETROS_VISTA):
+        return None
+
+    sort = args.get('sort') or None
+    campos = [campo.strip() for campo in args.get('fields', '').split(',') if campo.strip()] or None
+    try:
+        limit = int(args['limit']) if args.get('limit') else None
+        offset = int(args.get('offset') or 0)
+    except ValueError:
+        raise ValueError('limit e offset devem ser números inteiros')
+    if (limit is not None and limit < 0) or offset < 0:
+        raise ValueError('limit e offset não podem ser negativos')
+    return {'sort': sort, 'limit': limit, 'offset': offset, 'fields': campos}
+
+
+def aplicar_vista(dados, ordens, vista):
+    """Cópia de `dados` com as listas por atendente ordenadas, fatiadas e com os campos pedidos.
+
+    'codigo' sempre fica nas linhas (as respostas em delta dependem dele).
+    `paginacao` traz o total de linhas de cada lista antes do corte.
+    Levanta ValueError se nenhuma lista tem o campo de ordenação.
+    """
+    resultado = dict(dados)
+    sort = vista['sort']
+    descendente = bool(sort) and sort.startswith('-')
+    campo_sort = sort.lstrip('-') if sort else None
+    inicio = vista['offset']
+    fim = None if vista['limit'] is None else inicio + vista['limit']
+    campos = None
+    if vista['fields']:
+        campos = set(vista['fields']) | {'codigo'}
+
+    if campo_sort and ordens and not any(campo_sort in campos_lista for campos_lista in ordens.values()):
+        disponiveis = sorted({campo for campos_lista in ordens.values() for campo in campos_lista})
+        raise ValueError(f"Não é possível ordenar por {campo_sort}. Use: {', '.join(disponiveis)}")
+
+    totais = {}
+    for lista in LISTAS_POR_ATENDENTE:
+        linhas = dados.get(lista)
+        if not isinstance(linhas, list):
+            continue
+        totais[lista] = len(linhas)
+        # Listas sem o campo (ex.: 'dia' ao ordenar pelo total do mês) mantêm a ordem delas
+        ordem = ordens.get(lista, {}).get(campo_sort) if campo_sort else None
+        if ordem is not None:
+            selecionadas = [linhas[i] for i in ordem[1 if descendente else 0][inicio:fim]]
+        else:
+            selecionadas = linhas[inicio:fim]
+        if campos is not None:
+            selecionadas = [{campo: valor for campo, valor in linha.items() if campo in campos}
+                            for linha in selecionadas]
+        resultado[lista] = selecionadas
+
+    resultado['paginacao'] = {
+        'sort': sort,
+        'offset': inicio,
+        'limit': vista['limit'],
+        'fields': vista['fields'],
+        'total': totais
+    }
+    return resultado
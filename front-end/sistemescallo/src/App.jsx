@@ -18,6 +18,7 @@ function App() {
     monthData, 
     ligacoesAtivasData,
     ligacoesRecuperadasData, 
+    kpisData,
     loading, 
     error, 
     lastUpdate, 
@@ -71,6 +72,7 @@ function App() {
                   todayData={todayData} 
                   monthData={monthData} 
                   ligacoesRecuperadasData={ligacoesRecuperadasData}
+                  kpisData={kpisData}
                   loading={loading} 
                   error={error}
                   setor={setor}
@@ -1,30 +1,37 @@
-import { useState, useEffect, useCallback } from 'react';
-import { apiService } from '../services/api';
+import { useState, useEffect, useCallback, useRef } from 'react';
+import { apiService, assinarAtualizacoes } from '../services/api';
 
 const useRefreshData = (setor = 'suporte', refreshInterval = 3600000) => {
   const [todayData, setTodayData] = useState(null);
   const [monthData, setMonthData] = useState(null);
   const [ligacoesAtivasData, setLigacoesAtivasData] = useState(null);
   const [ligacoesRecuperadasData, setLigacoesRecuperadasData] = useState(null);
+  const [kpisData, setKpisData] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [lastUpdate, setLastUpdate] = useState(null);
+  const ultimaBusca = useRef(0);
 
-  const fetchData = useCallback(async (forceRefresh = false) => {
+  // `silencioso`: atualização vinda do cache/segundo plano, sem mostrar o carregando
+  const fetchData = useCallback(async (forceRefresh = false, silencioso = false) => {
     // console.log('🚀🚀 INICIANDO FETCHDATA COMPLETO 🚀🚀');
     // console.log(`📌 Setor: ${setor}`);
     // console.log(`📌 Forçar refresh: ${forceRefresh ? 'SIM ✅' : 'NÃO (usar cache)'}`);
     
-    setLoading(true);
+    if (!silencioso) {
+      setLoading(true);
+    }
+    ultimaBusca.current = Date.now();
     
     try {
       // console.log('📡📡 FAZENDO 4 REQUISIÇÕES PARALELAS 📡📡');
       
-      const [today, month, ligacoesAtivas, ligacoesRecuperadas] = await Promise.all([
+      const [today, month, ligacoesAtivas, ligacoesRecuperadas, kpis] = await Promise.all([
         apiService.getTodayData(setor, forceRefresh),
         apiService.getMonthData(setor, forceRefresh),
         apiService.getLigacoesAtivasMes(setor, forceRefresh),
-        apiService.getLigacoesRecuperadas(setor, forceRefresh)
+        apiService.getLigacoesRecuperadas(setor, forceRefresh),
+        apiService.getKpis(setor)
       ]);
       
       console.log('✅✅ TODOS OS DADOS RECEBIDOS ✅✅', {
@@ -32,7 +39,8 @@ const useRefreshData = (setor = 'suporte', refreshInterval = 3600000) => {
         mes: month?.data?.length || 0,
         ativas: ligacoesAtivas?.data?.length || 0,
         recuperadasDia: ligacoesRecuperadas?.dia?.length || 0,
-        recuperadasMes: ligacoesRecuperadas?.mes?.length || 0
+        recuperadasMes: ligacoesRecuperadas?.mes?.length || 0,
+        kpis: kpis?.data?.length || 0
       });
       
       // Verifique se os dados foram atualizados
@@ -44,6 +52,7 @@ const useRefreshData = (setor = 'suporte', refreshInterval = 3600000) => {
       setMonthData(month);
       setLigacoesAtivasData(ligacoesAtivas);
       setLigacoesRecuperadasData(ligacoesRecuperadas);
+      setKpisData(kpis);
       setLastUpdate(new Date());
       setError(null);
       
@@ -80,21 +89,38 @@ const useRefreshData = (setor = 'suporte', refreshInterval = 3600000) => {
     // console.log(`📌 Setor: ${setor}`);
     
     const intervalId = setInterval(() => {
-      // console.log('🔄🔄 AUTO-REFRESH DISPARADO 🔄🔄');
-      fetchData(false);
+      // Aba escondida não consulta; quando ela volta a aparecer o listener abaixo atualiza
+      if (!document.hidden) {
+        fetchData(false, true);
+      }
     }, refreshInterval);
 
+    const aoMudarVisibilidade = () => {
+      if (!document.hidden && Date.now() - ultimaBusca.current >= refreshInterval) {
+        fetchData(false, true);
+      }
+    };
+    document.addEventListener('visibilitychange', aoMudarVisibilidade);
+
     return () => {
-      // console.log('🧹🧹 LIMPANDO INTERVALO DE AUTO-REFRESH 🧹🧹');
       clearInterval(intervalId);
+      document.removeEventListener('visibilitychange', aoMudarVisibilidade);
     };
   }, [fetchData, refreshInterval, setor]);
 
+  // Revalidação em segundo plano do apiService trouxe dados novos deste setor
+  useEffect(() => assinarAtualizacoes((_rota, setorAtualizado) => {
+    if (setorAtualizado === setor) {
+      fetchData(false, true);
+    }
+  }), [fetchData, setor]);
+
   return {
     todayData,
     monthData,
     ligacoesAtivasData,
     ligacoesRecuperadasData,
+    kpisData,
     loading,
     error,
     lastUpdate,
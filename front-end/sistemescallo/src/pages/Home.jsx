@@ -3,7 +3,7 @@ import React, { useState, useMemo } from 'react';
 import CollaboratorCard from '../components/CollaboratorCard';
 import { FiUsers, FiPhone, FiPercent, FiFilter, FiTrendingUp, FiAward, FiActivity, FiBriefcase, FiUser, FiClock, FiRefreshCw, FiCalendar } from 'react-icons/fi';
 
-const Home = ({ todayData, monthData, ligacoesRecuperadasData, loading, error, setor }) => {
+const Home = ({ todayData, monthData, ligacoesRecuperadasData, kpisData, loading, error, setor }) => {
   const [filter, setFilter] = useState('all');
 
   // Função para obter o label do setor
@@ -21,22 +21,11 @@ const Home = ({ todayData, monthData, ligacoesRecuperadasData, loading, error, s
     return setor === 'suporte' ? FiActivity : FiBriefcase;
   };
 
-  // Função para obter dados do mês de um colaborador
-  const getDadosMesColaborador = (codigo) => {
-    if (!monthData || !monthData.data || monthData.data.length === 0) {
-      return {
-        ligacoesOferecidasAtendidas: 0,
-        tma: '0:00'
-      };
-    }
-    
-    const colaboradorMes = monthData.data.find(item => item.codigo === codigo);
-    
-    return {
-      ligacoesOferecidasAtendidas: colaboradorMes?.ligacoesOferecidasAtendidas || 0,
-      tma: colaboradorMes?.tma || '0:00'
-    };
-  };
+  // Indicadores do dia e do mês de cada colaborador, já juntados no backend (/api/kpis)
+  const kpisPorCodigo = useMemo(
+    () => new Map((kpisData?.data || []).map(linha => [linha.codigo, linha])),
+    [kpisData]
+  );
 
   // Função para converter TMA para segundos
   const tmaToSeconds = (tma) => {
@@ -61,19 +50,6 @@ const Home = ({ todayData, monthData, ligacoesRecuperadasData, loading, error, s
     return 0;
   };
 
-  // Função para obter ligações recuperadas de um colaborador
-  const getLigacoesRecuperadasColaborador = (codigo) => {
-    if (!ligacoesRecuperadasData) return { dia: 0, mes: 0 };
-    
-    const dia = ligacoesRecuperadasData.dia?.find(item => item.codigo === codigo);
-    const mes = ligacoesRecuperadasData.mes?.find(item => item.codigo === codigo);
-    
-    return {
-      dia: dia?.ligacoesRecuperadasDia || 0,
-      mes: mes?.ligacoesRecuperadasMes || 0
-    };
-  };
-
   // Função para calcular total de ligações atendidas no mês
   const getLigacoesAtendidasMesTotal = () => {
     if (!monthData || !monthData.data || monthData.data.length === 0) return 0;
@@ -204,21 +180,18 @@ const Home = ({ todayData, monthData, ligacoesRecuperadasData, loading, error, s
       }
       
       // Terceira métrica: Se atendidas no dia iguais, quem atendeu mais no mês
-      const dadosMesA = getDadosMesColaborador(a.codigo);
-      const dadosMesB = getDadosMesColaborador(b.codigo);
+      const mesA = kpisPorCodigo.get(a.codigo)?.mes;
+      const mesB = kpisPorCodigo.get(b.codigo)?.mes;
       
-      const atendidasMesA = dadosMesA.ligacoesOferecidasAtendidas;
-      const atendidasMesB = dadosMesB.ligacoesOferecidasAtendidas;
+      const atendidasMesA = mesA?.ligacoesOferecidasAtendidas || 0;
+      const atendidasMesB = mesB?.ligacoesOferecidasAtendidas || 0;
       
       if (atendidasMesB !== atendidasMesA) {
         return atendidasMesB - atendidasMesA;
       }
       
-      // Quarta métrica: Se atendidas no mês iguais, quem tem TMA menor no mês
-      const tmaMesA = tmaToSeconds(dadosMesA.tma);
-      const tmaMesB = tmaToSeconds(dadosMesB.tma);
-      
-      return tmaMesA - tmaMesB;
+      // Quarta métrica: Se atendidas no mês iguais, quem tem TMA menor no mês (em segundos)
+      return (mesA?.tma || 0) - (mesB?.tma || 0);
     });
 
     // Pegar apenas os 3 primeiros
@@ -227,7 +200,7 @@ const Home = ({ todayData, monthData, ligacoesRecuperadasData, loading, error, s
 
   // Use useMemo para otimização
   const filteredCollaborators = useMemo(() => getFilteredAndSortedCollaborators(), [todayData, filter]);
-  const topPerformers = useMemo(() => getTopPerformers(), [filteredCollaborators, monthData]);
+  const topPerformers = useMemo(() => getTopPerformers(), [filteredCollaborators, kpisPorCodigo]);
   const stats = useMemo(() => getStats(), [todayData, filter]);
 
   // Cálculos para o mês
@@ -451,8 +424,7 @@ const Home = ({ todayData, monthData, ligacoesRecuperadasData, loading, error, s
             
             <div className="grid grid-cols-1 md:grid-cols-3 gap-6">
               {topPerformers.map((collaborator, index) => {
-                const recuperadas = getLigacoesRecuperadasColaborador(collaborator.codigo);
-                const dadosMes = getDadosMesColaborador(collaborator.codigo);
+                const kpis = kpisPorCodigo.get(collaborator.codigo);
                 
                 return (
                   <div key={collaborator.codigo} className="relative">
@@ -464,9 +436,8 @@ const Home = ({ todayData, monthData, ligacoesRecuperadasData, loading, error, s
                     <div className="relative">
                       <CollaboratorCard 
                         collaborator={collaborator} 
-                        ligacoesRecuperadasDia={recuperadas.dia}
-                        ligacoesRecuperadasMes={recuperadas.mes}
-                        dadosMes={dadosMes}
+                        ligacoesRecuperadasDia={kpis?.ligacoesRecuperadas || 0}
+                        ligacoesRecuperadasMes={kpis?.mes?.ligacoesRecuperadas || 0}
                       />
                       {/* Badge de posição */}
                       <div className={`absolute -top-2 -left-2 w-8 h-8 rounded-full flex items-center justify-center ${setor === 'suporte' ? 'bg-blue-600' : 'bg-green-600'} text-white font-bold text-sm shadow-lg`}>
@@ -542,16 +513,14 @@ const Home = ({ todayData, monthData, ligacoesRecuperadasData, loading, error, s
           {filteredCollaborators.length > 0 ? (
             <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 xl:grid-cols-4 gap-5">
               {filteredCollaborators.map((collaborator) => {
-                const recuperadas = getLigacoesRecuperadasColaborador(collaborator.codigo);
-                const dadosMes = getDadosMesColaborador(collaborator.codigo);
+                const kpis = kpisPorCodigo.get(collaborator.codigo);
                 
                 return (
                   <CollaboratorCard
                     key={collaborator.codigo}
                     collaborator={collaborator}
-                    ligacoesRecuperadasDia={recuperadas.dia}
-                    ligacoesRecuperadasMes={recuperadas.mes}
-                    dadosMes={dadosMes}
+                    ligacoesRecuperadasDia={kpis?.ligacoesRecuperadas || 0}
+                    ligacoesRecuperadasMes={kpis?.mes?.ligacoesRecuperadas || 0}
                     showDadosMes={true}
                   />
                 );
@@ -18,6 +18,104 @@ api.interceptors.response.use(
   }
 );
 
+// Registro de setores/atendentes do backend (/api/setores), usado nos fallbacks
+let setoresRegistro = null;
+
+const getAtendentesSetor = async (setor) => {
+  if (!setoresRegistro) {
+    try {
+      const response = await api.get('/api/setores');
+      setoresRegistro = response.data?.setores || null;
+    } catch (error) {
+      return [];
+    }
+  }
+  return setoresRegistro?.[setor]?.atendentes || [];
+};
+
+// Camada de dados compartilhada por todas as telas: a última resposta de cada rota/setor fica em
+// memória com o ETag e a versão dela. Dentro de TEMPO_FRESCO_MS é devolvida sem ir ao backend; depois
+// disso é devolvida na hora e revalidada em segundo plano (quem assinou é avisado se mudou). A
+// revalidação é condicional (If-None-Match -> 304) e com `desde` o backend manda só o que mudou.
+const TEMPO_FRESCO_MS = 30000;
+const ultimasRespostas = new Map(); // chave -> { dados, etag, recebidoEm }
+const emAndamento = new Map(); // chave -> Promise da requisição em curso (uma por chave)
+const assinantes = new Set();
+
+// callback(rota, setor) quando uma revalidação em segundo plano trouxe dados novos; retorna o cancelamento
+export const assinarAtualizacoes = (callback) => {
+  assinantes.add(callback);
+  return () => assinantes.delete(callback);
+};
+
+// Aplica uma resposta em delta (linhas alteradas + ordem dos códigos) sobre a resposta anterior
+const aplicarDelta = (anterior, delta) => {
+  const { alterados = {}, removidos, ordem = {}, delta: _delta, desde, ...resto } = delta;
+  const resultado = { ...anterior, ...resto };
+  Object.keys(ordem).forEach((lista) => {
+    const linhas = new Map((anterior[lista] || []).map((linha) => [linha.codigo, linha]));
+    (alterados[lista] || []).forEach((linha) => linhas.set(linha.codigo, linha));
+    resultado[lista] = ordem[lista].map((codigo) => linhas.get(codigo)).filter(Boolean);
+  });
+  return resultado;
+};
+
+const aceitaNaoModificado = (status) => (status >= 200 && status < 300) || status === 304;
+
+// Vai ao backend, juntando chamadas iguais enquanto a primeira não volta
+const buscarDados = (rota, params, chave, chaveAndamento = chave) => {
+  if (emAndamento.has(chaveAndamento)) {
+    return emAndamento.get(chaveAndamento);
+  }
+  const anterior = ultimasRespostas.get(chave);
+  const headers = {};
+  const parametros = { ...params };
+  if (anterior) {
+    if (anterior.dados?.versao != null) {
+      parametros.desde = anterior.dados.versao;
+    }
+    if (anterior.etag) {
+      headers['If-None-Match'] = anterior.etag;
+    }
+  }
+  const promessa = api.get(rota, { params: parametros, headers, validateStatus: aceitaNaoModificado })
+    .then((response) => {
+      let dados = response.data;
+      if (response.status === 304) {
+        dados = anterior.dados;
+      } else if (response.data?.delta && anterior) {
+        dados = aplicarDelta(anterior.dados, response.data);
+      }
+      ultimasRespostas.set(chave, { dados, etag: response.headers?.etag || null, recebidoEm: Date.now() });
+      return dados;
+    })
+    .finally(() => emAndamento.delete(chaveAndamento));
+  emAndamento.set(chaveAndamento, promessa);
+  return promessa;
+};
+
+const getDados = async (rota, setor, params, forceRefresh = false) => {
+  const chave = `${rota}|${setor}`;
+  if (forceRefresh) {
+    // Não usa o cache, mas ainda junta com outro refresh forçado da mesma rota em curso
+    return buscarDados(rota, params, chave, `${chave}|forcar`);
+  }
+  const emCache = ultimasRespostas.get(chave);
+  if (!emCache) {
+    return buscarDados(rota, params, chave);
+  }
+  if (Date.now() - emCache.recebidoEm > TEMPO_FRESCO_MS) {
+    buscarDados(rota, params, chave)
+      .then((dados) => {
+        if (dados !== emCache.dados) {
+          assinantes.forEach((callback) => callback(rota, setor));
+        }
+      })
+      .catch(() => {});
+  }
+  return emCache.dados;
+};
+
 // Funções da API
 export const apiService = {
   // Dados do dia - COM LOGS DETALHADOS
@@ -26,17 +124,16 @@ export const apiService = {
       const params = { setor };
       if (forceRefresh) {
         params.force_refresh = 'true';
-        params._t = new Date().getTime(); // Timestamp para evitar cache
         // console.log(`🟢🔄 TODAY DATA - FORÇANDO REFRESH para setor: ${setor}`);
       } else {
         // console.log(`🟢 TODAY DATA - Consulta normal para setor: ${setor}`);
       }
       
       // console.log('📡 Parâmetros da requisição (hoje):', params);
-      const response = await api.get('/api/dados/hoje', { params });
-      // console.log('✅ TODAY data recebida:', response.data?.data?.length || 0, 'registros');
-      // console.log('🕐 Última atualização:', response.data?.atualizado_em || 'N/A');
-      return response.data;
+      const dados = await getDados('/api/dados/hoje', setor, params, forceRefresh);
+      // console.log('✅ TODAY data recebida:', dados?.data?.length || 0, 'registros');
+      // console.log('🕐 Última atualização:', dados?.atualizado_em || 'N/A');
+      return dados;
     } catch (error) {
       // console.error('🔴 Erro ao buscar dados de hoje:', error.message);
       return {
@@ -54,16 +151,15 @@ export const apiService = {
       const params = { setor };
       if (forceRefresh) {
         params.force_refresh = 'true';
-        params._t = new Date().getTime(); // Timestamp para evitar cache
         // console.log(`🟠🔄 MONTH DATA - FORÇANDO REFRESH para setor: ${setor}`);
       } else {
         // console.log(`🟠 MONTH DATA - Consulta normal para setor: ${setor}`);
       }
       
       // console.log('📡 Parâmetros da requisição (mês):', params);
-      const response = await api.get('/api/dados/mes', { params });
-      // console.log('✅ MONTH data recebida:', response.data?.data?.length || 0, 'registros');
-      return response.data;
+      const dados = await getDados('/api/dados/mes', setor, params, forceRefresh);
+      // console.log('✅ MONTH data recebida:', dados?.data?.length || 0, 'registros');
+      return dados;
     } catch (error) {
       // console.error('🔴 Erro ao buscar dados do mês:', error.message);
       return {
@@ -83,9 +179,9 @@ export const apiService = {
         params.force_refresh = 'true';
       }
       // console.log('🔵 Fetching last 7 days data with params:', params);
-      const response = await api.get('/api/dados/ultimos-7-dias', { params });
-      // console.log('✅ Last 7 days data received:', response.data?.data?.length || 0, 'records');
-      return response.data;
+      const dados = await getDados('/api/dados/ultimos-7-dias', setor, params, forceRefresh);
+      // console.log('✅ Last 7 days data received:', dados?.data?.length || 0, 'records');
+      return dados;
     } catch (error) {
       // console.error('🔴 Error fetching last 7 days data:', error);
       return null;
@@ -98,49 +194,20 @@ export const apiService = {
       const params = { setor };
       if (forceRefresh) {
         params.force_refresh = 'true';
-        params._t = new Date().getTime();
         // console.log(`🟣🔄 LIGAÇÕES ATIVAS - FORÇANDO REFRESH para setor: ${setor}`);
       } else {
         // console.log(`🟣 LIGAÇÕES ATIVAS - Consulta normal para setor: ${setor}`);
       }
       
       // console.log('📡 Parâmetros da requisição (ativas):', params);
-      const response = await api.get('/api/dados/ligacoes-ativas-mes', { params });
-      // console.log('✅ LIGAÇÕES ATIVAS recebidas:', response.data?.data?.length || 0, 'registros');
-      return response.data;
+      const dados = await getDados('/api/dados/ligacoes-ativas-mes', setor, params, forceRefresh);
+      // console.log('✅ LIGAÇÕES ATIVAS recebidas:', dados?.data?.length || 0, 'registros');
+      return dados;
     } catch (error) {
       // console.warn('⚠️ API de ligações ativas não disponível, usando fallback:', error.message);
       
-      // Cria dados vazios como fallback, baseado no setor
-      let atendentes = [];
-      
-      if (setor === 'suporte') {
-        atendentes = [
-          { codigo: "4002", nome: "Pedro Henrique" },
-          { codigo: "4004", nome: "João Miyake" },
-          { codigo: "4006", nome: "Gabriel Rosa" },
-          { codigo: "4008", nome: "Gabriel Brambila (Estagiário)" },
-          { codigo: "4009", nome: "Marcos Moraes (Estagiário)" },
-          { codigo: "4021", nome: "Rodrigo Akira" },
-          { codigo: "4025", nome: "Alison da Silva" },
-          { codigo: "4027", nome: "Pedro Chaves (Estagiário)" },
-          { codigo: "4028", nome: "Ryan da Silva (Estagiário)" },
-          { codigo: "4029", nome: "Samuel Mendes (Estagiário)" },
-          { codigo: "4030", nome: "Pedro Boni" },
-          { codigo: "4031", nome: "Rafael Guedes" },
-          { codigo: "4032", nome: "Ricardo Correa" },
-          { codigo: "4033", nome: "João Silva (Estagiario)" }
-        ];
-      } else if (setor === 'comercial') {
-        atendentes = [
-          { codigo: "1201", nome: "Gustavo Leônidas" },
-          { codigo: "1204", nome: "Tamires Cavalcante" },
-          { codigo: "1205", nome: "Miguel Roveda" },
-          { codigo: "1208", nome: "Rennan Taioqui" },
-          { codigo: "1210", nome: "Rodrigo Boani" },
-          { codigo: "4016", nome: "Henrique Alves" }
-        ];
-      }
+      // Cria dados vazios como fallback, com os atendentes do registro de setores
+      const atendentes = await getAtendentesSetor(setor);
       
       return {
         data: atendentes.map(atendente => ({
@@ -162,53 +229,24 @@ export const apiService = {
       const params = { setor };
       if (forceRefresh) {
         params.force_refresh = 'true';
-        params._t = new Date().getTime(); // Timestamp para evitar cache
         // console.log(`🟡🔄 LIGAÇÕES RECUPERADAS - FORÇANDO REFRESH para setor: ${setor}`);
       } else {
         // console.log(`🟡 LIGAÇÕES RECUPERADAS - Consulta normal para setor: ${setor}`);
       }
       
       // console.log('📡 Parâmetros da requisição (recuperadas):', params);
-      const response = await api.get('/api/dados/ligacoes-recuperadas', { params });
+      const dados = await getDados('/api/dados/ligacoes-recuperadas', setor, params, forceRefresh);
       console.log('✅ LIGAÇÕES RECUPERADAS recebidas:', {
-        dia: response.data?.dia?.length || 0,
-        mes: response.data?.mes?.length || 0,
-        totais: response.data?.totais
+        dia: dados?.dia?.length || 0,
+        mes: dados?.mes?.length || 0,
+        totais: dados?.totais
       });
-      return response.data;
+      return dados;
     } catch (error) {
       // console.warn('⚠️ API de ligações recuperadas não disponível, usando fallback:', error.message);
       
-      // Cria dados vazios como fallback, baseado no setor
-      let atendentes = [];
-      
-      if (setor === 'suporte') {
-        atendentes = [
-          { codigo: "4002", nome: "Pedro Henrique" },
-          { codigo: "4004", nome: "João Miyake" },
-          { codigo: "4006", nome: "Gabriel Rosa" },
-          { codigo: "4008", nome: "Gabriel Brambila (Estagiário)" },
-          { codigo: "4009", nome: "Marcos Moraes (Estagiário)" },
-          { codigo: "4021", nome: "Rodrigo Akira" },
-          { codigo: "4025", nome: "Alison da Silva" },
-          { codigo: "4027", nome: "Pedro Chaves (Estagiário)" },
-          { codigo: "4028", nome: "Ryan da Silva (Estagiário)" },
-          { codigo: "4029", nome: "Samuel Mendes (Estagiário)" },
-          { codigo: "4030", nome: "Pedro Boni" },
-          { codigo: "4031", nome: "Rafael Guedes" },
-          { codigo: "4032", nome: "Ricardo Correa" },
-          { codigo: "4033", nome: "João Silva (Estagiario)" }
-        ];
-      } else if (setor === 'comercial') {
-        atendentes = [
-          { codigo: "1201", nome: "Gustavo Leônidas" },
-          { codigo: "1204", nome: "Tamires Cavalcante" },
-          { codigo: "1205", nome: "Miguel Roveda" },
-          { codigo: "1208", nome: "Rennan Taioqui" },
-          { codigo: "1210", nome: "Rodrigo Boani" },
-          { codigo: "4016", nome: "Henrique Alves" }
-        ];
-      }
+      // Cria dados vazios como fallback, com os atendentes do registro de setores
+      const atendentes = await getAtendentesSetor(setor);
       
       return {
         dia: atendentes.map(atendente => ({
@@ -242,6 +280,24 @@ export const apiService = {
     return response.data;
   },
 
+  // Indicadores por atendente do dia (taxa de recuperação, retornos por perda, ativas por hora de login),
+  // já juntados e calculados no backend
+  getKpis: async (setor = 'suporte', dia = null) => {
+    const params = { setor };
+    if (dia) {
+      params.dia = dia;
+    }
+    const response = await api.get('/api/kpis', { params });
+    return response.data;
+  },
+
+  // Rankings e top-N já ordenados e cortados no backend: sort ('-campo' = decrescente), limit, offset e fields
+  getVista: async (rota, setor = 'suporte', { sort, limit, offset, fields } = {}) => {
+    const params = { setor, sort, limit, offset, fields: fields?.join(',') };
+    const response = await api.get(rota, { params });
+    return response.data;
+  },
+
   getServerStatus: async () => {
     const response = await api.get('/api/status');
     return response.data;
@@ -249,6 +305,7 @@ export const apiService = {
 
   getSetores: async () => {
     const response = await api.get('/api/setores');
+    setoresRegistro = response.data?.setores || setoresRegistro;
     return response.data;
   }
 };
\ No newline at end of file